@@ -0,0 +1,133 @@
+"""
+Anverso y reverso del DNI: una inferencia por archivo o una por grupo.
+
+Cada chat envía dos fotos JPEG seguidas (separadas por `--gap` segundos) y
+se compara el gateway con ALBUM_ENABLED desactivado (cada foto se descarga,
+se analiza y se responde por separado) y activado (las dos se descargan en
+paralelo y van en una sola invocación). WAHA, Vertex AI y el chatbot están
+simulados en proceso (benchmarks.stubs). Reporta invocaciones a Vertex AI,
+tokens de entrada, consultas al chatbot y el tiempo desde la primera foto
+hasta el último mensaje enviado al chat (p50/p95).
+
+Uso:
+    python -m benchmarks.bench_album [--chats 50] [--gap 0.5] [--vertex-latency 1.5]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+os.environ.setdefault("MEDIA_CACHE_ENABLED", "False")
+os.environ.setdefault("DEDUP_ENABLED", "False")
+os.environ.setdefault("INFERENCE_MAX_QUEUE", "10000")
+os.environ.setdefault("OUTBOUND_RATE", "1000")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Se mide el pipeline de media, no el descarte por sobrecarga
+os.environ.setdefault("ADMISSION_ENABLED", "False")
+
+from benchmarks import stubs  # noqa: E402
+import src.services.http_clients as http_clients  # noqa: E402
+import src.services.vertex_client as vertex_client  # noqa: E402
+import src.utils.environment as env  # noqa: E402
+from src.main import app, lifespan  # noqa: E402
+from src.routes.waha_router import album_coalescer  # noqa: E402
+from src.utils.instrumentation import VERTEX_TOKENS  # noqa: E402
+
+
+def _prompt_tokens() -> float:
+    return sum(value for (_, _, kind), value in VERTEX_TOKENS._values.items() if kind == "prompt")
+
+
+def _webhook(chat: int, side: str) -> bytes:
+    payload = {
+        "id": f"false_51900{chat:06d}@c.us_3EB0{side.upper()}{chat:08X}",
+        "timestamp": 1700000000,
+        "from": f"51900{chat:06d}@c.us",
+        "fromMe": False,
+        "body": "",
+        "hasMedia": True,
+        "media": {"url": f"http://localhost:3000/api/files/dni_{side}_{chat % 4}.jpg", "mimetype": "image/jpeg"},
+    }
+    return json.dumps({"event": "message", "session": "default", "payload": payload}).encode()
+
+
+async def run(args, album: bool) -> dict:
+    env.ALBUM_ENABLED = album
+    vertex = stubs.StubVertexClient(base=args.vertex_latency)
+    files = {
+        f"/api/files/dni_{side}_{index}.jpg": (stubs.synthetic_jpeg(seed=index * 2 + (side == "back")), "image/jpeg")
+        for side in ("front", "back")
+        for index in range(4)
+    }
+    waha = stubs.waha_media_transport(files, download=stubs.Latency(0.05), send=stubs.Latency(0.02))
+    chatbot = stubs.chatbot_transport(latency=stubs.Latency(0.3))
+    inner_send, inner_chatbot = waha.handler, chatbot.handler
+    sent_at = defaultdict(list)
+    chatbot_calls = 0
+
+    async def record_send(request: httpx.Request) -> httpx.Response:
+        response = await inner_send(request)
+        if request.url.path == "/api/sendText":
+            sent_at[json.loads(request.content)["chatId"]].append(time.perf_counter())
+        return response
+
+    async def count_chatbot(request: httpx.Request) -> httpx.Response:
+        nonlocal chatbot_calls
+        chatbot_calls += 1
+        return await inner_chatbot(request)
+
+    waha.handler, chatbot.handler = record_send, count_chatbot
+    tokens_before = _prompt_tokens()
+    started_at = {}
+
+    async def chat(index: int):
+        started_at[f"51900{index:06d}@c.us"] = time.perf_counter()
+        first = asyncio.create_task(stubs.asgi_post(app, "/waha/webhook", _webhook(index, "front")))
+        await asyncio.sleep(args.gap)
+        await asyncio.gather(first, stubs.asgi_post(app, "/waha/webhook", _webhook(index, "back")))
+
+    async with lifespan(app):
+        http_clients._clients["waha"] = httpx.AsyncClient(transport=waha, base_url=env.WAHA_API_URL)
+        http_clients._clients["chatbot"] = httpx.AsyncClient(transport=chatbot)
+        vertex_client._vertex_client = vertex
+        await asyncio.gather(*(chat(index) for index in range(args.chats)))
+        # Con ALBUM_ENABLED el webhook responde antes del análisis: se espera a los grupos
+        while len(album_coalescer) or album_coalescer._tasks:
+            await asyncio.sleep(0.05)
+    answered = [max(times) - started_at[chat_id] for chat_id, times in sent_at.items()]
+    return {
+        "vertex": vertex.aio.models.calls,
+        "tokens": _prompt_tokens() - tokens_before,
+        "chatbot": chatbot_calls,
+        "messages": sum(len(times) for times in sent_at.values()),
+        "p50": statistics.median(answered),
+        "p95": statistics.quantiles(answered, n=20)[-1],
+    }
+
+
+async def main(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(
+        f"{'ALBUM_ENABLED':<16}{'Vertex AI':>11}{'tokens':>10}{'chatbot':>9}{'mensajes':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}"
+    )
+    for album in (False, True):
+        result = await run(args, album)
+        print(
+            f"{str(album):<16}{result['vertex']:>11}{result['tokens']:>10.0f}{result['chatbot']:>9}"
+            f"{result['messages']:>10}{result['p50'] * 1000:>10.0f}{result['p95'] * 1000:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=50, help="Chats que envían anverso y reverso a la vez")
+    parser.add_argument("--gap", type=float, default=0.5, help="Segundos entre las dos fotos de un chat")
+    parser.add_argument("--vertex-latency", type=float, default=1.5, help="Latencia simulada de cada inferencia")
+    asyncio.run(main(parser.parse_args()))
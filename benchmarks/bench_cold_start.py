@@ -0,0 +1,148 @@
+"""
+Arranque en frío: tiempo hasta el primer webhook procesado.
+
+Cada corrida es un proceso nuevo (como una instancia nueva de Cloud Run) que
+importa la aplicación, corre el lifespan y procesa un mensaje de texto y
+luego una foto del DNI, con WAHA, el chatbot y Vertex AI simulados
+(benchmarks.stubs). El cliente real de Vertex AI sí se construye (import de
+google.genai y configuración), pero las inferencias van al stub. Compara:
+
+- anterior: google.genai, Pillow, pypdfium2 y el pool de procesos se importan
+  al iniciar, como antes de diferirlos
+- imports diferidos: se importan al primer archivo
+- diferidos + warm-up: WARMUP_ENABLED, el primer webhook llega cuando /health
+  responde 200 (startup probe de Cloud Run)
+
+"proceso" es el tiempo desde que se lanza el intérprete hasta terminar el
+primer webhook de texto (incluye el arranque de Python). Con `--imports N`
+se listan los N imports más lentos (STARTUP_PROFILE).
+
+Uso:
+    python -m benchmarks.bench_cold_start [--repeat 5] [--imports 15]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCENARIOS = (
+    ("eager", "anterior (imports al iniciar)"),
+    ("lazy", "imports diferidos"),
+    ("warmup", "diferidos + warm-up"),
+)
+
+
+def _webhook(index: int, media: bool) -> bytes:
+    payload = {
+        "id": f"false_51999999999@c.us_3EB0{index:016X}",
+        "timestamp": 1700000000 + index,
+        "from": "51999999999@c.us",
+        "fromMe": False,
+        "body": "" if media else "Hola, quisiera información sobre el trámite de mi DNI",
+        "hasMedia": media,
+    }
+    if media:
+        payload["media"] = {"url": "http://localhost:3000/api/files/dni.jpg", "mimetype": "image/jpeg"}
+    return json.dumps({"event": "message", "session": "default", "payload": payload}).encode()
+
+
+async def _child(scenario: str, profile_top: int):
+    started = time.perf_counter()
+    os.environ.update(DEDUP_ENABLED="False", MEDIA_CACHE_ENABLED="False", LOG_LEVEL="WARNING")
+    os.environ["WARMUP_ENABLED"] = str(scenario == "warmup")
+    if profile_top:
+        os.environ.update(STARTUP_PROFILE="True", STARTUP_PROFILE_TOP=str(profile_top), LOG_LEVEL="INFO")
+    if scenario == "eager":
+        import concurrent.futures.process  # noqa: F401
+        import pypdfium2  # noqa: F401
+        from PIL import Image  # noqa: F401
+        from google import genai  # noqa: F401
+        from google.genai import types  # noqa: F401
+
+    import src.main as main
+    imported = time.perf_counter()
+    if profile_top:
+        return
+
+    import httpx
+    import src.services.http_clients as http_clients
+    import src.services.media_pipeline as media_pipeline
+    import src.services.vertex_client as vertex_client
+    import src.services.warmup as warmup
+    from benchmarks import stubs
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    stub = stubs.StubVertexClient(base=0.05, time_scale=1.0)
+    build_vertex_client = vertex_client.get_vertex_client
+
+    def get_vertex_client(location=None):
+        # Se construye el cliente real (ese es el costo a medir) y se usa el stub
+        build_vertex_client(location)
+        return stub
+
+    media_pipeline.get_vertex_client = get_vertex_client
+    warmup.get_vertex_client = get_vertex_client
+    files = {"/api/files/dni.jpg": (stubs.synthetic_jpeg(seed=1), "image/jpeg")}
+    http_clients._clients["waha"] = httpx.AsyncClient(
+        transport=stubs.waha_media_transport(files, download=stubs.Latency(0.01), send=stubs.Latency(0.01))
+    )
+    http_clients._clients["chatbot"] = httpx.AsyncClient(transport=stubs.chatbot_transport(latency=stubs.Latency(0.05)))
+
+    timings = {"imports": imported - started}
+    async with main.lifespan(main.app):
+        timings["lifespan"] = time.perf_counter() - imported
+        while True:
+            status, _ = await stubs.asgi_get(main.app, "/health")
+            if status == 200:
+                break
+            await asyncio.sleep(0.005)
+        timings["ready"] = time.perf_counter() - started
+        for name, media in (("text", False), ("media", True)):
+            start = time.perf_counter()
+            status, body = await stubs.asgi_post(main.app, "/waha/webhook", _webhook(len(timings), media))
+            assert status == 200 and b'"success"' in body, body
+            timings[name] = time.perf_counter() - start
+            if name == "text":
+                timings["first_webhook_at"] = time.time()
+                timings["genai_after_text"] = "google.genai" in sys.modules
+    print(json.dumps(timings))
+
+
+def _run_child(scenario: str) -> dict:
+    launched = time.time()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", scenario],
+        capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(output.stdout.strip().splitlines()[-1])
+    timings["process"] = timings.pop("first_webhook_at") - launched
+    return timings
+
+
+def main(repeat: int):
+    columns = ("imports", "lifespan", "ready", "text", "media", "process")
+    print(f"{'escenario':<32}" + "".join(f"{name + ' ms':>12}" for name in columns) + f"{'genai tras texto':>18}")
+    for scenario, label in SCENARIOS:
+        runs = [_run_child(scenario) for _ in range(repeat)]
+        medians = [statistics.median(run[name] for run in runs) * 1000 for name in columns]
+        genai = "sí" if any(run["genai_after_text"] for run in runs) else "no"
+        print(f"{label:<32}" + "".join(f"{value:>12.0f}" for value in medians) + f"{genai:>18}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Procesos por escenario (se reporta la mediana)")
+    parser.add_argument("--imports", type=int, default=0, help="Lista los N imports más lentos de la aplicación")
+    parser.add_argument("--child", choices=[scenario for scenario, _ in SCENARIOS], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(_child(args.child, 0))
+    elif args.imports:
+        asyncio.run(_child("lazy", args.imports))
+    else:
+        main(args.repeat)
@@ -0,0 +1,84 @@
+"""
+Escrituras por segundo del log de ingesta durable.
+
+Lanza `--concurrency` corrutinas que escriben webhooks de ~1 KiB como el
+endpoint (cada una espera su commit antes de seguir) y luego les hace
+checkpoint, en un solo proceso y un solo event loop. Compara el commit
+agrupado de IngestLog con un commit por webhook, en modo synchronous
+NORMAL y FULL.
+
+Uso:
+    python -m benchmarks.bench_ingest_log [--items 20000] [--concurrency 200] [--dir /tmp]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from src.services.ingest_log import IngestLog
+
+PAYLOAD = json.dumps({
+    "event": "message",
+    "session": "default",
+    "payload": {
+        "id": "false_51999999999@c.us_3EB0" + "0" * 16,
+        "timestamp": 1700000000,
+        "from": "51999999999@c.us",
+        "fromMe": False,
+        "body": "Hola, quisiera información sobre el trámite " * 16,
+        "hasMedia": False,
+    },
+})
+
+
+async def _grouped(path: str, synchronous: str, items: int, concurrency: int) -> float:
+    log = IngestLog(path, synchronous=synchronous)
+    await log.start()
+    per_task = items // concurrency
+
+    async def producer(index: int):
+        for _ in range(per_task):
+            seq = await log.append(f"default:{index}@c.us", PAYLOAD)
+            log.ack(seq)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await log.close()
+    return per_task * concurrency / elapsed
+
+
+def _per_commit(path: str, synchronous: str, items: int) -> float:
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute("CREATE TABLE ingest_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, payload TEXT, created_at REAL)")
+    start = time.perf_counter()
+    for index in range(items):
+        conn.execute("INSERT INTO ingest_log (key, payload, created_at) VALUES (?, ?, ?)", ("k", PAYLOAD, time.time()))
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return items / elapsed
+
+
+async def main(items: int, concurrency: int, directory: str):
+    print(f"{'modo':<28} {'synchronous':>12} {'webhooks/s':>12}")
+    for synchronous in ("normal", "full"):
+        with tempfile.TemporaryDirectory(dir=directory) as folder:
+            # El commit por webhook es mucho más lento: se mide con menos elementos
+            rate = _per_commit(os.path.join(folder, "single.sqlite3"), synchronous.upper(), max(items // 10, 100))
+            print(f"{'un commit por webhook':<28} {synchronous:>12} {rate:>12.0f}")
+            rate = await _grouped(os.path.join(folder, "grouped.sqlite3"), synchronous, items, concurrency)
+            print(f"{'IngestLog (commit agrupado)':<28} {synchronous:>12} {rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Webhooks en vuelo a la vez")
+    parser.add_argument("--dir", default=None, help="Directorio del archivo SQLite (por defecto el temporal del sistema)")
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.concurrency, args.dir))
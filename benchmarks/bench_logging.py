@@ -0,0 +1,141 @@
+"""
+Costo por registro del logging, medido en el hilo que loguea (el del event loop).
+
+Compara la configuración anterior (StreamHandler síncrono y hora de Lima
+recalculada con pytz en cada registro) con el formateador de hora cacheada,
+síncrono y con AsyncBatchHandler. También mide un log con el nivel
+desactivado: f-string del webhook completo contra formato diferido, y un
+destino lento (stderr bloqueado por el colector de logs) con
+`--write-latency-ms` de demora por escritura.
+
+Uso:
+    python -m benchmarks.bench_logging [--records 50000] [--write-latency-ms 1]
+"""
+import argparse
+import logging
+import tempfile
+import time
+from datetime import datetime
+
+from pythonjsonlogger import jsonlogger
+from pytz import timezone
+
+from src.entities.chatbot_entities import WahaRequest
+from src.utils.logger import AsyncBatchHandler, LimaJsonFormatter, Payload, format_str
+
+RENAME_FIELDS = {
+    "levelname": "level",
+    "asctime": "time",
+    "message": "msg",
+    "funcName": "function_name",
+    "filename": "caller",
+}
+
+REQUEST = WahaRequest.model_validate({
+    "event": "message",
+    "session": "default",
+    "payload": {
+        "id": "false_51999999999@c.us_3EB0" + "0" * 16,
+        "timestamp": 1700000000,
+        "from": "51999999999@c.us",
+        "fromMe": False,
+        "body": "Hola, quisiera información sobre el trámite " * 8,
+        "hasMedia": False,
+    },
+})
+
+
+class SlowStream:
+    """Destino que demora cada escritura, como un pipe de stderr con el lector atrasado."""
+
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text: str):
+        time.sleep(self.latency)
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _old_formatter() -> logging.Formatter:
+    formatter = jsonlogger.JsonFormatter(format_str, rename_fields=RENAME_FIELDS)
+    formatter.converter = lambda *args: datetime.now(tz=timezone('America/Lima')).timetuple()
+    return formatter
+
+
+def _logger(name: str, handler: logging.Handler, level: int = logging.INFO) -> logging.Logger:
+    logger = logging.getLogger(f"bench.{name}")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+def _per_record(logger: logging.Logger, records: int, lazy: bool) -> float:
+    start = time.perf_counter()
+    for index in range(records):
+        if lazy:
+            logger.info("Received webhook %s from %s (media: %s)", index, REQUEST.payload.from_, False)
+        else:
+            logger.info(f"Received webhook request: {REQUEST}")
+    return (time.perf_counter() - start) / records * 1e6
+
+
+def _disabled(records: int, lazy: bool) -> float:
+    logger = _logger("disabled", logging.NullHandler(), level=logging.INFO)
+    start = time.perf_counter()
+    for _ in range(records):
+        if lazy:
+            logger.debug("Webhook request: %s", Payload(REQUEST))
+        else:
+            logger.debug(f"Webhook request: {REQUEST}")
+    return (time.perf_counter() - start) / records * 1e6
+
+
+def main(records: int, write_latency: float):
+    print(f"{'configuración':<52} {'us/registro':>12}")
+    with tempfile.TemporaryFile("w") as stream:
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(_old_formatter())
+        cost = _per_record(_logger("old", handler), records, lazy=False)
+        print(f"{'anterior: síncrono, pytz por registro, webhook completo':<52} {cost:>12.2f}")
+
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(LimaJsonFormatter(format_str, rename_fields=RENAME_FIELDS))
+        cost = _per_record(_logger("cached", handler), records, lazy=True)
+        print(f"{'síncrono, hora cacheada, resumen diferido':<52} {cost:>12.2f}")
+
+        handler = AsyncBatchHandler(stream, max_queue=records + 1)
+        handler.setFormatter(LimaJsonFormatter(format_str, rename_fields=RENAME_FIELDS))
+        cost = _per_record(_logger("async", handler), records, lazy=True)
+        start = time.perf_counter()
+        handler.close()
+        drain = time.perf_counter() - start
+        print(f"{'AsyncBatchHandler, resumen diferido':<52} {cost:>12.2f}")
+        print(f"{'  (vaciado del buffer en el hilo de escritura)':<52} {drain * 1e3:>10.1f}ms")
+
+        # Con un destino lento el costo síncrono lo fija la escritura: se miden menos registros
+        slow = SlowStream(stream, write_latency)
+        handler = logging.StreamHandler(slow)
+        handler.setFormatter(_old_formatter())
+        cost = _per_record(_logger("old_slow", handler), min(records, 2000), lazy=False)
+        print(f"{'anterior, destino lento':<52} {cost:>12.2f}")
+        handler = AsyncBatchHandler(slow, max_queue=records + 1)
+        handler.setFormatter(LimaJsonFormatter(format_str, rename_fields=RENAME_FIELDS))
+        cost = _per_record(_logger("async_slow", handler), records, lazy=True)
+        handler.close()
+        print(f"{'AsyncBatchHandler, destino lento':<52} {cost:>12.2f}")
+
+    print(f"{'nivel desactivado, f-string del webhook':<52} {_disabled(records, lazy=False):>12.2f}")
+    print(f"{'nivel desactivado, formato diferido':<52} {_disabled(records, lazy=True):>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--write-latency-ms", type=float, default=1.0, help="Demora por escritura del destino lento")
+    args = parser.parse_args()
+    main(args.records, args.write_latency_ms / 1000)
@@ -0,0 +1,80 @@
+"""
+Tiempo total de transcripción de notas de voz largas: llamada única contra
+fragmentos transcritos en paralelo.
+
+Usa un WAHA simulado y un Vertex AI local (benchmarks.stubs) cuya latencia
+crece con la duración del audio, y recorre el pipeline real
+(convert_media_to_text, motor de inferencia y división Ogg/Opus).
+
+Uso:
+    python -m benchmarks.bench_long_audio [--minutes 1,2,5,10] [--chunk-seconds 45]
+        [--concurrency 8] [--time-scale 0.1]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import src.services.http_clients as http_clients
+import src.services.media_pipeline as media_pipeline
+import src.services.vertex_client as vertex_client
+from src.services.audio_chunking import split_long_audio
+from src.services.inference import InferenceEngine
+from src.services.media_pipeline import MediaProcessor, convert_media_to_text
+from src.services.speech2text import AUDIO_PROCESSOR
+
+from benchmarks.stubs import StubVertexClient, synthetic_ogg_opus, waha_media_transport
+
+
+def _processor(split) -> MediaProcessor:
+    return MediaProcessor(
+        name=AUDIO_PROCESSOR.name,
+        mime_types=AUDIO_PROCESSOR.mime_types,
+        prompt=AUDIO_PROCESSOR.prompt,
+        split=split,
+    )
+
+
+async def main(minutes, chunk_seconds: float, concurrency: int, time_scale: float):
+    files = {
+        f"/api/files/{value}min.oga": (synthetic_ogg_opus(int(value * 60), seed=index), "audio/ogg")
+        for index, value in enumerate(minutes)
+    }
+    http_clients._clients["waha"] = httpx.AsyncClient(transport=waha_media_transport(files))
+    stub = StubVertexClient(time_scale=time_scale)
+    vertex_client._vertex_client = stub
+    media_pipeline.inference_engine = InferenceEngine(concurrency, max_queue=1000, queue_timeout=600)
+
+    def split(data, mime_type):
+        return split_long_audio(data, mime_type, 0, 1 << 40, chunk_seconds, 3.0)
+
+    single, chunked = _processor(None), _processor(split)
+    print(f"{'min':>5} {'KiB':>6} {'fragmentos':>11} {'única s':>9} {'paralelo s':>11} {'aceleración':>12}")
+    for value in minutes:
+        url = f"http://waha.local/api/files/{value}min.oga"
+        timings = {}
+        for label, processor in (("single", single), ("chunked", chunked)):
+            calls = stub.aio.models.calls
+            start = time.perf_counter()
+            await convert_media_to_text(url, processor, use_cache=False)
+            # Se reporta en segundos reales (sin la escala de tiempo del stub)
+            timings[label] = (time.perf_counter() - start) / time_scale
+            timings[f"{label}_calls"] = stub.aio.models.calls - calls
+        size = len(files[f"/api/files/{value}min.oga"][0])
+        print(
+            f"{value:>5g} {size / 1024:>6.0f} {timings['chunked_calls']:>11} {timings['single']:>9.1f} "
+            f"{timings['chunked']:>11.1f} {timings['single'] / timings['chunked']:>11.1f}x"
+        )
+    await http_clients.close_http_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", default="1,2,5,10", help="Duraciones de las notas de voz, separadas por coma")
+    parser.add_argument("--chunk-seconds", type=float, default=45.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="Límite de inferencias simultáneas")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="Factor aplicado a la latencia del stub")
+    args = parser.parse_args()
+    minutes = [float(value) for value in args.minutes.split(",")]
+    asyncio.run(main(minutes, args.chunk_seconds, args.concurrency, args.time_scale))
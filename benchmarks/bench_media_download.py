@@ -0,0 +1,148 @@
+"""
+Memoria pico por solicitud al descargar media desde WAHA.
+
+Compara el camino anterior (response.content -> io.BytesIO -> .read() y el
+hash para la caché) con download_media (streaming en un buffer, hash
+incremental y desborde a disco), usando un WAHA simulado en proceso.
+La memoria de Python se mide con tracemalloc y el RSS pico de cada
+solicitud en un subproceso nuevo (VmHWM de Linux, reiniciado antes de medir).
+
+Uso:
+    python -m benchmarks.bench_media_download [--sizes 1,5,15] [--repeat 5]
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+import src.services.http_clients as http_clients
+from src.services.media_download import download_media
+
+CHUNK = 64 * 1024
+
+
+def _waha_transport(size: int) -> httpx.MockTransport:
+    async def body():
+        sent = 0
+        while sent < size:
+            # Un objeto nuevo por bloque, como los que entrega la red
+            piece = b"\x5a" * min(CHUNK, size - sent)
+            sent += len(piece)
+            yield piece
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "application/pdf", "Content-Length": str(size)},
+            content=body(),
+        )
+
+    return httpx.MockTransport(handler)
+
+
+async def _legacy(client: httpx.AsyncClient, url: str) -> int:
+    response = await client.get(url)
+    response.raise_for_status()
+    data = response.content
+    file = io.BytesIO(data)
+    payload = file.read()
+    hashlib.sha256(payload).hexdigest()
+    return len(payload)
+
+
+async def _streaming(url: str) -> int:
+    with await download_media(url) as media:
+        payload = media.read()
+        return len(payload)
+
+
+async def _measure(factory, repeat: int):
+    peaks, durations = [], []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        await factory()
+        durations.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return max(peaks), sorted(durations)[len(durations) // 2]
+
+
+URL = "http://waha.local/api/files/document.pdf"
+
+
+def _vm_kib(field: str) -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+
+async def _child(path: str, size_mb: float):
+    """Una sola solicitud en un proceso limpio: imprime el RSS pico adicional en KiB."""
+    size = int(size_mb * 1024 * 1024)
+    client = httpx.AsyncClient(transport=_waha_transport(size))
+    http_clients._clients["waha"] = client
+    # Calentamiento con un archivo chico para cargar el código involucrado
+    warmup = httpx.AsyncClient(transport=_waha_transport(CHUNK))
+    http_clients._clients["waha"] = warmup
+    await (_legacy(warmup, URL) if path == "anterior" else _streaming(URL))
+    http_clients._clients["waha"] = client
+    # Reinicia el pico de RSS del proceso (Linux) para medir solo esta solicitud
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    baseline = _vm_kib("VmRSS:")
+    await (_legacy(client, URL) if path == "anterior" else _streaming(URL))
+    print(_vm_kib("VmHWM:") - baseline)
+
+
+def _peak_rss_mib(path: str, size_mb: float) -> float:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_media_download", "--child", path, "--sizes", str(size_mb)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return int(output.strip().splitlines()[-1]) / 1024
+
+
+async def main(sizes_mb, repeat: int):
+    url = URL
+    print(
+        f"{'tamaño':>8} {'camino':>10} {'pico MiB':>10} {'x tamaño':>9} "
+        f"{'RSS MiB':>8} {'p50 ms':>8}"
+    )
+    for size_mb in sizes_mb:
+        size = int(size_mb * 1024 * 1024)
+        transport = _waha_transport(size)
+        client = httpx.AsyncClient(transport=transport)
+        http_clients._clients["waha"] = client
+        for name, factory in (
+            ("anterior", lambda: _legacy(client, url)),
+            ("streaming", lambda: _streaming(url)),
+        ):
+            peak, p50 = await _measure(factory, repeat)
+            rss = _peak_rss_mib(name, size_mb)
+            print(
+                f"{size_mb:>6}MB {name:>10} {peak / 2**20:>10.1f} "
+                f"{peak / size:>9.2f} {rss:>8.1f} {p50 * 1000:>8.1f}"
+            )
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,5,15", help="Tamaños en MiB separados por coma")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", choices=("anterior", "streaming"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = [float(size) for size in args.sizes.split(",")]
+    if args.child:
+        asyncio.run(_child(args.child, sizes[0]))
+    else:
+        asyncio.run(main(sizes, args.repeat))
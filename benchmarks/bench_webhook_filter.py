@@ -0,0 +1,123 @@
+"""
+Webhooks por segundo con una mezcla realista de eventos de WAHA.
+
+Por cada mensaje entrante WAHA también envía el eco de nuestra respuesta
+(fromMe), acks de entrega y lectura y, con menos frecuencia, mensajes de
+grupos, estados y cambios de sesión. Se envían por la aplicación FastAPI
+real (llamada ASGI directa, sin cliente HTTP) con WAHA y el chatbot simulados, y se
+compara:
+
+- sin filtro y con json: todo pasa por Pydantic, los ecos se responden y
+  los eventos que no son mensajes terminan en 422
+- con filtro previo y el decodificador rápido (orjson si está instalado)
+
+Uso:
+    python -m benchmarks.bench_webhook_filter [--requests 20000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import httpx
+
+# La aplicación se arma sin el middleware; el benchmark lo agrega por su cuenta para comparar
+os.environ["WEBHOOK_FILTER_ENABLED"] = "False"
+
+import src.routes.waha_router as waha_router  # noqa: E402
+import src.services.http_clients as http_clients  # noqa: E402
+import src.utils.environment as env  # noqa: E402
+from src.main import app  # noqa: E402
+from src.services.webhook_filter import WebhookFilterMiddleware, loads as fast_loads, webhook_filter  # noqa: E402
+
+from benchmarks.stubs import asgi_post, chatbot_transport, waha_media_transport
+
+# Proporción de cada tipo de evento en la mezcla
+MIX = (
+    ("message", 0.20),
+    ("from_me", 0.20),
+    ("ack", 0.40),
+    ("group", 0.08),
+    ("status", 0.07),
+    ("session", 0.05),
+)
+
+
+def _event(kind: str, index: int) -> bytes:
+    chat = f"5199{index % 500:07d}@c.us"
+    message = {
+        "id": f"false_{chat}_3EB0{index:016X}",
+        "timestamp": 1700000000 + index,
+        "from": chat,
+        "fromMe": False,
+        "body": "Hola, quisiera información sobre el trámite de mi DNI",
+        "hasMedia": False,
+    }
+    if kind == "from_me":
+        message.update(id=f"true_{chat}_3EB0{index:016X}", fromMe=True, body="Claro, te ayudo con eso.")
+    elif kind == "group":
+        message["from"] = f"120363{index % 50:012d}@g.us"
+    elif kind == "status":
+        message["from"] = "status@broadcast"
+    if kind == "ack":
+        event = {"event": "message.ack", "session": "default",
+                 "payload": {"id": message["id"], "from": chat, "fromMe": True, "ack": 3, "ackName": "READ"}}
+    elif kind == "session":
+        event = {"event": "session.status", "session": "default", "payload": {"status": "WORKING"}}
+    else:
+        event = {"event": "message", "session": "default", "payload": message}
+    return json.dumps(event).encode()
+
+
+def _events(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    kinds, weights = zip(*MIX)
+    return [_event(rng.choices(kinds, weights)[0], index) for index in range(count)]
+
+
+async def _run(target, bodies, concurrency: int):
+    http_clients._clients["waha"] = httpx.AsyncClient(transport=waha_media_transport({}))
+    http_clients._clients["chatbot"] = httpx.AsyncClient(transport=chatbot_transport())
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    statuses = {}
+
+    async def sender():
+        while not queue.empty():
+            status, _ = await asgi_post(target, "/waha/webhook", queue.get_nowait())
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return len(bodies) / (time.perf_counter() - start), statuses
+
+
+async def main(requests: int, concurrency: int):
+    # Sin deduplicación entre corridas: cada corrida vuelve a enviar los mismos ids
+    env.DEDUP_ENABLED = False
+    waha_router.logger.disabled = True
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    bodies = _events(requests)
+    print(f"{'configuración':<40} {'webhooks/s':>12}")
+
+    waha_router.loads = json.loads
+    rate, statuses = await _run(app, bodies, concurrency)
+    print(f"{'sin filtro, json':<40} {rate:>12.0f}  {statuses}")
+
+    waha_router.loads = fast_loads
+    filtered = WebhookFilterMiddleware(app, path="/waha/webhook", webhook_filter=webhook_filter)
+    rate, statuses = await _run(filtered, bodies, concurrency)
+    decoder = "orjson" if fast_loads is not json.loads else "json"
+    print(f"{'filtro previo, ' + decoder:<40} {rate:>12.0f}  {statuses}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,315 @@
+"""
+Prueba de carga del gateway completo, sin red ni credenciales.
+
+Envía por la aplicación FastAPI real (llamada ASGI directa) una mezcla de
+webhooks de texto, notas de voz Ogg/Opus y fotos JPEG y PDF del DNI, con
+WAHA (descarga de media y sendText), Vertex AI y el chatbot simulados en
+proceso (benchmarks.stubs), cada uno con su latencia, ruido y tasa de
+errores. Reporta throughput, códigos de respuesta, p50/p95/p99 por etapa
+(las de src.utils.instrumentation más "webhook", el tiempo de respuesta
+completo, también por tipo de mensaje), las decisiones del control de
+admisión y la memoria pico del proceso (VmHWM de Linux).
+
+La carga puede ser de lazo cerrado (`--concurrency` clientes enviando uno
+tras otro) o de lazo abierto (`--rate` webhooks por segundo con llegadas de
+Poisson, que no espera al gateway y muestra las colas cuando se satura).
+La configuración del gateway se cambia con `--env CLAVE=VALOR` (se aplica
+antes de importarlo), p. ej. `--env WEBHOOK_MODE=queue`.
+
+Uso:
+    python -m benchmarks.load_test [--requests 1000] [--concurrency 50 | --rate 20]
+        [--mix text=60,audio=20,jpeg=12,pdf=8] [--time-scale 1]
+        [--vertex-latency 1.5] [--vertex-errors 0.02] [--env CLAVE=VALOR ...]
+
+Con ruteo de modelos (MODEL_ROUTES) se agrega un resumen por nivel: llamadas
+por resultado, p50/p95, tokens, costo estimado y pasos al nivel de respaldo.
+`--model-speed` cambia la latencia simulada por modelo y `--vertex-empty` la
+fracción de respuestas vacías, p. ej.:
+
+    python -m benchmarks.load_test --env MODEL_ROUTES=model_routes.example.json \
+        --model-speed gemini-2.0-flash-lite=0.4,gemini-2.5-pro=2.5 --vertex-empty 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+# benchmarks.stubs y el gateway leen la configuración al importarse: se importan en main()
+
+# Archivos distintos por tipo de media (la caché de media está desactivada igual)
+VARIANTS = 8
+MEDIA_TYPES = {
+    "audio": ("audio/ogg; codecs=opus", "oga"),
+    "jpeg": ("image/jpeg", "jpg"),
+    "pdf": ("application/pdf", "pdf"),
+}
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in ("text", *MEDIA_TYPES):
+            raise argparse.ArgumentTypeError(f"tipo desconocido en --mix: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def _files(stubs, audio_seconds: int) -> Dict[str, tuple]:
+    files = {}
+    for index in range(VARIANTS):
+        files[f"/api/files/{index}.oga"] = (stubs.synthetic_ogg_opus(audio_seconds + 3 * index, seed=index), "audio/ogg")
+        files[f"/api/files/{index}.jpg"] = (stubs.synthetic_jpeg(seed=index), "image/jpeg")
+        files[f"/api/files/{index}.pdf"] = (stubs.synthetic_pdf(seed=index), "application/pdf")
+    return files
+
+
+def _webhook(kind: str, index: int, chats: int) -> bytes:
+    chat = f"5199{index % chats:07d}@c.us"
+    payload = {
+        "id": f"false_{chat}_3EB0{index:016X}",
+        "timestamp": 1700000000 + index,
+        "from": chat,
+        "fromMe": False,
+        "body": "Hola, quisiera información sobre el trámite de mi DNI",
+        "hasMedia": kind != "text",
+    }
+    if kind != "text":
+        mimetype, extension = MEDIA_TYPES[kind]
+        payload["body"] = ""
+        payload["media"] = {
+            "url": f"http://localhost:3000/api/files/{index % VARIANTS}.{extension}",
+            "mimetype": mimetype,
+        }
+    return json.dumps({"event": "message", "session": "default", "payload": payload}).encode()
+
+
+def _workload(requests: int, mix: Dict[str, float], chats: int, seed: int) -> List[tuple]:
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    return [(kind, _webhook(kind, index, chats)) for index, kind in enumerate(rng.choices(kinds, weights, k=requests))]
+
+
+def _parse_speeds(value: str) -> Dict[str, float]:
+    speeds = {}
+    for item in filter(None, value.split(",")):
+        model, _, factor = item.partition("=")
+        speeds[model.strip()] = float(factor)
+    return speeds
+
+
+def _vm_kib(field: str) -> int:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _reset_peak_rss():
+    # "5" reinicia VmHWM al RSS actual (Linux >= 4.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _report_tiers(model_routing, tier_samples: Dict[str, List[float]]):
+    calls: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for (tier, _, outcome), value in model_routing.MODEL_TIER_CALLS._values.items():
+        calls[tier][outcome] = calls[tier].get(outcome, 0) + int(value)
+    tokens: Dict[str, float] = defaultdict(float)
+    for (tier, _), value in model_routing.MODEL_TIER_TOKENS._values.items():
+        tokens[tier] += value
+    print(f"\n{'nivel':<10} {'modelo':<24} {'p50 ms':>9} {'p95 ms':>9} {'tokens':>9} {'USD':>9}  llamadas")
+    for name, tier in model_routing.model_routes.tiers.items():
+        ordered = sorted(tier_samples.get(name, [])) or [0.0]
+        cost = model_routing.MODEL_TIER_COST._values.get((name,), 0.0)
+        print(
+            f"{name:<10} {tier.model:<24} {_percentile(ordered, 0.5) * 1e3:>9.2f} {_percentile(ordered, 0.95) * 1e3:>9.2f} "
+            f"{tokens[name]:>9.0f} {cost:>9.4f}  {calls.get(name, {})}"
+        )
+    fallbacks = {
+        "/".join(key): int(value) for key, value in sorted(model_routing.MODEL_TIER_FALLBACKS._values.items()) if value
+    }
+    print(f"respaldos: {fallbacks}")
+
+
+def _report(samples: Dict[str, List[float]]):
+    print(f"\n{'etapa':<12} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    order = ("webhook", "webhook_text", "webhook_audio", "webhook_jpeg", "webhook_pdf", "filter", "parse", "download", "mime", "inference", "chatbot", "send")
+    for name in sorted(samples, key=lambda name: (order.index(name) if name in order else len(order), name)):
+        ordered = sorted(samples[name])
+        values = [_percentile(ordered, q) * 1e3 for q in (0.5, 0.95, 0.99)] + [ordered[-1] * 1e3]
+        print(f"{name:<12} {len(ordered):>7} " + " ".join(f"{value:>9.2f}" for value in values))
+
+
+async def main(args):
+    # La configuración se lee al importar el gateway: se aplica antes
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        os.environ[key] = value
+    os.environ.setdefault("MEDIA_CACHE_ENABLED", "False")
+    os.environ.setdefault("DEDUP_ENABLED", "False")
+    os.environ.setdefault("INFERENCE_MAX_QUEUE", "10000")
+    # Todos los webhooks usan la misma sesión: sin este ajuste mediría el límite de WhatsApp
+    # (--env OUTBOUND_RATE=10 para verlo)
+    os.environ.setdefault("OUTBOUND_RATE", "1000")
+
+    from benchmarks import stubs
+    import src.services.http_clients as http_clients
+    import src.services.vertex_client as vertex_client
+    import src.utils.environment as env
+    import src.utils.instrumentation as instrumentation
+    from src.services.admission import ADMISSION_DECISIONS, admission_controller
+    from src.services.outbound import OUTBOUND_MESSAGES, OUTBOUND_THROTTLED
+    from src.services import model_routing
+    from src.main import app, lifespan
+    from src.utils.logger import logger
+
+    logger.disabled = True
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    scale = args.time_scale
+    seed = args.seed
+    stub = stubs.StubVertexClient(
+        base=args.vertex_latency, per_audio_second=args.vertex_per_audio_second, time_scale=scale,
+        jitter=args.jitter, error_rate=args.vertex_errors, seed=seed,
+        model_speed=args.model_speed, empty_rate=args.vertex_empty,
+    )
+    waha = stubs.waha_media_transport(
+        _files(stubs, args.audio_seconds),
+        download=stubs.Latency(args.download_latency, args.jitter, args.download_errors, scale, seed + 1),
+        send=stubs.Latency(args.send_latency, args.jitter, args.send_errors, scale, seed + 2),
+    )
+    chatbot = stubs.chatbot_transport(
+        latency=stubs.Latency(args.chatbot_latency, args.jitter, args.chatbot_errors, scale, seed + 3)
+    )
+
+    # Muestras crudas por etapa además del histograma de buckets
+    samples: Dict[str, List[float]] = defaultdict(list)
+    observe = instrumentation.STAGE_LATENCY.observe
+
+    def record(value: float, **labels):
+        samples[labels["stage"]].append(value)
+        observe(value, **labels)
+
+    instrumentation.STAGE_LATENCY.observe = record
+
+    tier_samples: Dict[str, List[float]] = defaultdict(list)
+    observe_tier = model_routing.MODEL_TIER_LATENCY.observe
+
+    def record_tier(value: float, **labels):
+        tier_samples[labels["tier"]].append(value)
+        observe_tier(value, **labels)
+
+    model_routing.MODEL_TIER_LATENCY.observe = record_tier
+
+    workload = _workload(args.requests, args.mix, args.chats, seed)
+    statuses: Dict[int, int] = defaultdict(int)
+    kinds: Dict[str, int] = defaultdict(int)
+
+    async def send_one(kind: str, body: bytes):
+        start = time.perf_counter()
+        status, _ = await stubs.asgi_post(app, "/waha/webhook", body)
+        elapsed = time.perf_counter() - start
+        samples["webhook"].append(elapsed)
+        samples[f"webhook_{kind}"].append(elapsed)
+        statuses[status] += 1
+        kinds[kind] += 1
+
+    async with lifespan(app):
+        http_clients._clients["waha"] = httpx.AsyncClient(transport=waha, base_url=env.WAHA_API_URL)
+        http_clients._clients["chatbot"] = httpx.AsyncClient(transport=chatbot)
+        vertex_client._vertex_client = stub
+
+        _reset_peak_rss()
+        baseline = _vm_kib("VmRSS:")
+        start = time.perf_counter()
+        if args.rate:
+            # Lazo abierto: llegadas de Poisson independientes de la respuesta del gateway
+            rng = random.Random(seed)
+            tasks = []
+            for kind, body in workload:
+                tasks.append(asyncio.create_task(send_one(kind, body)))
+                await asyncio.sleep(rng.expovariate(args.rate))
+            await asyncio.gather(*tasks)
+        else:
+            pending = iter(workload)
+
+            async def client():
+                for kind, body in pending:
+                    await send_one(kind, body)
+
+            await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        submitted = time.perf_counter() - start
+    # Al salir del lifespan se vacía la cola del modo queue (WEBHOOK_DRAIN_TIMEOUT)
+    elapsed = time.perf_counter() - start
+    peak = _vm_kib("VmHWM:")
+
+    print(f"webhooks: {args.requests} {dict(kinds)}  modo: {env.WEBHOOK_MODE}  escala de tiempo: {scale:g}")
+    print(f"respuestas HTTP: {dict(statuses)}")
+    print(
+        f"throughput: {args.requests / submitted:.1f} webhooks/s respondidos, "
+        f"{args.requests / elapsed:.1f} webhooks/s terminados"
+    )
+    print(f"llamadas a Vertex AI: {stub.aio.models.calls} ({stub.aio.models.errors} con error simulado)")
+    print(f"memoria: RSS pico {peak / 1024:.1f} MiB (+{(peak - baseline) / 1024:.1f} MiB durante la carga)")
+    decisions = {
+        "/".join(key): int(value) for key, value in sorted(ADMISSION_DECISIONS._values.items()) if value
+    }
+    print(f"admisión: límite final {admission_controller.limit:.1f}, decisiones {decisions}")
+    outbound = {"/".join(key): int(value) for key, value in sorted(OUTBOUND_MESSAGES._values.items()) if value}
+    throttled = int(sum(OUTBOUND_THROTTLED._values.values()))
+    print(f"cola de salida: {outbound}, esperas por límite {throttled}")
+    if len(model_routing.model_routes.tiers) > 1:
+        _report_tiers(model_routing, tier_samples)
+    _report(samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Clientes simultáneos (lazo cerrado)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Webhooks por segundo (lazo abierto, Poisson)")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix("text=60,audio=20,jpeg=12,pdf=8"))
+    parser.add_argument("--chats", type=int, default=500, help="Chats distintos (los de un mismo chat van en orden)")
+    parser.add_argument("--audio-seconds", type=int, default=20, help="Duración de la nota de voz más corta")
+    parser.add_argument(
+        "--time-scale", type=float, default=1.0,
+        help="Factor aplicado a todas las latencias simuladas (los tiempos reportados son los medidos)",
+    )
+    parser.add_argument("--jitter", type=float, default=0.3, help="Desvío del ruido lognormal de las latencias")
+    parser.add_argument("--vertex-latency", type=float, default=1.5, help="Segundos por llamada a Vertex AI")
+    parser.add_argument("--vertex-per-audio-second", type=float, default=0.05)
+    parser.add_argument("--vertex-errors", type=float, default=0.0, help="Fracción de llamadas con 503")
+    parser.add_argument(
+        "--model-speed", type=_parse_speeds, default={}, metavar="MODELO=FACTOR,...",
+        help="Multiplica la latencia de Vertex AI por modelo (ruteo de modelos)",
+    )
+    parser.add_argument("--vertex-empty", type=float, default=0.0, help="Fracción de respuestas vacías")
+    parser.add_argument("--download-latency", type=float, default=0.15)
+    parser.add_argument("--download-errors", type=float, default=0.0)
+    parser.add_argument("--send-latency", type=float, default=0.1)
+    parser.add_argument("--send-errors", type=float, default=0.0)
+    parser.add_argument("--chatbot-latency", type=float, default=1.0)
+    parser.add_argument("--chatbot-errors", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--env", action="append", default=[], metavar="CLAVE=VALOR", help="Configuración del gateway")
+    asyncio.run(main(parser.parse_args()))
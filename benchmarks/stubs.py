@@ -0,0 +1,292 @@
+"""
+Dobles locales de los servicios externos para los benchmarks (sin red ni credenciales).
+
+- Latency: latencia simulada (base con ruido lognormal) y tasa de errores.
+- StubVertexClient: imita `client.aio.models.generate_content` con una
+  latencia configurable que crece con la duración del audio (y varía por modelo).
+- synthetic_ogg_opus: genera una nota de voz Ogg/Opus sintética (paquetes de
+  relleno con la estructura de páginas y gránulos de un archivo real).
+- synthetic_jpeg / synthetic_pdf: foto y PDF de un documento.
+- waha_media_transport: WAHA simulado que sirve archivos en memoria y acepta sendText.
+- chatbot_transport: chatbot simulado que responde siempre lo mismo.
+- asgi_request / asgi_post / asgi_get: llaman a la aplicación ASGI sin pasar por un cliente HTTP.
+"""
+import asyncio
+import io
+import random
+import struct
+import zlib
+from types import SimpleNamespace
+from typing import Dict, Iterable, Optional, Tuple
+
+import httpx
+
+from src.services.audio_chunking import OPUS_SAMPLE_RATE, OggPage, ogg_opus_duration
+
+class Latency:
+    """
+    Latencia simulada de un upstream: `base` segundos multiplicados por un
+    ruido lognormal de desvío `jitter` (cola larga como en un servicio real) y
+    por `time_scale`. Con probabilidad `error_rate` la llamada falla.
+    """
+
+    def __init__(self, base: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 time_scale: float = 1.0, seed: Optional[int] = None):
+        self.base = base
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.time_scale = time_scale
+        self._rng = random.Random(seed)
+
+    def delay(self, extra: float = 0.0) -> float:
+        value = self.base + extra
+        if self.jitter:
+            value *= self._rng.lognormvariate(0, self.jitter)
+        return value * self.time_scale
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    async def wait(self, extra: float = 0.0):
+        delay = self.delay(extra)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class StubVertexError(Exception):
+    """Error transitorio de Vertex AI simulado (el SDK expone el código HTTP en `code`)."""
+
+    def __init__(self, code: int = 503):
+        super().__init__(f"{code} UNAVAILABLE (simulado)")
+        self.code = code
+
+
+# Paquetes Opus de 20 ms
+_FRAME_SAMPLES = OPUS_SAMPLE_RATE // 50
+
+
+def _page(flags: int, granule: int, sequence: int, packets) -> bytes:
+    segments = bytearray()
+    for packet in packets:
+        segments += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    return OggPage(flags, granule, 0x5EED, sequence, bytes(segments), b"".join(packets)).encode(
+        flags, granule, sequence
+    )
+
+
+def synthetic_ogg_opus(seconds: int, seed: int = 0, pre_skip: int = 312) -> bytes:
+    """
+    Nota de voz Ogg/Opus de `seconds` segundos (una página por segundo) con
+    pausas de ~1 s cada 8-15 s, donde los paquetes son de pocos bytes como en
+    un silencio real con DTX.
+    """
+    rng = random.Random(seed)
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 16000, 0, 0)
+    vendor = b"stub"
+    tags = b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+    pages = [_page(0x02, 0, 0, [head]), _page(0, 0, 1, [tags])]
+    granule = pre_skip
+    next_pause = rng.randint(8, 15)
+    for second in range(seconds):
+        silent = second == next_pause
+        if silent:
+            next_pause = second + rng.randint(8, 15)
+        packets = [
+            rng.randbytes(3 if silent else rng.randint(30, 60))
+            for _ in range(OPUS_SAMPLE_RATE // _FRAME_SAMPLES)
+        ]
+        granule += OPUS_SAMPLE_RATE
+        flags = 0x04 if second == seconds - 1 else 0
+        pages.append(_page(flags, granule, second + 2, packets))
+    return b"".join(pages)
+
+
+class StubVertexModels:
+    """
+    Latencia = `base` + `per_audio_second` * duración del audio, multiplicada
+    por `time_scale` para que el benchmark corra rápido manteniendo las
+    proporciones; `jitter` y `error_rate` como en Latency (los errores son 503).
+    `model_speed` multiplica la latencia por modelo (p. ej. {"lite": 0.4}) y con
+    probabilidad `empty_rate` la respuesta viene vacía (respuesta de baja calidad).
+    """
+
+    def __init__(self, base: float = 0.8, per_audio_second: float = 0.08, time_scale: float = 1.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None,
+                 model_speed: Optional[Dict[str, float]] = None, empty_rate: float = 0.0):
+        self.per_audio_second = per_audio_second
+        self.latency = Latency(base, jitter, error_rate, time_scale, seed)
+        self.model_speed = model_speed or {}
+        self.empty_rate = empty_rate
+        self.calls = 0
+        self.errors = 0
+        self.calls_by_model: Dict[str, int] = {}
+
+    async def generate_content(self, model, contents, config):
+        self.calls += 1
+        self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+        files = [part.inline_data for part in contents[0].parts if part.inline_data is not None]
+        seconds = sum(ogg_opus_duration(media.data) or 0.0 for media in files)
+        delay = self.latency.delay(self.per_audio_second * seconds) * self.model_speed.get(model, 1.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.latency.fails():
+            self.errors += 1
+            raise StubVertexError()
+        # Tokens aproximados: 32 por segundo de audio, 258 por imagen
+        prompt_tokens = int(32 * seconds) if seconds else 258 * len(files)
+        usage = SimpleNamespace(
+            total_token_count=prompt_tokens + 20, prompt_token_count=prompt_tokens, candidates_token_count=20
+        )
+        text = f"[{seconds:.0f} s transcritos]" if seconds else "DNI 12345678 - PEREZ GARCIA, JUAN CARLOS"
+        if self.empty_rate and self.latency._rng.random() < self.empty_rate:
+            text = ""
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def get(self, model):
+        # Metadatos del modelo (consulta del warm-up)
+        await self.latency.wait()
+        return SimpleNamespace(name=model)
+
+
+class StubVertexClient:
+    def __init__(self, **kwargs):
+        self.aio = SimpleNamespace(models=StubVertexModels(**kwargs))
+
+
+def waha_media_transport(
+    files: Dict[str, Tuple[bytes, str]],
+    download: Optional[Latency] = None,
+    send: Optional[Latency] = None,
+) -> httpx.MockTransport:
+    """
+    WAHA simulado: `files` mapea la ruta a (contenido, Content-Type); sendText
+    responde 201. `download` y `send` agregan latencia y errores 503.
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        latency = send if request.url.path == "/api/sendText" else download
+        if latency is not None:
+            await latency.wait()
+            if latency.fails():
+                return httpx.Response(503, json={"error": "simulado"})
+        if request.url.path == "/api/sendText":
+            return httpx.Response(201, json={"id": "true_sent"})
+        if request.url.path not in files:
+            return httpx.Response(404)
+        data, content_type = files[request.url.path]
+        return httpx.Response(200, content=data, headers={"Content-Type": content_type})
+
+    return httpx.MockTransport(handler)
+
+
+def chatbot_transport(answer: str = "Claro, te ayudo con eso.", latency: Optional[Latency] = None) -> httpx.MockTransport:
+    """Chatbot simulado: responde `answer` a cualquier consulta; `latency` agrega demora y errores 503."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency is not None:
+            await latency.wait()
+            if latency.fails():
+                return httpx.Response(503, json={"status": "ERROR"})
+        return httpx.Response(200, json={"status": "OK", "data": {"answer": answer}})
+
+    return httpx.MockTransport(handler)
+
+
+def synthetic_jpeg(seed: int = 0, size: Tuple[int, int] = (1600, 1200)) -> bytes:
+    """
+    Foto de un documento (fondo liso, líneas de texto y ruido) con Pillow; sin
+    Pillow, un JPEG mínimo de 1x1 (el preprocesamiento se omite igual).
+    """
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return bytes.fromhex(
+            "ffd8ffe000104a46494600010100000100010000ffdb004300080606070605080707070909080a0c140d0c0b0b0c1912"
+            "130f141d1a1f1e1d1a1c1c20242e2720222c231c1c2837292c30313434341f27393d38323c2e333432ffc0000b080001"
+            "000101011100ffc4001f0000010501010101010100000000000000000102030405060708090a0bffc400b5100002010303"
+            "020403050504040000017d01020300041105122131410613516107227114328191a1082342b1c11552d1f02433627282"
+            "090a161718191a25262728292a3435363738393a434445464748494a535455565758595a636465666768696a73747576"
+            "7778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9ca"
+            "d2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9faffda0008010100003f00fbd3ffd9"
+        )
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, (rng.randint(170, 230), 200, 190))
+    draw = ImageDraw.Draw(image)
+    for line in range(12):
+        y = height // 6 + line * height // 20
+        draw.rectangle((width // 10, y, width // 10 + rng.randint(width // 4, width // 2), y + height // 60), fill=(30, 30, 40))
+    for _ in range(width * height // 400):
+        draw.point((rng.randrange(width), rng.randrange(height)), fill=(rng.randrange(256),) * 3)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def synthetic_pdf(seed: int = 0) -> bytes:
+    """PDF válido de una página con algunas líneas de texto (el `seed` cambia el contenido)."""
+    rng = random.Random(seed)
+    lines = " ".join(
+        f"BT /F1 14 Tf 72 {720 - 24 * index} Td (DNI {rng.randint(10000000, 99999999)} PEREZ GARCIA) Tj ET"
+        for index in range(12)
+    )
+    stream = zlib.compress(lines.encode())
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+async def asgi_request(
+    app, method: str, path: str, body: bytes = b"", headers: Iterable[Tuple[bytes, bytes]] = ()
+) -> Tuple[int, bytes]:
+    """Llama a la aplicación ASGI directamente (sin cliente HTTP); retorna (estado, cuerpo)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), *headers],
+        "client": ("127.0.0.1", 1234), "server": ("gateway", 80),
+    }
+    sent = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def asgi_post(app, path: str, body: bytes, headers: Iterable[Tuple[bytes, bytes]] = ()) -> Tuple[int, bytes]:
+    return await asgi_request(app, "POST", path, body, headers)
+
+
+async def asgi_get(app, path: str) -> Tuple[int, bytes]:
+    return await asgi_request(app, "GET", path)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Dict, Any, Optional
 
 class MediaPayload(BaseModel):
@@ -19,3 +19,13 @@ class WahaRequest(BaseModel):
     event: str
     session: str
     payload: MessagePayload
+    # Opciones de procesamiento que no vienen en el webhook
+    _bypass_cache: bool = PrivateAttr(default=False)
+    # Número de secuencia en el log de ingesta (None si el log está desactivado)
+    _ingest_seq: Optional[int] = PrivateAttr(default=None)
+    # Secuencias de otros mensajes unidos en este (lotes agrupados), a confirmar junto con él
+    _merged_seqs: List[int] = PrivateAttr(default_factory=list)
+    # Quedó en un lote agrupado: el checkpoint lo hace el despacho del lote, no el webhook
+    _buffered: bool = PrivateAttr(default=False)
+    # Id de traza propagado a WAHA y al chatbot (None si TRACE_HEADER está vacío)
+    _trace_id: Optional[str] = PrivateAttr(default=None)
@@ -0,0 +1,100 @@
+from datetime import datetime
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, Tuple
+
+# Dígito de control del DNI peruano: pesos por posición y tablas del carácter esperado
+# (según el documento el carácter impreso es un número o una letra)
+_CHECK_WEIGHTS = (3, 2, 7, 6, 5, 4, 3, 2)
+_CHECK_NUMBERS = "67890112345"
+_CHECK_LETTERS = "KABCDEFGHIJ"
+
+DATE_FORMAT = "%d/%m/%Y"
+
+
+def dni_check_characters(numero_dni: str) -> Tuple[str, str]:
+    """Caracteres de control válidos (número y letra) para un DNI de 8 dígitos."""
+    total = sum(int(digit) * weight for digit, weight in zip(numero_dni, _CHECK_WEIGHTS))
+    index = 11 - total % 11
+    if index == 11:
+        index = 0
+    return _CHECK_NUMBERS[index], _CHECK_LETTERS[index]
+
+
+# También se usa como response_schema de Vertex AI (el docstring y las descripciones
+# llegan al modelo), por eso los campos son tipos simples y la validación
+# (longitud, dígito de control, fecha) se hace localmente
+class DniExtraction(BaseModel):
+    """Datos de un DNI peruano."""
+    legible: bool = Field(description="false si la imagen no permite leer los datos del DNI")
+    apellidos: Optional[str] = Field(default=None, description="Apellidos tal como aparecen en el DNI")
+    prenombres: Optional[str] = Field(default=None, description="Prenombres tal como aparecen en el DNI")
+    sexo: Optional[str] = Field(default=None, description="M o F")
+    fecha_nacimiento: Optional[str] = Field(default=None, description="Fecha de nacimiento en formato DD/MM/AAAA")
+    numero_dni: Optional[str] = Field(default=None, description="Número de DNI de 8 dígitos, sin el dígito de control")
+    digito_verificacion: Optional[str] = Field(
+        default=None, description="Carácter que aparece después del guion del número de DNI, si es visible"
+    )
+
+    @field_validator("apellidos", "prenombres", "digito_verificacion")
+    @classmethod
+    def _strip(cls, value: Optional[str]) -> Optional[str]:
+        value = " ".join(value.split()).upper() if value else None
+        return value or None
+
+    @field_validator("sexo")
+    @classmethod
+    def _validate_sexo(cls, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        value = value.strip().upper()[:1]
+        if value not in ("M", "F"):
+            raise ValueError("el sexo debe ser M o F")
+        return value
+
+    @field_validator("fecha_nacimiento")
+    @classmethod
+    def _validate_fecha(cls, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        # El DNI imprime la fecha separada por espacios ("01 02 1990")
+        value = value.strip().replace(" ", "/").replace("-", "/")
+        try:
+            parsed = datetime.strptime(value, DATE_FORMAT)
+        except ValueError:
+            raise ValueError("la fecha de nacimiento debe tener el formato DD/MM/AAAA")
+        if parsed > datetime.now():
+            raise ValueError("la fecha de nacimiento está en el futuro")
+        return parsed.strftime(DATE_FORMAT)
+
+    @field_validator("numero_dni")
+    @classmethod
+    def _validate_numero(cls, value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        value = value.replace(" ", "").replace(".", "")
+        if len(value) != 8 or not value.isdigit():
+            raise ValueError("el número de DNI debe tener 8 dígitos")
+        return value
+
+    @model_validator(mode="after")
+    def _validate_document(self) -> "DniExtraction":
+        if not self.legible:
+            return self
+        if self.numero_dni is None or self.apellidos is None or self.prenombres is None:
+            raise ValueError("faltan el número de DNI, los apellidos o los prenombres")
+        if self.digito_verificacion and self.digito_verificacion not in dni_check_characters(self.numero_dni):
+            raise ValueError("el dígito de control no corresponde al número de DNI")
+        return self
+
+    def to_message(self) -> str:
+        """Texto compacto que se envía al chatbot."""
+        if not self.legible:
+            return "La imagen del DNI no es legible"
+        fields = [
+            ("Apellidos", self.apellidos),
+            ("Prenombres", self.prenombres),
+            ("Sexo", self.sexo),
+            ("Fecha de Nacimiento", self.fecha_nacimiento),
+            ("DNI", self.numero_dni),
+        ]
+        return "\n".join(f"{label}: {value}" for label, value in fields if value)
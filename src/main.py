@@ -1,21 +1,75 @@
-import uvicorn
+import time
+_imports_started = time.perf_counter()
+# Antes que el resto de los imports, para poder medirlos (STARTUP_PROFILE)
+from src.utils.startup import import_profiler_from_env, STARTUP_SECONDS
+import_profiler = import_profiler_from_env()
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import os
 from dotenv import load_dotenv
 load_dotenv()
-from src.routes.waha_router import router as waha_router
+from src.routes.waha_router import router as waha_router, webhook_workers, album_coalescer, message_coalescer, outbound_scheduler, ingest_log, replay_ingest_log
+import src.utils.environment as env
+from src.services.http_clients import init_http_clients, close_http_clients
+from src.services.image_preprocess import shutdown_preprocess_pool
+from src.services.warmup import warm_up
+from src.services.admission import admission_controller
+from src.utils.metrics import registry
+from src.utils.logger import logger as gateway_logger
+from src.services.webhook_filter import WebhookFilterMiddleware, webhook_filter
 
 # Cargar variables de entorno del archivo .env
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+STARTUP_SECONDS.set(time.perf_counter() - _imports_started, phase="imports")
+if import_profiler is not None:
+    import_profiler.uninstall()
+    gateway_logger.info(
+        "Imports de la aplicación: %.0f ms", (time.perf_counter() - _imports_started) * 1000
+    )
+    for module, cumulative, own in import_profiler.slowest(env.STARTUP_PROFILE_TOP):
+        gateway_logger.info("Import %s: %.1f ms (propio %.1f ms)", module, cumulative * 1000, own * 1000)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Crea los recursos compartidos al iniciar y los libera al apagar"""
+    lifespan_started = time.perf_counter()
+    await init_http_clients()
+    if env.ADMISSION_ENABLED:
+        admission_controller.start()
+    if env.WEBHOOK_MODE == "queue":
+        await webhook_workers.start()
+    if ingest_log is not None:
+        await ingest_log.start()
+        await replay_ingest_log()
+    # En segundo plano: el servidor empieza a escuchar y /health reporta cuando termina
+    warm_up.start()
+    STARTUP_SECONDS.set(time.perf_counter() - lifespan_started, phase="lifespan")
+    try:
+        yield
+    finally:
+        await warm_up.stop()
+        await admission_controller.stop()
+        await webhook_workers.stop(drain_timeout=env.WEBHOOK_DRAIN_TIMEOUT)
+        # Los lotes abiertos se despachan antes de cerrar los clientes HTTP
+        await album_coalescer.drain(timeout=env.WEBHOOK_DRAIN_TIMEOUT)
+        await message_coalescer.drain(timeout=env.WEBHOOK_DRAIN_TIMEOUT)
+        await outbound_scheduler.drain(timeout=env.WEBHOOK_DRAIN_TIMEOUT)
+        if ingest_log is not None:
+            await ingest_log.close()
+        await close_http_clients()
+        shutdown_preprocess_pool()
+
 app = FastAPI(
     title="WAHA Gateway",
     description="API Gateway for processing WAHA messages",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -26,19 +80,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Descarta acks, ecos propios y demás eventos ignorados antes de rutear y validar el webhook
+if env.WEBHOOK_FILTER_ENABLED:
+    app.add_middleware(WebhookFilterMiddleware, path="/waha/webhook", webhook_filter=webhook_filter)
+
 app.include_router(waha_router)
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint para Cloud Run"""
+    """Health check endpoint para Cloud Run (503 mientras corre el warm-up)"""
+    if not warm_up.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", "service": "WAHA Gateway"})
     return {"status": "healthy", "service": "WAHA Gateway"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return registry.render()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "WAHA Gateway API", "docs": "/docs"}
 
 if __name__ == "__main__":
+    # En Cloud Run la imagen ejecuta uvicorn directamente; aquí solo para correr en local
+    import uvicorn
     # Cloud Run proporciona el puerto a través de la variable de entorno PORT
     port = int(os.environ.get("PORT", 8090))
     uvicorn.run("src.main:app", host="0.0.0.0", port=port, reload=False)
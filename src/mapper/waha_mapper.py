@@ -1,5 +1,5 @@
 from src.entities.chatbot_entities import WahaRequest
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 def map_to_chatbot_payload(request: WahaRequest, assistant: str, assistantName: str) -> Dict[str, str]:
     return {
@@ -14,6 +14,17 @@ def map_to_chatbot_payload(request: WahaRequest, assistant: str, assistantName:
         "conversationId": request.payload.from_.split('@')[0][2:] # Obtener el valor del numero telefonico sin el prefijo ni el @
     }
 
+def merge_requests(requests: List[WahaRequest]) -> WahaRequest:
+    """Une mensajes seguidos del mismo chat en uno solo; el último aporta el id y los metadatos"""
+    if len(requests) == 1:
+        return requests[0]
+    bodies = [r.payload.body.strip() for r in requests if r.payload.body and r.payload.body.strip()]
+    # Los archivos ya se convirtieron a texto, el mensaje unido no lleva media
+    payload = requests[-1].payload.model_copy(
+        update={"body": "\n".join(bodies) or None, "hasMedia": False, "media": None}
+    )
+    return requests[-1].model_copy(update={"payload": payload})
+
 def map_to_send_text_payload(
     user: str, 
     response_text: str, 
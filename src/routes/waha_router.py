@@ -1,32 +1,89 @@
-from fastapi import APIRouter, Request
+import asyncio
+import time
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from typing import Dict, List, Optional
 import httpx
 from src.entities.chatbot_entities import WahaRequest
-from src.mapper.waha_mapper import map_to_chatbot_payload, map_to_send_text_payload
+from src.mapper.waha_mapper import map_to_chatbot_payload, map_to_send_text_payload, merge_requests
 import os
-from src.services.speech2text import convert_speech_to_text
-from src.services.image2text import convert_image_to_text
+from src.services.media_pipeline import get_processor, convert_media_to_text, convert_group_to_text
+from src.services.image2text import ALBUM_PROCESSOR
+from src.services.http_clients import get_http_client, get_upstream, is_unsent_http_error, UPSTREAM_LATENCY
+from src.services.worker_pool import WorkerPool, KeyedLocks, QueueFullError
+from src.services.dedup import webhook_deduplicator
+from src.services.coalescer import Coalescer
+from src.services.ingest_log import IngestLog, INGEST_REPLAYED
+from src.services.webhook_filter import loads, WEBHOOK_EVENTS
+from src.services.chatbot_client import ask_chatbot, reply_streaming, ChatbotError, CHATBOT_FIRST_REPLY
+from src.services.admission import admission_controller, AdmissionRejectedError
+from src.services.outbound import OutboundScheduler
 import src.utils.environment as env
 import json
-from src.utils.logger import logger
+from src.utils.logger import logger, Payload
+from src.utils.resilience import CircuitOpenError, DeadlineExceededError, deadline_scope
+from src.utils.instrumentation import stage, record_bytes, new_trace_id, set_trace_id, trace_headers
 
 router = APIRouter(prefix="/waha", tags=["waha"])
 
 
-async def send_waha_message(user: str, message: str, session: str):
-    """Send a message to WAHA API sendText endpoint"""
-    try:
-        payload = map_to_send_text_payload(user, message, session)
-        async with httpx.AsyncClient() as client:
+async def post_send_text(session: str, user: str, message: str, headers: Dict[str, str]):
+    """POST to WAHA's sendText endpoint; raises on failure"""
+    payload = map_to_send_text_payload(user, message, session)
+    client = get_http_client("waha")
+
+    async def _post():
+        with UPSTREAM_LATENCY.time(upstream="waha", operation="send_text"):
             response = await client.post(
                 f"{env.WAHA_API_URL}/api/sendText",
                 json=payload,
                 headers={
                     "Content-Type": "application/json",
                     "X-Api-Key": env.WAHA_API_KEY,
+                    **headers,
                 },
             )
             response.raise_for_status()
+            record_bytes("send", "out", len(response.request.content))
             return response.json()
+
+    # Reintentar solo si el mensaje no llegó a WAHA, para no enviarlo dos veces
+    with stage("send"):
+        return await get_upstream("waha").call(_post, retry_on=is_unsent_http_error)
+
+
+async def _deliver_scheduled(session: str, user: str, message: str, headers: Dict[str, str]):
+    # El despachador de la sesión no hereda el plazo del webhook: cada envío tiene el suyo
+    with deadline_scope(env.WAHA_TIMEOUT, inherit=False):
+        return await post_send_text(session, user, message, headers)
+
+
+# Cola de salida por sesión de WAHA: límite de mensajes por segundo, prioridad y unión de mensajes
+outbound_scheduler = OutboundScheduler(
+    _deliver_scheduled,
+    rate=env.OUTBOUND_RATE,
+    burst=env.OUTBOUND_BURST,
+    merge_window=env.OUTBOUND_MERGE_WINDOW,
+    max_queue=env.OUTBOUND_MAX_QUEUE,
+    max_delay=env.OUTBOUND_MAX_DELAY,
+    max_merge_chars=env.OUTBOUND_MAX_MESSAGE_CHARS,
+    max_in_flight=env.OUTBOUND_MAX_IN_FLIGHT,
+)
+
+# Sin la cola de salida, los envíos a un mismo chat se hacen de a uno y en orden
+send_chat_locks = KeyedLocks()
+
+
+async def send_waha_message(user: str, message: str, session: str, priority: str = "answer", merge: bool = True):
+    """Send a message to WAHA API sendText endpoint ("answer" goes before "notice"; merge=False is never merged)"""
+    try:
+        if env.OUTBOUND_ENABLED:
+            return await outbound_scheduler.send(
+                session, user, message, lane=priority, headers=trace_headers(), merge=merge
+            )
+        async with send_chat_locks.hold(f"{session}:{user}"):
+            return await post_send_text(session, user, message, trace_headers())
     except Exception as e:
         logger.error(f"Error sending message to WAHA: {str(e)}")
         return None
@@ -36,115 +93,119 @@ async def handle_error_response(
     request: WahaRequest, user_message: str, technical_message: str, chatbot_data=None
 ):
     """Handle error response by sending WAHA message and returning error dict"""
-    await send_waha_message(request.payload.from_, user_message, request.session)
+    await send_waha_message(request.payload.from_, user_message, request.session, priority="notice")
     error_response = {"status": "error", "message": technical_message}
     if chatbot_data:
         error_response["chatbot_response"] = chatbot_data
     return error_response
 
 
-@router.post("/webhook", summary="Process webhook")
-async def chatbot_endpoint(request: WahaRequest):
-    logger.info(f"Received webhook request: {request}")
-    try:
-        # assistant = env.ASSISTANT
-        # assistantName = env.ASSISTANT_NAME
+async def transcribe_media(request: WahaRequest):
+    """Replace the body of a media message with its text; returns an error dict on failure"""
+    media = request.payload.media
+    logger.info("Received media: %s", media.mimetype if media else "No media object")
 
-        if request.payload.hasMedia:
-            logger.info(f"Received media: {request.payload.media.mimetype if request.payload.media else 'No media object'}")
-            
-            # Manejo de audio
-            if request.payload.media.mimetype == "audio/ogg; codecs=opus":
-                logger.info(f"Received audio: {request.payload.media.url}")
-                try:
-                    text_message = await convert_speech_to_text(request.payload.media.url)
-                    logger.info(f"Transcripción en Router: {text_message}")
-                    if text_message is None:
-                        logger.error(f"No se pudo transcribir el audio - convert_speech_to_text retornó None")
-                        return {
-                            "status": "error",
-                            "message": "No se pudo transcribir el audio"
-                        }
-                    else:
-                        request.payload.body = text_message
-                except Exception as e:
-                    logger.error(f"Excepción al transcribir el audio: {str(e)} - Tipo: {type(e).__name__}", exc_info=True)
-                    return {
-                        "status": "error",
-                        "message": f"Error al transcribir el audio: {str(e)}"
-                    }
-            
-            # Manejo de imágenes y PDFs
-            elif request.payload.media.mimetype.startswith('image/') or request.payload.media.mimetype == 'application/pdf':
-                logger.info(f"Received image/PDF: {request.payload.media.url} - MIME: {request.payload.media.mimetype}")
-                try:
-                    extracted_text = await convert_image_to_text(request.payload.media.url)
-                    logger.info(f"Análisis de imagen/PDF en Router: {extracted_text}")
-                    if extracted_text is None:
-                        logger.error(f"No se pudo analizar la imagen/PDF - convert_image_to_text retornó None")
-                        return {
-                            "status": "error",
-                            "message": "No se pudo analizar la imagen o PDF"
-                        }
-                    else:
-                        request.payload.body = extracted_text
-                except Exception as e:
-                    logger.error(f"Excepción al analizar imagen/PDF: {str(e)} - Tipo: {type(e).__name__}", exc_info=True)
-                    return {
-                        "status": "error",
-                        "message": f"Error al analizar la imagen o PDF: {str(e)}"
-                    }
-
-        """
-        chatbot_payload = map_to_chatbot_payload(request, assistant, assistantName)
-        # Call the chatbot API
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            chatbot_response = await client.post(
-                f"{env.CHATBOT_API_URL}/v1/llm/question",
-                json=chatbot_payload,
-                headers={"Content-Type": "application/json"}
-            )
-            chatbot_response.raise_for_status()
-            chatbot_data = chatbot_response.json()
-        
-        # Validate chatbot API response
-        if chatbot_response.status_code != 200 or chatbot_data.get("status") != "OK":
-            return await handle_error_response(
-                request,
-                "Lo siento, no puedo procesar tu mensaje en este momento. Por favor intenta nuevamente más tarde.",
-                f"Chatbot API error - Status code: {chatbot_response.status_code}, Status: {chatbot_data.get('status', 'unknown')}",
-                chatbot_data
-            )
-        
-        # Extract data from the response
-        data = chatbot_data.get("data", {})
-        response_text = data.get("answer", "")
-        answer_id = data.get("answerId", "")
-        conversation_id = data.get("conversationId", "")
-        
-        # Send the chatbot response to WAHA
-        send_data = await send_waha_message(
-            user=request.payload.from_,
-            message=response_text,
-            session=request.session
+    # El procesador se elige por tipo MIME en el registro del pipeline de media
+    processor = get_processor(media.mimetype) if media else None
+    if processor is None:
+        logger.warning(f"Unsupported media type: {media.mimetype if media else None}")
+        return None
+
+    logger.info("Received %s: %s - MIME: %s", processor.name, media.url, media.mimetype)
+    try:
+        text_message = await convert_media_to_text(
+            media.url,
+            processor,
+            use_cache=not request._bypass_cache,
+            declared_mime_type=media.mimetype,
         )
-        
+        logger.info("Texto de %s en Router: %s", processor.name, Payload(text_message), extra={"sampled": True})
+        if text_message is None:
+            logger.error(f"{processor.error_message} - convert_media_to_text retornó None")
+            return {
+                "status": "error",
+                "message": processor.error_message
+            }
+        request.payload.body = text_message
+        return None
+    except Exception as e:
+        logger.error(f"Excepción al procesar {processor.name}: {str(e)} - Tipo: {type(e).__name__}", exc_info=True)
         return {
-            "status": "success",
-            "message": "Message processed and sent successfully",
-            "chatbot_response": chatbot_data,
-            "send_response": send_data
+            "status": "error",
+            "message": f"{processor.error_message}: {str(e)}"
         }
-        """
 
-        return {
-            "status": "success",
-            "message": "Message processed and sent successfully",
-            "chatbot_response": "chatbot_data",
-            "send_response": "send_data",
-        }
 
-    except httpx.HTTPError as e:
+async def answer_message(request: WahaRequest):
+    """Send the (text) message to the chatbot and relay its answer to WAHA"""
+    chatbot_payload = map_to_chatbot_payload(request, env.ASSISTANT, env.ASSISTANT_NAME)
+    started_at = time.perf_counter()
+
+    try:
+        if env.CHATBOT_STREAMING:
+            # Cada oración o párrafo se envía apenas llega, sin esperar la respuesta completa
+            # (en este modo la etapa "chatbot" incluye los envíos intermedios)
+            with stage("chatbot"):
+                # Los segmentos no se unen en la cola de salida: cada uno sale apenas está listo
+                result = await reply_streaming(
+                    chatbot_payload,
+                    lambda text: send_waha_message(request.payload.from_, text, request.session, merge=False),
+                )
+            if not result["segments"]:
+                return await handle_error_response(
+                    request,
+                    "Lo siento, no puedo procesar tu mensaje en este momento. Por favor intenta nuevamente más tarde.",
+                    "Chatbot API error - Empty streamed answer",
+                )
+            return {
+                "status": "success",
+                "message": "Message processed and sent successfully",
+                "chatbot_response": result.get("chatbot_response", {"answer": result["answer"]}),
+                "send_response": result["send_responses"],
+            }
+
+        with stage("chatbot"):
+            chatbot_data = await ask_chatbot(chatbot_payload)
+    except ChatbotError as e:
+        return await handle_error_response(
+            request,
+            "Lo siento, no puedo procesar tu mensaje en este momento. Por favor intenta nuevamente más tarde.",
+            str(e),
+            e.data
+        )
+
+    # Extract data from the response
+    data = chatbot_data.get("data", {})
+    response_text = data.get("answer", "")
+
+    # Send the chatbot response to WAHA
+    send_data = await send_waha_message(
+        user=request.payload.from_,
+        message=response_text,
+        session=request.session
+    )
+    CHATBOT_FIRST_REPLY.observe(time.perf_counter() - started_at, mode="full")
+
+    return {
+        "status": "success",
+        "message": "Message processed and sent successfully",
+        "chatbot_response": chatbot_data,
+        "send_response": send_data
+    }
+
+
+async def handle_pipeline_exception(request: WahaRequest, e: Exception):
+    """Log an unexpected pipeline error and notify the user"""
+    if isinstance(e, (CircuitOpenError, DeadlineExceededError)):
+        logger.warning(f"Upstream unavailable: {str(e)} - Tipo: {type(e).__name__}")
+        # El aviso tiene su propio plazo aunque el del webhook ya haya vencido
+        with deadline_scope(env.WAHA_TIMEOUT, inherit=False):
+            return await handle_error_response(
+                request,
+                "Lo siento, el servicio está con demoras. Por favor intenta nuevamente en unos minutos.",
+                f"Upstream unavailable: {type(e).__name__} - {str(e)}",
+            )
+    if isinstance(e, httpx.HTTPError):
         logger.error(
             f"HTTP error occurred: {str(e)} - Tipo: {type(e).__name__} - URL: {getattr(e.request, 'url', 'N/A') if hasattr(e, 'request') else 'N/A'}",
             exc_info=True,
@@ -154,12 +215,348 @@ async def chatbot_endpoint(request: WahaRequest):
             "Lo siento, hay un problema de conexión. Por favor intenta nuevamente más tarde.",
             f"HTTP error occurred: {type(e).__name__} - {str(e)}",
         )
+    logger.error(
+        f"An error occurred: {str(e)} - Tipo: {type(e).__name__}", exc_info=True
+    )
+    return await handle_error_response(
+        request,
+        "Lo siento, ocurrió un error inesperado. Por favor intenta nuevamente más tarde.",
+        f"An error occurred: {type(e).__name__} - {str(e)}",
+    )
+
+
+def is_album_media(request: WahaRequest) -> bool:
+    """Images and PDFs are grouped per chat (ALBUM_ENABLED) to be analyzed together"""
+    media = request.payload.media
+    return bool(media and media.mimetype and ALBUM_PROCESSOR.matches(media.mimetype))
+
+
+async def transcribe_album(requests: List[WahaRequest]) -> Optional[dict]:
+    """Replace the body of the group's last message with the text of all its files"""
+    files = [
+        (r.payload.media.url, get_processor(r.payload.media.mimetype), r.payload.media.mimetype)
+        for r in requests
+    ]
+    logger.info("Received album of %d files from %s", len(files), requests[-1].payload.from_)
+    text_message = await convert_group_to_text(
+        files, ALBUM_PROCESSOR, use_cache=not any(r._bypass_cache for r in requests)
+    )
+    if text_message is None:
+        logger.error(f"{ALBUM_PROCESSOR.error_message} - convert_group_to_text retornó None")
+        return {
+            "status": "error",
+            "message": ALBUM_PROCESSOR.error_message
+        }
+    requests[-1].payload.body = text_message
+    return None
+
+
+def buffer(coalescer: Coalescer, request: WahaRequest):
+    """Add a message to a chat batch; its ingest-log checkpoint waits for the batch to be answered"""
+    request._buffered = True
+    coalescer.add(chat_key(request), request)
+
+
+def ack_ingested(requests: List[WahaRequest]):
+    """Checkpoint buffered messages (and the ones merged into them) once their batch has finished"""
+    if ingest_log is None:
+        return
+    for request in requests:
+        for seq in (request._ingest_seq, *request._merged_seqs):
+            if seq is not None:
+                ingest_log.ack(seq)
+
+
+async def reply(request: WahaRequest):
+    """Answer a (text) message now, or buffer it with the chat's next messages (COALESCE_ENABLED)"""
+    if env.COALESCE_ENABLED:
+        # La respuesta la da el despacho del lote; el worker queda libre para el siguiente mensaje
+        buffer(message_coalescer, request)
+        return {
+            "status": "accepted",
+            "message": "Message buffered to be answered together with the chat's next messages",
+        }
+    return await answer_message(request)
+
+
+async def process_message(request: WahaRequest):
+    """Run the media -> text -> chatbot -> reply pipeline for a single webhook"""
+    try:
+        if env.ALBUM_ENABLED:
+            if request.payload.hasMedia and is_album_media(request):
+                # Se analiza junto con las imágenes/PDF que el chat envíe enseguida (anverso y reverso)
+                buffer(album_coalescer, request)
+                return {
+                    "status": "accepted",
+                    "message": "Media buffered to be analyzed together with the chat's next files",
+                }
+            # Cualquier otro mensaje cierra el grupo abierto del chat y se procesa después
+            await album_coalescer.flush(chat_key(request))
+
+        if request.payload.hasMedia:
+            error = await transcribe_media(request)
+            if error is not None:
+                return error
+
+        return await reply(request)
+
     except Exception as e:
-        logger.error(
-            f"An error occurred: {str(e)} - Tipo: {type(e).__name__}", exc_info=True
-        )
-        return await handle_error_response(
-            request,
-            "Lo siento, ocurrió un error inesperado. Por favor intenta nuevamente más tarde.",
-            f"An error occurred: {type(e).__name__} - {str(e)}",
+        return await handle_pipeline_exception(request, e)
+
+
+async def answer_album(key: str, requests: List[WahaRequest]):
+    """Analyze a group of images/PDFs from the same chat with a single model call and answer it"""
+    # Los archivos se unen en el último mensaje; los demás solo aportan su archivo
+    request = requests[-1]
+    # El último mensaje lleva los checkpoints del grupo, por si vuelve a agruparse (COALESCE_ENABLED)
+    request._merged_seqs = [
+        seq for other in requests[:-1] for seq in (other._ingest_seq, *other._merged_seqs) if seq is not None
+    ]
+    request._buffered = False
+    set_trace_id(request._trace_id)
+    # El grupo se despacha después de sus webhooks: tiene un plazo propio
+    with deadline_scope(env.WEBHOOK_DEADLINE, inherit=False):
+        try:
+            result = await transcribe_album(requests)
+            if result is None:
+                result = await reply(request)
+        except Exception as e:
+            result = await handle_pipeline_exception(request, e)
+    if not request._buffered:
+        ack_ingested([request])
+    return result
+
+
+async def answer_coalesced(key: str, requests: List[WahaRequest]):
+    """Answer a burst of messages from the same chat with a single chatbot request"""
+    merged = merge_requests(requests)
+    if len(requests) > 1:
+        logger.info("Coalesced %d messages from %s into one chatbot request", len(requests), key)
+    set_trace_id(merged._trace_id)
+    # El lote se despacha después de su webhook: tiene un plazo propio
+    with deadline_scope(env.WEBHOOK_DEADLINE, inherit=False):
+        try:
+            result = await answer_message(merged)
+        except Exception as e:
+            result = await handle_pipeline_exception(merged, e)
+    # Recién ahora el lote está respondido; si el proceso cae antes, se reprocesa al iniciar
+    ack_ingested(requests)
+    return result
+
+
+def message_key(request: WahaRequest) -> str:
+    """Dedup key: WAHA message id scoped to its session"""
+    return f"{request.session}:{request.payload.id}"
+
+
+async def handle_message(request: WahaRequest):
+    """Process a webhook once per message; redeliveries get the original result"""
+    # Todas las llamadas salientes del webhook comparten el plazo WEBHOOK_DEADLINE
+    with deadline_scope(env.WEBHOOK_DEADLINE):
+        if not env.DEDUP_ENABLED:
+            return await process_message(request)
+        result, duplicate = await webhook_deduplicator.run(
+            message_key(request), lambda: process_message(request)
         )
+    if duplicate:
+        logger.info("Duplicate webhook for message %s, skipping processing", request.payload.id)
+    return result
+
+
+def message_priority(request: WahaRequest) -> str:
+    """Admission priority: media is the first to wait and to be shed"""
+    return "media" if request.payload.hasMedia else "text"
+
+
+async def handle_queued(request: WahaRequest):
+    """Worker entry point: process under the adaptive admission limit"""
+    if not env.ADMISSION_ENABLED:
+        return await handle_ingested(request)
+    # Ya se respondió a WAHA: el worker espera su cupo en lugar de rechazar el mensaje
+    async with admission_controller.admit(message_priority(request), blocking=True):
+        return await handle_ingested(request)
+
+
+async def handle_ingested(request: WahaRequest):
+    """Process a webhook and checkpoint it in the ingest log once it has finished"""
+    # Los workers corren en otras tareas: el id de traza viaja con el request
+    set_trace_id(request._trace_id)
+    result = await handle_message(request)
+    # Si el procesamiento lanza una excepción no hay checkpoint y se reprocesa al reiniciar;
+    # un mensaje agrupado se confirma cuando se despacha su lote (ack_ingested)
+    if ingest_log is not None and request._ingest_seq is not None and not request._buffered:
+        ingest_log.ack(request._ingest_seq)
+    return result
+
+
+def overloaded_error(e: AdmissionRejectedError) -> HTTPException:
+    """503 con Retry-After: WAHA reintenta la entrega cuando baje la carga"""
+    return HTTPException(
+        status_code=503,
+        detail=f"Gateway overloaded: {e.reason}",
+        headers={"Retry-After": str(env.ADMISSION_RETRY_AFTER)},
+    )
+
+
+def chat_key(request: WahaRequest) -> str:
+    """Ordering key: messages from the same chat in the same session run in arrival order"""
+    return f"{request.session}:{request.payload.from_}"
+
+
+# Serializa por chat el modo inline; en modo queue el orden lo garantiza el pool
+inline_chat_locks = KeyedLocks()
+
+# Agrupa los mensajes seguidos de un chat antes de llamar al chatbot (COALESCE_ENABLED)
+message_coalescer = Coalescer(
+    "chat",
+    answer_coalesced,
+    quiet_period=env.COALESCE_QUIET_PERIOD,
+    max_wait=env.COALESCE_MAX_WAIT,
+    max_items=env.COALESCE_MAX_MESSAGES,
+)
+
+# Agrupa las imágenes/PDF seguidos de un chat en una sola inferencia (ALBUM_ENABLED)
+album_coalescer = Coalescer(
+    "album",
+    answer_album,
+    quiet_period=env.ALBUM_WINDOW,
+    max_wait=env.ALBUM_MAX_WAIT,
+    max_items=env.ALBUM_MAX_FILES,
+)
+
+# Log durable de webhooks recibidos (INGEST_LOG_ENABLED); lo no terminado se reprocesa al iniciar
+if env.INGEST_LOG_ENABLED and not env.INGEST_LOG_PATH:
+    logger.warning("INGEST_LOG_ENABLED sin INGEST_LOG_PATH: el log de ingesta queda desactivado")
+ingest_log = IngestLog(
+    env.INGEST_LOG_PATH,
+    synchronous=env.INGEST_LOG_SYNC,
+    max_batch=env.INGEST_LOG_MAX_BATCH,
+    compact_interval=env.INGEST_LOG_COMPACT_INTERVAL,
+) if env.INGEST_LOG_ENABLED and env.INGEST_LOG_PATH else None
+
+webhook_workers = WorkerPool(
+    "webhook",
+    handle_queued,
+    workers=env.WEBHOOK_WORKERS,
+    queue_size=env.WEBHOOK_QUEUE_SIZE,
+    backpressure=env.WEBHOOK_BACKPRESSURE,
+    enqueue_timeout=env.WEBHOOK_ENQUEUE_TIMEOUT,
+)
+
+
+@router.post("/webhook", summary="Process webhook")
+async def chatbot_endpoint(raw_request: Request):
+    # Se valida a mano (en lugar de declarar WahaRequest como parámetro) para medir la etapa;
+    # los eventos ignorados ya los respondió WebhookFilterMiddleware, que deja el JSON decodificado
+    body = await raw_request.body()
+    record_bytes("parse", "in", len(body))
+    data = getattr(raw_request.state, "webhook_event", None)
+    with stage("parse"):
+        if data is None:
+            try:
+                data = loads(body)
+            except ValueError as e:
+                WEBHOOK_EVENTS.inc(outcome="invalid")
+                raise RequestValidationError(
+                    [{"type": "json_invalid", "loc": ("body", 0), "msg": "JSON decode error", "input": {}, "ctx": {"error": str(e)}}],
+                    body=body,
+                )
+        try:
+            request = WahaRequest.model_validate(data)
+        except ValidationError as e:
+            WEBHOOK_EVENTS.inc(outcome="invalid")
+            # Mismo formato que la validación automática de FastAPI ("loc" empieza con "body")
+            errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+            raise RequestValidationError(errors, body=body)
+    WEBHOOK_EVENTS.inc(outcome="processed")
+    cache_control = raw_request.headers.get("cache-control")
+    # Solo el resumen en INFO; el webhook completo (acortado) en DEBUG
+    logger.info(
+        "Received webhook %s from %s (media: %s)",
+        request.payload.id, request.payload.from_, request.payload.hasMedia, extra={"sampled": True},
+    )
+    logger.debug("Webhook request: %s", Payload(request))
+    request._trace_id = new_trace_id(raw_request.headers.get(env.TRACE_HEADER) if env.TRACE_HEADER else None)
+    # "Cache-Control: no-cache" fuerza a recalcular transcripciones/análisis cacheados
+    request._bypass_cache = bool(cache_control and "no-cache" in cache_control.lower())
+    # La media es lo primero que se descarta bajo presión (antes de persistirla)
+    priority = message_priority(request)
+    if env.ADMISSION_ENABLED:
+        try:
+            admission_controller.check(priority)
+        except AdmissionRejectedError as e:
+            raise overloaded_error(e)
+    if ingest_log is not None:
+        # El webhook queda en disco antes de responder a WAHA
+        try:
+            request._ingest_seq = await ingest_log.append(
+                chat_key(request), request.model_dump_json(by_alias=True)
+            )
+        except Exception as e:
+            logger.error(f"Webhook rejected, ingest log write failed: {str(e)} - Tipo: {type(e).__name__}")
+            raise HTTPException(status_code=503, detail="Webhook could not be persisted")
+
+    if env.WEBHOOK_MODE != "queue" or not webhook_workers.running:
+        arrived_at = time.monotonic()
+        async with inline_chat_locks.hold(chat_key(request)):
+            if not env.ADMISSION_ENABLED:
+                return await handle_ingested(request)
+            # El cupo se pide con el turno del chat (los mensajes en fila no lo ocupan), pero la
+            # espera por el turno cuenta para ADMISSION_QUEUE_TIMEOUT: bajo sobrecarga la fila de
+            # un chat también se descarta en lugar de conservar su lugar
+            try:
+                async with admission_controller.admit(priority, waited=time.monotonic() - arrived_at):
+                    return await handle_ingested(request)
+            except AdmissionRejectedError as e:
+                # WAHA lo reenviará, así que esta copia no debe reprocesarse al reiniciar
+                if request._ingest_seq is not None:
+                    ingest_log.ack(request._ingest_seq)
+                raise overloaded_error(e)
+
+    try:
+        queued = await webhook_workers.submit(request, key=chat_key(request))
+    except QueueFullError as e:
+        logger.warning(f"Webhook rejected, queue is full: {str(e)}")
+        # WAHA lo reenviará, así que esta copia no debe reprocesarse al reiniciar
+        if request._ingest_seq is not None:
+            ingest_log.ack(request._ingest_seq)
+        # Un 503 hace que WAHA reintente la entrega más tarde
+        raise HTTPException(status_code=503, detail="Webhook queue is full")
+    return {
+        "status": "accepted" if queued else "success",
+        "message": "Message queued for processing" if queued else "Message processed inline",
+    }
+
+
+# Reprocesos en línea lanzados al iniciar (se guarda la referencia para que no se pierdan)
+_replay_tasks = set()
+
+
+async def _replay_inline(request: WahaRequest):
+    async with inline_chat_locks.hold(chat_key(request)):
+        await handle_ingested(request)
+
+
+async def replay_ingest_log():
+    """Re-run the webhooks that were persisted but never finished (e.g. the instance was recycled)"""
+    if ingest_log is None:
+        return
+    rows = await asyncio.to_thread(ingest_log.unfinished)
+    if not rows:
+        return
+    logger.warning(f"Replaying {len(rows)} unfinished webhooks from the ingest log")
+    for index, (seq, key, payload) in enumerate(rows):
+        request = WahaRequest.model_validate_json(payload)
+        request._ingest_seq = seq
+        INGEST_REPLAYED.inc()
+        if webhook_workers.running:
+            try:
+                await webhook_workers.submit(request, key=key)
+            except QueueFullError:
+                logger.warning(f"Webhook queue is full, {len(rows) - index} items stay in the ingest log")
+                return
+        else:
+            # Las tareas se crean en orden y el lock por chat respeta el orden de llegada
+            task = asyncio.create_task(_replay_inline(request))
+            _replay_tasks.add(task)
+            task.add_done_callback(_replay_tasks.discard)
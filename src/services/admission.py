@@ -0,0 +1,345 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+ADMISSION_DECISIONS = registry.counter(
+    "waha_gateway_admission_decisions_total",
+    "Decisiones de admisión por prioridad (text, media), resultado (admitted, deferred, shed) "
+    "y motivo (none, capacity, media_share, queue_full, queue_timeout, loop_lag, memory)",
+    ("priority", "outcome", "reason"),
+)
+ADMISSION_LIMIT = registry.gauge(
+    "waha_gateway_admission_limit",
+    "Límite adaptativo de webhooks procesándose a la vez",
+)
+ADMISSION_LIMIT_CHANGES = registry.counter(
+    "waha_gateway_admission_limit_changes_total",
+    "Ajustes del límite por dirección (increase, decrease) y motivo (latency, loop_lag, healthy)",
+    ("direction", "reason"),
+)
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "waha_gateway_admission_in_flight",
+    "Webhooks admitidos en proceso por prioridad",
+    ("priority",),
+)
+ADMISSION_WAITING = registry.gauge(
+    "waha_gateway_admission_waiting",
+    "Webhooks diferidos esperando un cupo por prioridad",
+    ("priority",),
+)
+EVENT_LOOP_LAG = registry.gauge(
+    "waha_gateway_event_loop_lag_seconds",
+    "Retraso del event loop (promedio móvil del exceso sobre el intervalo de muestreo)",
+)
+MEDIA_BYTES_IN_FLIGHT = registry.gauge(
+    "waha_gateway_media_bytes_in_flight",
+    "Bytes de media descargados que todavía se están procesando",
+)
+
+PRIORITIES = ("text", "media")
+
+# Intervalo de muestreo del retraso del event loop
+_LAG_INTERVAL = 0.1
+# Peso de cada muestra en los promedios móviles (retraso del loop y latencia de referencia)
+_LAG_ALPHA = 0.3
+_BASELINE_ALPHA = 0.05
+# Muestras de latencia antes de empezar a ajustar el límite
+_BASELINE_MIN_SAMPLES = 10
+# Tiempo mínimo entre dos reducciones del límite (una ráfaga lenta cuenta una vez)
+_DECREASE_INTERVAL = 1.0
+
+
+class AdmissionRejectedError(Exception):
+    """El webhook no se admite por sobrecarga; `reason` es el motivo de la métrica."""
+
+    def __init__(self, priority: str, reason: str):
+        super().__init__(f"Webhook {priority} rechazado por sobrecarga ({reason})")
+        self.priority = priority
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Control de admisión delante del procesamiento de webhooks.
+
+    Limita cuántos webhooks se procesan a la vez con un límite adaptativo
+    AIMD: sube de a uno por cada `límite` webhooks terminados a tiempo y se
+    multiplica por `decrease_factor` cuando un webhook tarda más de
+    `latency_tolerance` veces la latencia de referencia de su prioridad (un
+    promedio móvil lento) o el event loop está atrasado.
+
+    Los mensajes de texto tienen prioridad: la media usa como mucho
+    `media_share` del límite, espera detrás del texto y es lo primero que se
+    descarta si el event loop está atrasado o hay demasiados bytes de media en
+    memoria. Sin cupo, un webhook espera hasta `queue_timeout` segundos
+    (diferido) y luego se rechaza.
+
+    Args:
+        initial_limit: Límite de concurrencia inicial
+        min_limit: Límite mínimo
+        max_limit: Límite máximo (la concurrencia de Cloud Run por instancia)
+        latency_tolerance: Múltiplo de la latencia de referencia que cuenta como sobrecarga
+        decrease_factor: Factor de reducción del límite
+        media_share: Fracción del límite disponible para media
+        max_queue: Webhooks que pueden esperar un cupo
+        queue_timeout: Espera máxima por un cupo, en segundos
+        max_loop_lag: Retraso del event loop a partir del cual se descarta media
+        max_media_bytes: Bytes de media en proceso a partir de los cuales se descarta media
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        latency_tolerance: float = 2.0,
+        decrease_factor: float = 0.8,
+        media_share: float = 0.5,
+        max_queue: int = 100,
+        queue_timeout: float = 10.0,
+        max_loop_lag: float = 0.25,
+        max_media_bytes: int = 128 * 1024 * 1024,
+    ):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.media_share = media_share
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_loop_lag = max_loop_lag
+        self.max_media_bytes = max_media_bytes
+        self.loop_lag = 0.0
+        self.media_bytes = 0
+        self._in_flight: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+        self._baseline: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._last_decrease = 0.0
+        self._monitor: Optional[asyncio.Task] = None
+        ADMISSION_LIMIT.set(self.limit)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    def start(self):
+        """Inicia la medición del retraso del event loop (desde el lifespan)."""
+        if self._monitor is None:
+            self._monitor = asyncio.create_task(self._measure_loop_lag())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+    async def _measure_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(_LAG_INTERVAL)
+            lag = max(loop.time() - start - _LAG_INTERVAL, 0.0)
+            self.loop_lag += _LAG_ALPHA * (lag - self.loop_lag)
+            EVENT_LOOP_LAG.set(self.loop_lag)
+            if self.loop_lag > self.max_loop_lag:
+                self._decrease("loop_lag")
+
+    def track_media_bytes(self, delta: int):
+        """Suma los bytes de un archivo descargado (y los resta, negativos, al liberarlo)."""
+        self.media_bytes += delta
+        MEDIA_BYTES_IN_FLIGHT.set(self.media_bytes)
+        if delta < 0:
+            self._wake()
+
+    def shed_reason(self, priority: str) -> Optional[str]:
+        """Motivo para descartar de inmediato un webhook de esta prioridad, o None."""
+        if priority != "media":
+            return None
+        if self.loop_lag > self.max_loop_lag:
+            return "loop_lag"
+        if self.media_bytes > self.max_media_bytes:
+            return "memory"
+        return None
+
+    def _media_limit(self) -> int:
+        return max(int(self.limit * self.media_share), 1)
+
+    def _blocked_by(self, priority: str) -> Optional[str]:
+        """Por qué no hay cupo ahora para esta prioridad (None = hay cupo)."""
+        if self.in_flight >= int(self.limit):
+            return "capacity"
+        if priority == "media":
+            # La media espera mientras haya texto esperando y no pasa de su fracción del límite
+            if self._waiters["text"] or self._in_flight["media"] >= self._media_limit():
+                return "media_share"
+        return None
+
+    def _take(self, priority: str):
+        self._in_flight[priority] += 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight[priority], priority=priority)
+
+    def _release(self, priority: str):
+        self._in_flight[priority] -= 1
+        ADMISSION_IN_FLIGHT.set(self._in_flight[priority], priority=priority)
+        self._wake()
+
+    def _wake(self):
+        # El texto primero; la media solo si sigue teniendo cupo y no corresponde descartarla
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            # Con el loop atrasado o mucha media en memoria, la media diferida sigue esperando
+            while waiters and self._blocked_by(priority) is None and self.shed_reason(priority) is None:
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self._take(priority)
+                future.set_result(None)
+            ADMISSION_WAITING.set(len(waiters), priority=priority)
+
+    def check(self, priority: str):
+        """
+        Aplica solo las señales de descarte, sin reservar cupo (antes de
+        persistir el webhook, y en modo queue donde la concurrencia la limita el pool).
+
+        Raises:
+            AdmissionRejectedError: si corresponde descartarlo
+        """
+        reason = self.shed_reason(priority)
+        if reason is not None:
+            ADMISSION_DECISIONS.inc(priority=priority, outcome="shed", reason=reason)
+            logger.warning(f"Webhook {priority} rechazado por sobrecarga ({reason})")
+            raise AdmissionRejectedError(priority, reason)
+
+    def _evict_media(self) -> bool:
+        """Rechaza la media que llegó última a la cola para hacer lugar a un texto."""
+        waiters = self._waiters["media"]
+        while waiters:
+            future = waiters.pop()
+            if not future.done():
+                future.set_exception(AdmissionRejectedError("media", "queue_full"))
+                ADMISSION_WAITING.set(len(waiters), priority="media")
+                return True
+        return False
+
+    async def _acquire(self, priority: str, waited: float, blocking: bool):
+        if not blocking:
+            reason = self.shed_reason(priority)
+            if reason is not None:
+                raise AdmissionRejectedError(priority, reason)
+        blocked = self._blocked_by(priority)
+        if blocked is None and not self._waiters[priority]:
+            self._take(priority)
+            ADMISSION_DECISIONS.inc(priority=priority, outcome="admitted", reason="none")
+            return
+        timeout = None
+        if not blocking:
+            # La espera previa (p. ej. por el turno del chat) cuenta para el tope de la cola
+            timeout = self.queue_timeout - waited
+            if timeout <= 0:
+                raise AdmissionRejectedError(priority, "queue_timeout")
+            if sum(len(waiters) for waiters in self._waiters.values()) >= self.max_queue:
+                if priority != "text" or not self._evict_media():
+                    raise AdmissionRejectedError(priority, "queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters[priority]
+        waiters.append(future)
+        ADMISSION_WAITING.set(len(waiters), priority=priority)
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejectedError(priority, "queue_timeout")
+        except asyncio.CancelledError:
+            # Si el cupo llegó justo antes de cancelar, se devuelve
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release(priority)
+            raise
+        finally:
+            if not future.done() or future.cancelled():
+                try:
+                    waiters.remove(future)
+                except ValueError:
+                    pass
+            ADMISSION_WAITING.set(len(waiters), priority=priority)
+        ADMISSION_DECISIONS.inc(priority=priority, outcome="deferred", reason=blocked or "capacity")
+
+    @asynccontextmanager
+    async def admit(self, priority: str, waited: float = 0.0, blocking: bool = False):
+        """
+        Reserva un cupo para procesar un webhook de esta prioridad ("text" o
+        "media") durante el bloque, esperando si hace falta.
+
+        Args:
+            waited: Segundos que el webhook ya esperó antes de pedir el cupo
+                (se descuentan de `queue_timeout`)
+            blocking: Para trabajo ya aceptado (los workers del modo queue):
+                espera el cupo sin tope ni descarte; solo aplica el límite
+
+        Raises:
+            AdmissionRejectedError: si se descarta por sobrecarga
+        """
+        try:
+            await self._acquire(priority, waited, blocking)
+        except AdmissionRejectedError as e:
+            ADMISSION_DECISIONS.inc(priority=priority, outcome="shed", reason=e.reason)
+            logger.warning(str(e))
+            raise
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(priority, time.perf_counter() - start)
+            self._release(priority)
+
+    def _observe(self, priority: str, latency: float):
+        baseline = self._baseline.get(priority)
+        self._samples[priority] += 1
+        if baseline is None:
+            self._baseline[priority] = latency
+            return
+        if self._samples[priority] >= _BASELINE_MIN_SAMPLES and latency > baseline * self.latency_tolerance:
+            self._decrease("latency")
+            # Las muestras lentas mueven poco la referencia para que la sobrecarga no se vuelva la norma
+            self._baseline[priority] = baseline + _BASELINE_ALPHA * 0.1 * (latency - baseline)
+            return
+        self._baseline[priority] = baseline + _BASELINE_ALPHA * (latency - baseline)
+        if self.limit < self.max_limit and self.loop_lag <= self.max_loop_lag:
+            self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+            ADMISSION_LIMIT.set(self.limit)
+            ADMISSION_LIMIT_CHANGES.inc(direction="increase", reason="healthy")
+            self._wake()
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_INTERVAL or self.limit <= self.min_limit:
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+        ADMISSION_LIMIT.set(self.limit)
+        ADMISSION_LIMIT_CHANGES.inc(direction="decrease", reason=reason)
+        logger.info("Límite de admisión reducido a %.1f (%s)", self.limit, reason)
+
+
+admission_controller = AdmissionController(
+    initial_limit=env.ADMISSION_INITIAL_LIMIT,
+    min_limit=env.ADMISSION_MIN_LIMIT,
+    max_limit=env.ADMISSION_MAX_LIMIT,
+    latency_tolerance=env.ADMISSION_LATENCY_TOLERANCE,
+    decrease_factor=env.ADMISSION_DECREASE_FACTOR,
+    media_share=env.ADMISSION_MEDIA_SHARE,
+    max_queue=env.ADMISSION_MAX_QUEUE,
+    queue_timeout=env.ADMISSION_QUEUE_TIMEOUT,
+    max_loop_lag=env.ADMISSION_MAX_LOOP_LAG,
+    max_media_bytes=env.ADMISSION_MAX_MEDIA_BYTES,
+)
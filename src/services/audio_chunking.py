@@ -0,0 +1,273 @@
+import struct
+import zlib
+from functools import partial
+from typing import Callable, List, NamedTuple, Optional
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+# Opus siempre usa un reloj de 48 kHz para la posición de gránulo
+OPUS_SAMPLE_RATE = 48000
+
+AUDIO_CHUNKS = registry.histogram(
+    "waha_gateway_audio_chunks",
+    "Cantidad de fragmentos en que se dividió un audio largo",
+    buckets=(2, 3, 4, 6, 8, 12, 16, 24),
+)
+AUDIO_SPLIT_SKIPPED = registry.counter(
+    "waha_gateway_audio_split_skipped_total",
+    "Audios largos que se enviaron completos por no poder dividirse",
+    ("reason",),
+)
+
+
+class SplitResult(NamedTuple):
+    """Fragmentos en orden (None para enviar el archivo completo) y duración en segundos, si se conoce."""
+    chunks: Optional[List[bytes]]
+    duration: Optional[float]
+
+
+# Recibe (bytes, mime); el pipeline lo ejecuta en un hilo porque recorre el archivo completo
+Splitter = Callable[[bytes, str], SplitResult]
+
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+_FLAG_CONTINUED = 0x01
+_FLAG_BOS = 0x02
+_FLAG_EOS = 0x04
+
+# Tabla para invertir los bits de cada byte (el CRC de Ogg no es reflejado y el de zlib sí)
+_REVERSE_BITS = bytes(int(f"{value:08b}"[::-1], 2) for value in range(256))
+
+
+def ogg_crc(data: bytes) -> int:
+    """
+    CRC-32 de Ogg (polinomio 0x04C11DB7, sin reflejar, valor inicial 0).
+    Se calcula con zlib sobre los bytes con bits invertidos, que es equivalente
+    y corre en C en lugar de un bucle de Python por byte.
+    """
+    register = zlib.crc32(data.translate(_REVERSE_BITS), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{register:032b}"[::-1], 2)
+
+
+class OggPage(NamedTuple):
+    flags: int
+    granule: int
+    serial: int
+    sequence: int
+    segments: bytes
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        return _PAGE_HEADER.size + len(self.segments) + len(self.body)
+
+    def encode(self, flags: int, granule: int, sequence: int) -> bytes:
+        header = _PAGE_HEADER.pack(
+            b"OggS", 0, flags, granule, self.serial, sequence, 0, len(self.segments)
+        )
+        page = bytearray(header + self.segments + self.body)
+        struct.pack_into("<I", page, 22, ogg_crc(bytes(page)))
+        return bytes(page)
+
+
+def parse_ogg_pages(data: bytes) -> List[OggPage]:
+    """Separa un archivo Ogg en páginas. Lanza ValueError si el archivo está corrupto."""
+    pages = []
+    offset = 0
+    while offset < len(data):
+        if len(data) - offset < _PAGE_HEADER.size:
+            raise ValueError("Página Ogg truncada")
+        capture, version, flags, granule, serial, sequence, _, count = _PAGE_HEADER.unpack_from(data, offset)
+        if capture != b"OggS" or version != 0:
+            raise ValueError(f"Firma de página Ogg inválida en el byte {offset}")
+        segments_start = offset + _PAGE_HEADER.size
+        segments = data[segments_start:segments_start + count]
+        body_start = segments_start + count
+        body_end = body_start + sum(segments)
+        if len(segments) != count or body_end > len(data):
+            raise ValueError("Página Ogg truncada")
+        pages.append(OggPage(flags, granule, serial, sequence, segments, data[body_start:body_end]))
+        offset = body_end
+    return pages
+
+
+class OpusStream:
+    """Stream Ogg/Opus separado en páginas de cabecera (OpusHead, OpusTags) y de audio."""
+
+    def __init__(self, pages: List[OggPage]):
+        if not pages or not pages[0].body.startswith(b"OpusHead"):
+            raise ValueError("El archivo Ogg no contiene un stream Opus")
+        serial = pages[0].serial
+        pages = [page for page in pages if page.serial == serial]
+        # Las páginas de cabecera tienen gránulo 0; el audio empieza en la primera con gránulo > 0
+        first_audio = next(
+            (index for index, page in enumerate(pages) if index > 0 and page.granule > 0),
+            len(pages),
+        )
+        self.header_pages = pages[:first_audio]
+        self.audio_pages = pages[first_audio:]
+        self.pre_skip = struct.unpack_from("<H", pages[0].body, 10)[0]
+
+    @property
+    def duration(self) -> float:
+        if not self.audio_pages:
+            return 0.0
+        return max(self.audio_pages[-1].granule - self.pre_skip, 0) / OPUS_SAMPLE_RATE
+
+    def _boundary_cost(self, index: int) -> float:
+        """
+        Bytes por segundo de la página: las páginas de silencio (o DTX) son
+        mucho más chicas, así que un valor bajo indica un buen punto de corte.
+        """
+        page = self.audio_pages[index]
+        previous = self.audio_pages[index - 1].granule if index > 0 else self.pre_skip
+        samples = max(page.granule - previous, 1)
+        return len(page.body) * OPUS_SAMPLE_RATE / samples
+
+    def _can_cut_after(self, index: int) -> bool:
+        """
+        Un fragmento puede empezar en la página siguiente solo si esa página
+        no continúa un paquete de la anterior (un fragmento nunca empieza a
+        mitad de paquete).
+        """
+        return not self.audio_pages[index + 1].flags & _FLAG_CONTINUED
+
+    def split_points(self, chunk_seconds: float, search_seconds: float) -> List[int]:
+        """
+        Índices de páginas de audio donde empieza cada fragmento (sin el 0).
+        Cada corte se busca cerca del múltiplo de `chunk_seconds`, en la página
+        más "silenciosa" dentro de ± `search_seconds`.
+        """
+        target_samples = int(chunk_seconds * OPUS_SAMPLE_RATE)
+        window = int(search_seconds * OPUS_SAMPLE_RATE)
+        points = []
+        next_target = self.pre_skip + target_samples
+        for index, page in enumerate(self.audio_pages):
+            if page.granule < next_target - window:
+                continue
+            if index + 1 >= len(self.audio_pages):
+                break
+            # Candidatas: páginas que terminan dentro de la ventana alrededor del objetivo
+            candidates = []
+            for candidate in range(index, len(self.audio_pages) - 1):
+                if self.audio_pages[candidate].granule > next_target + window:
+                    break
+                if self._can_cut_after(candidate):
+                    candidates.append(candidate)
+            if candidates:
+                best = min(candidates, key=self._boundary_cost)
+            else:
+                # Sin corte limpio en la ventana: el primero posible desde esta página
+                best = next(
+                    (c for c in range(index, len(self.audio_pages) - 1) if self._can_cut_after(c)), None
+                )
+                if best is None:
+                    break
+            if not points or best + 1 > points[-1]:
+                points.append(best + 1)
+            next_target = self.audio_pages[best].granule + target_samples
+        points = [point for point in points if 0 < point < len(self.audio_pages)]
+        # Un último fragmento muy corto se une al anterior
+        if points and self.audio_pages[-1].granule - self.audio_pages[points[-1] - 1].granule < target_samples // 4:
+            points.pop()
+        return points
+
+    def build_chunk(self, start: int, end: int) -> bytes:
+        """
+        Arma un Ogg/Opus independiente con las cabeceras y las páginas [start, end).
+        Los gránulos se rebasan para que cada fragmento empiece en cero y se
+        renumeran las páginas con su CRC.
+        """
+        base = self.audio_pages[start - 1].granule - self.pre_skip if start > 0 else 0
+        output = []
+        sequence = 0
+        for page in self.header_pages:
+            output.append(page.encode(page.flags, page.granule, sequence))
+            sequence += 1
+        pages = self.audio_pages[start:end]
+        for position, page in enumerate(pages):
+            flags = page.flags & ~_FLAG_EOS & ~_FLAG_BOS
+            if position == len(pages) - 1:
+                flags |= _FLAG_EOS
+            output.append(page.encode(flags, page.granule - base, sequence))
+            sequence += 1
+        return b"".join(output)
+
+    def split(self, chunk_seconds: float, search_seconds: float) -> Optional[List[bytes]]:
+        """Fragmentos independientes en orden, o None si el audio cabe en uno solo."""
+        points = self.split_points(chunk_seconds, search_seconds)
+        if not points:
+            return None
+        bounds = [0] + points + [len(self.audio_pages)]
+        return [self.build_chunk(start, end) for start, end in zip(bounds, bounds[1:])]
+
+
+def ogg_opus_duration(data: bytes) -> Optional[float]:
+    """Duración en segundos de un Ogg/Opus, o None si no se puede leer (recorre todas las páginas)."""
+    try:
+        return OpusStream(parse_ogg_pages(data)).duration
+    except (ValueError, struct.error):
+        return None
+
+
+def split_ogg_opus(data: bytes, chunk_seconds: float, search_seconds: float = 3.0) -> Optional[List[bytes]]:
+    """
+    Divide un Ogg/Opus en fragmentos de ~`chunk_seconds` cortando en límites
+    de página, preferentemente en silencios. Retorna None si el archivo no se
+    puede dividir (no es Opus, está corrupto o es más corto que un fragmento).
+    """
+    try:
+        stream = OpusStream(parse_ogg_pages(data))
+    except (ValueError, struct.error):
+        return None
+    return stream.split(chunk_seconds, search_seconds)
+
+
+def split_long_audio(
+    data: bytes,
+    mime_type: str,
+    min_seconds: float,
+    min_bytes: int,
+    chunk_seconds: float,
+    search_seconds: float,
+) -> SplitResult:
+    """
+    Divide el audio solo si supera `min_seconds` de duración o `min_bytes` de
+    tamaño; los audios cortos conservan la llamada única. Por ahora solo se
+    divide Ogg/Opus (el formato de las notas de voz de WhatsApp). El archivo
+    se recorre una sola vez: la duración se retorna junto a los fragmentos
+    para que el ruteo de modelos no lo vuelva a leer.
+    """
+    if mime_type != "audio/ogg":
+        if len(data) >= min_bytes:
+            AUDIO_SPLIT_SKIPPED.inc(reason="unsupported_format")
+        return SplitResult(None, None)
+    try:
+        stream = OpusStream(parse_ogg_pages(data))
+    except (ValueError, struct.error) as e:
+        AUDIO_SPLIT_SKIPPED.inc(reason="invalid")
+        logger.warning(f"No se pudo leer el audio Ogg para dividirlo: {str(e)}")
+        return SplitResult(None, None)
+    duration = stream.duration
+    if duration < min_seconds and len(data) < min_bytes:
+        return SplitResult(None, duration)
+    chunks = stream.split(chunk_seconds, search_seconds)
+    if chunks is None:
+        AUDIO_SPLIT_SKIPPED.inc(reason="single_chunk")
+        return SplitResult(None, duration)
+    AUDIO_CHUNKS.observe(len(chunks))
+    logger.info(f"Audio largo ({duration:.1f} s, {len(data)} bytes) dividido en {len(chunks)} fragmentos")
+    return SplitResult(chunks, duration)
+
+
+def get_audio_splitter() -> Optional[Splitter]:
+    """División de audios largos según la configuración, o None si está desactivada."""
+    if not env.AUDIO_CHUNKING_ENABLED:
+        return None
+    return partial(
+        split_long_audio,
+        min_seconds=env.AUDIO_LONG_MIN_SECONDS,
+        min_bytes=env.AUDIO_LONG_MIN_BYTES,
+        chunk_seconds=env.AUDIO_CHUNK_SECONDS,
+        search_seconds=env.AUDIO_SPLIT_SEARCH_SECONDS,
+    )
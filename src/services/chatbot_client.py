@@ -0,0 +1,258 @@
+import asyncio
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+import src.utils.environment as env
+from src.services.http_clients import get_http_client, get_upstream, is_transient_http_error, is_unsent_http_error, UPSTREAM_LATENCY
+from src.utils.logger import logger
+from src.utils.metrics import registry
+from src.utils.instrumentation import record_bytes, trace_headers
+from src.utils.resilience import DeadlineExceededError, bounded_timeout
+
+
+CHATBOT_FIRST_REPLY = registry.histogram(
+    "waha_gateway_chatbot_first_reply_seconds",
+    "Tiempo desde la consulta al chatbot hasta enviar el primer mensaje de respuesta",
+    ("mode",),
+)
+CHATBOT_SEGMENTS = registry.histogram(
+    "waha_gateway_chatbot_reply_segments",
+    "Mensajes de WhatsApp en que se envió cada respuesta del chatbot",
+    ("mode",),
+    buckets=(1, 2, 3, 4, 6, 8, 12, 20),
+)
+CHATBOT_STREAM_FALLBACKS = registry.counter(
+    "waha_gateway_chatbot_stream_fallbacks_total",
+    "Consultas en streaming que se repitieron en modo normal",
+)
+
+# Campos del evento SSE que pueden traer el texto incremental, en orden de preferencia
+_DELTA_FIELDS = ("delta", "text", "content", "answer")
+
+# Fin de oración seguido de espacio o salto de línea
+_SENTENCE_END = re.compile(r"[.!?…](?=\s)|\n")
+
+
+class ChatbotError(Exception):
+    """El chatbot respondió, pero sin un estado OK."""
+
+    def __init__(self, message: str, status_code: int, data: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.data = data
+
+
+def _question_url() -> str:
+    return f"{env.CHATBOT_API_URL.rstrip('/')}{env.CHATBOT_QUESTION_PATH}"
+
+
+def _check_answer(status_code: int, data: Any):
+    """Lanza ChatbotError si la respuesta JSON no es un objeto con status "OK"."""
+    status = data.get("status", "unknown") if isinstance(data, dict) else type(data).__name__
+    if status_code != 200 or status != "OK":
+        raise ChatbotError(
+            f"Chatbot API error - Status code: {status_code}, Status: {status}",
+            status_code,
+            data,
+        )
+
+
+async def ask_chatbot(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Consulta al chatbot y espera la respuesta completa.
+
+    Raises:
+        httpx.HTTPError: error de red o estado HTTP de error
+        ChatbotError: si la respuesta no tiene status "OK"
+        CircuitOpenError: si el chatbot viene fallando y el circuito está abierto
+    """
+    client = get_http_client("chatbot")
+
+    async def _post():
+        with UPSTREAM_LATENCY.time(upstream="chatbot", operation="question"):
+            response = await client.post(
+                _question_url(), json=payload, headers={"Content-Type": "application/json", **trace_headers()}
+            )
+            response.raise_for_status()
+            record_bytes("chatbot", "in", len(response.content))
+            return response, response.json()
+
+    # La consulta no es idempotente: solo se reintenta si no llegó al chatbot
+    response, data = await get_upstream("chatbot").call(_post, retry_on=is_unsent_http_error)
+    _check_answer(response.status_code, data)
+    return data
+
+
+def _parse_event_data(data: str) -> Optional[str]:
+    """Texto de un evento SSE: JSON con alguno de los campos conocidos, o el texto tal cual."""
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(event, str):
+        return event
+    if isinstance(event, dict):
+        if isinstance(event.get("data"), dict):
+            event = event["data"]
+        for field in _DELTA_FIELDS:
+            if isinstance(event.get(field), str):
+                return event[field]
+    return None
+
+
+async def stream_chatbot(payload: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Consulta al chatbot en modo streaming y entrega el texto a medida que llega.
+    Acepta Server-Sent Events (`data: ...`, termina con `[DONE]`), texto en
+    chunks, o una respuesta JSON normal si el chatbot no soporta streaming.
+
+    Raises:
+        httpx.HTTPError: error de red o estado HTTP de error
+        ChatbotError: si la respuesta JSON no tiene status "OK"
+        CircuitOpenError: si el chatbot viene fallando y el circuito está abierto
+        DeadlineExceededError: si se agota el plazo del webhook
+    """
+    client = get_http_client("chatbot")
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream", **trace_headers()}
+    # El mismo plazo que ask_chatbot: acota la conexión y cada lectura del stream
+    bounded_timeout(None)
+    # Sin reintentos (el texto ya entregado no se puede deshacer), pero cuenta para el breaker
+    breaker = get_upstream("chatbot").breaker
+    breaker.allow()
+    stream = _stream_question(client, payload, headers)
+    try:
+        while True:
+            timeout = bounded_timeout(None)
+            try:
+                text = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError as e:
+                raise DeadlineExceededError("Plazo del webhook vencido esperando al chatbot (streaming)") from e
+            yield text
+    except Exception as e:
+        if is_transient_http_error(e):
+            breaker.record_failure()
+        else:
+            breaker.record_ignored()
+        raise
+    except BaseException:
+        breaker.record_ignored()
+        raise
+    finally:
+        await stream.aclose()
+    breaker.record_success()
+
+
+async def _stream_question(client: httpx.AsyncClient, payload: Dict[str, Any], headers: Dict[str, str]) -> AsyncIterator[str]:
+    with UPSTREAM_LATENCY.time(upstream="chatbot", operation="question_stream"):
+        async with client.stream("POST", _question_url(), json={**payload, "stream": True}, headers=headers) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if content_type.startswith("application/json"):
+                data = json.loads(await response.aread())
+                _check_answer(response.status_code, data)
+                yield (data.get("data") or {}).get("answer", "")
+            elif content_type.startswith("text/event-stream"):
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    text = _parse_event_data(data)
+                    if text:
+                        yield text
+            else:
+                async for text in response.aiter_text():
+                    if text:
+                        yield text
+            record_bytes("chatbot", "in", response.num_bytes_downloaded)
+
+
+class ReplySegmenter:
+    """
+    Corta un texto que llega de a partes en mensajes del tamaño de una
+    oración o un párrafo: se corta en cada párrafo y, pasado `min_chars`, en
+    el último fin de oración disponible.
+    """
+
+    def __init__(self, min_chars: int):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        segments = []
+        while True:
+            paragraph = self._buffer.find("\n\n")
+            if paragraph >= 0:
+                cut = paragraph + 2
+            elif len(self._buffer) >= self.min_chars:
+                ends = [match.end() for match in _SENTENCE_END.finditer(self._buffer, self.min_chars - 1)]
+                if not ends:
+                    break
+                cut = ends[-1]
+            else:
+                break
+            segment, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:]
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def flush(self) -> Optional[str]:
+        segment, self._buffer = self._buffer.strip(), ""
+        return segment or None
+
+
+async def reply_streaming(payload: Dict[str, Any], send) -> Dict[str, Any]:
+    """
+    Consulta al chatbot en streaming y envía cada oración o párrafo con
+    `send(text)` apenas está completo. Si el streaming falla antes de enviar
+    algo se repite la consulta en modo normal.
+
+    Returns:
+        dict: {"answer": texto completo, "segments": cantidad, "send_responses": [...]}
+    """
+    started_at = time.perf_counter()
+    segmenter = ReplySegmenter(env.CHATBOT_STREAM_MIN_CHARS)
+    parts, sends = [], []
+
+    def _send(segment: str):
+        if not sends:
+            CHATBOT_FIRST_REPLY.observe(time.perf_counter() - started_at, mode="stream")
+        # No se espera el envío para seguir leyendo el stream; `send` respeta el orden de llegada
+        sends.append(asyncio.ensure_future(send(segment)))
+
+    try:
+        try:
+            async for text in stream_chatbot(payload):
+                parts.append(text)
+                for segment in segmenter.feed(text):
+                    _send(segment)
+        except (httpx.HTTPError, ValueError) as e:
+            if sends:
+                raise
+            CHATBOT_STREAM_FALLBACKS.inc()
+            logger.warning(
+                f"Streaming del chatbot fallido, se consulta en modo normal: {str(e)} - Tipo: {type(e).__name__}"
+            )
+            data = await ask_chatbot(payload)
+            answer = data.get("data", {}).get("answer", "")
+            response = await send(answer)
+            CHATBOT_FIRST_REPLY.observe(time.perf_counter() - started_at, mode="fallback")
+            CHATBOT_SEGMENTS.observe(1, mode="fallback")
+            return {"answer": answer, "segments": 1, "send_responses": [response], "chatbot_response": data}
+
+        tail = segmenter.flush()
+        if tail:
+            _send(tail)
+        send_responses = list(await asyncio.gather(*sends))
+    finally:
+        # Cualquiera sea el error (plazo vencido, circuito abierto, ChatbotError), los
+        # segmentos ya enviados se esperan: ninguna tarea de envío queda huérfana
+        await asyncio.gather(*sends, return_exceptions=True)
+    CHATBOT_SEGMENTS.observe(len(send_responses), mode="stream")
+    return {"answer": "".join(parts), "segments": len(send_responses), "send_responses": send_responses}
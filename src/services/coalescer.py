@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+from src.services.worker_pool import KeyedLocks
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+COALESCE_ITEMS = registry.counter(
+    "waha_gateway_coalesce_items_total",
+    "Elementos recibidos por el coalescedor (entrada)",
+    ("coalescer",),
+)
+COALESCE_FLUSHES = registry.counter(
+    "waha_gateway_coalesce_flushes_total",
+    "Lotes despachados por motivo (quiet, max_wait, max_items, flushed, drain); flushes/items es la tasa de coalescencia",
+    ("coalescer", "reason"),
+)
+COALESCE_BATCH_SIZE = registry.histogram(
+    "waha_gateway_coalesce_batch_size",
+    "Elementos unidos en cada lote despachado",
+    ("coalescer",),
+    buckets=(1, 2, 3, 4, 5, 8, 12, 20),
+)
+COALESCE_DELAY = registry.histogram(
+    "waha_gateway_coalesce_delay_seconds",
+    "Latencia agregada a cada elemento entre su llegada y el despacho de su lote",
+    ("coalescer",),
+)
+COALESCE_PENDING = registry.gauge(
+    "waha_gateway_coalesce_pending_items",
+    "Elementos esperando en lotes abiertos",
+    ("coalescer",),
+)
+
+
+class _Batch:
+    __slots__ = ("items", "arrivals", "timer")
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.arrivals: List[float] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    """
+    Agrupa los elementos que llegan seguidos con la misma clave y los despacha
+    juntos en un solo llamado a `flush(key, items)`.
+
+    Un lote se despacha cuando pasa `quiet_period` sin elementos nuevos, cuando
+    el primero lleva `max_wait` esperando o al llegar a `max_items`. `add` no
+    espera el despacho, así el worker que procesa el chat queda libre para el
+    siguiente mensaje; los lotes de una misma clave se despachan de a uno y en
+    orden. `flush(key)` cierra el lote antes de tiempo y espera su despacho,
+    para que lo que llegue después se procese detrás.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[Hashable, List[Any]], Awaitable[Any]],
+        quiet_period: float,
+        max_wait: float,
+        max_items: int,
+    ):
+        self.name = name
+        self._flush_handler = flush
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait
+        self.max_items = max(max_items, 1)
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._flush_locks = KeyedLocks()
+        self._tasks: Set[asyncio.Task] = set()
+        # Último despacho de cada clave (los de una clave corren en orden)
+        self._last_tasks: Dict[Hashable, asyncio.Task] = {}
+        self._pending = 0
+
+    def __len__(self) -> int:
+        return self._pending
+
+    def add(self, key: Hashable, item: Any) -> None:
+        now = time.monotonic()
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch()
+        batch.items.append(item)
+        batch.arrivals.append(now)
+        self._pending += 1
+        COALESCE_ITEMS.inc(coalescer=self.name)
+        COALESCE_PENDING.set(self._pending, coalescer=self.name)
+        if batch.timer is not None:
+            batch.timer.cancel()
+        if len(batch.items) >= self.max_items:
+            self._flush(key, "max_items")
+            return
+        remaining = batch.arrivals[0] + self.max_wait - now
+        if remaining <= self.quiet_period:
+            delay, reason = max(remaining, 0), "max_wait"
+        else:
+            delay, reason = self.quiet_period, "quiet"
+        batch.timer = asyncio.get_running_loop().call_later(delay, self._flush, key, reason)
+
+    def _flush(self, key: Hashable, reason: str) -> None:
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self._pending -= len(batch.items)
+        COALESCE_PENDING.set(self._pending, coalescer=self.name)
+        COALESCE_FLUSHES.inc(coalescer=self.name, reason=reason)
+        task = asyncio.create_task(self._run(key, batch))
+        self._tasks.add(task)
+        self._last_tasks[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._last_tasks.get(key) is task:
+            del self._last_tasks[key]
+
+    async def flush(self, key: Hashable) -> None:
+        """Despacha ya el lote abierto de `key` y espera a que terminen sus despachos."""
+        self._flush(key, "flushed")
+        task = self._last_tasks.get(key)
+        if task is not None:
+            await asyncio.wait({task})
+
+    async def _run(self, key: Hashable, batch: _Batch) -> None:
+        # Las tareas se crean en orden y asyncio.Lock atiende en orden de llegada
+        async with self._flush_locks.hold(key):
+            flushed_at = time.monotonic()
+            for arrival in batch.arrivals:
+                COALESCE_DELAY.observe(flushed_at - arrival, coalescer=self.name)
+            COALESCE_BATCH_SIZE.observe(len(batch.items), coalescer=self.name)
+            try:
+                await self._flush_handler(key, batch.items)
+            except Exception as e:
+                logger.error(
+                    f"Error al despachar el lote de {self.name} ({len(batch.items)} elementos): "
+                    f"{str(e)} - Tipo: {type(e).__name__}",
+                    exc_info=True,
+                )
+
+    async def drain(self, timeout: float) -> None:
+        """Despacha los lotes abiertos y espera los despachos en curso (al apagar)."""
+        for key in list(self._batches):
+            self._flush(key, "drain")
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            if pending:
+                logger.warning(f"{self.name}: {len(pending)} lotes sin terminar al apagar")
+                for task in pending:
+                    task.cancel()
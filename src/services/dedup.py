@@ -0,0 +1,287 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+DEDUP_EVENTS = registry.counter(
+    "waha_gateway_dedup_events_total",
+    "Resultado de la deduplicación de webhooks (new, failed, in_flight, done, remote_pending, remote_released, remote_timeout)",
+    ("event",),
+)
+
+STATE_PENDING = "pending"
+STATE_DONE = "done"
+
+# La otra instancia liberó la clave sin completarla (su procesamiento falló)
+_RELEASED = object()
+
+
+def _is_error_result(result: Any) -> bool:
+    """Resultado de un procesamiento fallido ({"status": "error", ...}): no se deduplica."""
+    return isinstance(result, dict) and result.get("status") == "error"
+
+
+class DedupBackend(ABC):
+    """
+    Almacén de claves ya vistas. Para despliegues con varias instancias se
+    implementa esta interfaz sobre un almacén compartido; SQLite sirve como
+    sustituto local (varios procesos en la misma máquina).
+    """
+
+    @abstractmethod
+    async def claim(self, key: str) -> Optional[Tuple[str, Any]]:
+        """
+        Reclama la clave para procesarla.
+
+        Returns:
+            None si la clave quedó reclamada por el llamador, o (estado, resultado)
+            del registro existente si otro ya la reclamó o la completó
+        """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        """Obtiene (estado, resultado) de la clave, o None si no existe o expiró."""
+
+    @abstractmethod
+    async def complete(self, key: str, result: Any):
+        """Marca la clave como completada guardando su resultado."""
+
+    @abstractmethod
+    async def release(self, key: str):
+        """Libera una clave reclamada para que una reentrega pueda procesarla."""
+
+
+class MemoryDedupBackend(DedupBackend):
+    """LRU en memoria acotado por cantidad de claves y por TTL."""
+
+    def __init__(self, ttl: float, max_entries: int, pending_timeout: float):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pending_timeout = pending_timeout
+        # clave -> (estado, resultado, instante del último cambio)
+        self._entries: "OrderedDict[str, Tuple[str, Any, float]]" = OrderedDict()
+
+    def _lookup(self, key: str, now: float) -> Optional[Tuple[str, Any, float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        state, _, updated_at = entry
+        expired = now - updated_at > self.ttl
+        stale = state == STATE_PENDING and now - updated_at > self.pending_timeout
+        if expired or stale:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, state: str, result: Any, now: float):
+        self._entries[key] = (state, result, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def claim(self, key: str) -> Optional[Tuple[str, Any]]:
+        now = time.monotonic()
+        entry = self._lookup(key, now)
+        if entry is not None:
+            return entry[0], entry[1]
+        self._store(key, STATE_PENDING, None, now)
+        return None
+
+    async def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        entry = self._lookup(key, time.monotonic())
+        return (entry[0], entry[1]) if entry else None
+
+    async def complete(self, key: str, result: Any):
+        self._store(key, STATE_DONE, result, time.monotonic())
+
+    async def release(self, key: str):
+        self._entries.pop(key, None)
+
+
+class SqliteDedupBackend(DedupBackend):
+    """
+    Claves en una base SQLite (modo WAL), compartida por los procesos que usen
+    el mismo archivo. Las consultas corren en un hilo para no bloquear el event loop.
+    """
+
+    def __init__(self, path: str, ttl: float, pending_timeout: float):
+        self.path = path
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dedup ("
+            " key TEXT PRIMARY KEY, state TEXT NOT NULL, result TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS dedup_updated_at ON dedup (updated_at)")
+
+    def _claim(self, key: str) -> Optional[Tuple[str, Any]]:
+        now = time.time()
+        with self._lock:
+            # Toma la clave si no existe, si expiró o si quedó pendiente de una instancia caída
+            cursor = self._conn.execute(
+                "INSERT INTO dedup (key, state, result, updated_at) VALUES (?, ?, NULL, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, result = NULL, "
+                "updated_at = excluded.updated_at "
+                "WHERE dedup.updated_at < ? OR (dedup.state = ? AND dedup.updated_at < ?)",
+                (key, STATE_PENDING, now, now - self.ttl, STATE_PENDING, now - self.pending_timeout),
+            )
+            if cursor.rowcount == 1:
+                return None
+            row = self._conn.execute(
+                "SELECT state, result FROM dedup WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    def _get(self, key: str) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, result, updated_at FROM dedup WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[2] < time.time() - self.ttl:
+            return None
+        # Pendiente de una instancia caída: cuenta como liberada (claim la puede tomar)
+        if row[0] == STATE_PENDING and row[2] < time.time() - self.pending_timeout:
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    def _complete(self, key: str, result: Any):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dedup (key, state, result, updated_at) VALUES (?, ?, ?, ?)",
+                (key, STATE_DONE, json.dumps(result, default=str), time.time()),
+            )
+            # Limpieza incremental de claves expiradas
+            self._conn.execute("DELETE FROM dedup WHERE updated_at < ?", (time.time() - self.ttl,))
+
+    def _release(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM dedup WHERE key = ? AND state = ?", (key, STATE_PENDING))
+
+    async def claim(self, key: str) -> Optional[Tuple[str, Any]]:
+        return await asyncio.to_thread(self._claim, key)
+
+    async def get(self, key: str) -> Optional[Tuple[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def complete(self, key: str, result: Any):
+        await asyncio.to_thread(self._complete, key, result)
+
+    async def release(self, key: str):
+        await asyncio.to_thread(self._release, key)
+
+
+class Deduplicator:
+    """
+    Ejecuta cada clave una sola vez dentro del TTL. Los duplicados concurrentes
+    en la misma instancia esperan el resultado en curso; los que llegan después
+    reciben el resultado guardado. Solo se guarda el procesamiento exitoso: si
+    `factory` falla o retorna un error, la clave se libera y un reenvío de WAHA
+    vuelve a intentarlo.
+    """
+
+    def __init__(self, backend: DedupBackend, pending_timeout: float, poll_interval: float = 0.5):
+        self.backend = backend
+        self.pending_timeout = pending_timeout
+        self.poll_interval = poll_interval
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta `factory` si la clave es nueva.
+
+        Returns:
+            (resultado, es_duplicado)
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            DEDUP_EVENTS.inc(event="in_flight")
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            while True:
+                existing = await self.backend.claim(key)
+                if existing is None:
+                    DEDUP_EVENTS.inc(event="new")
+                    try:
+                        result = await factory()
+                    except BaseException:
+                        await self.backend.release(key)
+                        raise
+                    if _is_error_result(result):
+                        DEDUP_EVENTS.inc(event="failed")
+                        await self.backend.release(key)
+                    else:
+                        await self.backend.complete(key, result)
+                    duplicate = False
+                    break
+                state, result = existing
+                if state == STATE_PENDING:
+                    DEDUP_EVENTS.inc(event="remote_pending")
+                    result = await self._wait_remote(key)
+                    if result is _RELEASED:
+                        # La otra instancia falló o no terminó a tiempo: se reclama y se procesa aquí
+                        continue
+                else:
+                    DEDUP_EVENTS.inc(event="done")
+                duplicate = True
+                break
+            future.set_result(result)
+            return result, duplicate
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el aviso de "exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _wait_remote(self, key: str) -> Any:
+        """
+        Espera a que otra instancia complete la clave (hasta `pending_timeout`).
+        Retorna _RELEASED si la liberó sin completarla o si no terminó a tiempo:
+        el llamador vuelve a reclamarla, y `claim` solo toma un registro
+        pendiente vencido, así que una sola instancia se queda con el mensaje.
+        """
+        deadline = time.monotonic() + self.pending_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            record = await self.backend.get(key)
+            if record is None:
+                DEDUP_EVENTS.inc(event="remote_released")
+                return _RELEASED
+            if record[0] == STATE_DONE:
+                return record[1]
+        DEDUP_EVENTS.inc(event="remote_timeout")
+        logger.warning(f"Sin resultado de la otra instancia para el mensaje {key}, se procesa aquí")
+        return _RELEASED
+
+
+def _build_backend() -> DedupBackend:
+    if env.DEDUP_BACKEND == "sqlite":
+        logger.info(f"Deduplicación de webhooks en SQLite: {env.DEDUP_SQLITE_PATH}")
+        return SqliteDedupBackend(env.DEDUP_SQLITE_PATH, env.DEDUP_TTL, env.DEDUP_PENDING_TIMEOUT)
+    return MemoryDedupBackend(env.DEDUP_TTL, env.DEDUP_MAX_ENTRIES, env.DEDUP_PENDING_TIMEOUT)
+
+
+webhook_deduplicator = Deduplicator(_build_backend(), env.DEDUP_PENDING_TIMEOUT)
@@ -0,0 +1,139 @@
+import httpx
+from typing import Dict, Optional
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+from src.utils.resilience import Upstream, upstream_from_settings
+
+
+# Latencia de las llamadas salientes por upstream y operación
+UPSTREAM_LATENCY = registry.histogram(
+    "waha_gateway_upstream_request_seconds",
+    "Latencia de las llamadas HTTP salientes",
+    ("upstream", "operation"),
+)
+POOL_CONNECTIONS = registry.gauge(
+    "waha_gateway_http_pool_connections",
+    "Conexiones del pool HTTP por upstream y estado (in_use, idle, waiting)",
+    ("upstream", "state"),
+)
+
+# Timeout de lectura/escritura por upstream (el de conexión es común)
+_UPSTREAM_TIMEOUTS = {
+    "waha": lambda: env.WAHA_TIMEOUT,
+    "chatbot": lambda: env.CHATBOT_TIMEOUT,
+}
+
+# Clientes compartidos (se crean en el lifespan de la aplicación)
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# Política de resiliencia por upstream (breaker, reintentos); se crea al primer uso
+_upstreams: Dict[str, Upstream] = {}
+
+# Errores que garantizan que la solicitud no llegó a procesarse
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _http2_available() -> bool:
+    """HTTP/2 requiere el paquete opcional `h2`; si no está, se usa HTTP/1.1."""
+    if not env.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("Paquete 'h2' no instalado, los pools HTTP usarán HTTP/1.1")
+        return False
+
+
+def _build_client(upstream: str) -> httpx.AsyncClient:
+    timeout = _UPSTREAM_TIMEOUTS[upstream]()
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        timeout=httpx.Timeout(timeout, connect=env.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=env.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=env.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=env.HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+async def init_http_clients():
+    """Crea un cliente HTTP con pool de conexiones por cada upstream."""
+    for upstream in _UPSTREAM_TIMEOUTS:
+        if upstream not in _clients:
+            _clients[upstream] = _build_client(upstream)
+    logger.info(f"Pools HTTP inicializados: {', '.join(_clients)}")
+
+
+async def close_http_clients():
+    """Cierra los pools HTTP liberando las conexiones abiertas."""
+    while _clients:
+        upstream, client = _clients.popitem()
+        await client.aclose()
+        logger.info(f"Pool HTTP cerrado: {upstream}")
+
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """
+    Obtiene el cliente compartido de un upstream ("waha" o "chatbot").
+    Si la aplicación se usa sin lifespan (scripts, pruebas) se crea bajo demanda.
+    """
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = _build_client(upstream)
+        _clients[upstream] = client
+    return client
+
+
+def is_transient_http_error(e: BaseException) -> bool:
+    """Errores de red, 5xx y 429: reflejan un problema del upstream y pueden reintentarse."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return isinstance(e, httpx.TransportError)
+
+
+def is_unsent_http_error(e: BaseException) -> bool:
+    """
+    Errores en que la solicitud no llegó a procesarse (sin conexión, pool
+    lleno, 429/503): los únicos que se reintentan en operaciones no
+    idempotentes como enviar un mensaje.
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in (429, 503)
+    return isinstance(e, _UNSENT_ERRORS)
+
+
+def get_upstream(upstream: str) -> Upstream:
+    """Política de resiliencia compartida de un upstream HTTP ("waha" o "chatbot")."""
+    policy = _upstreams.get(upstream)
+    if policy is None:
+        policy = _upstreams[upstream] = upstream_from_settings(upstream, is_transient_http_error)
+    return policy
+
+
+def pool_stats(upstream: str) -> Optional[Dict[str, int]]:
+    """Conexiones en uso, ociosas y solicitudes en espera del pool de un upstream."""
+    client = _clients.get(upstream)
+    if client is None:
+        return None
+    pool = getattr(client._transport, "_pool", None)
+    if pool is None:
+        return None
+    connections = list(pool.connections)
+    idle = sum(1 for connection in connections if connection.is_idle())
+    waiting = sum(1 for request in list(getattr(pool, "_requests", [])) if request.is_queued())
+    return {"in_use": len(connections) - idle, "idle": idle, "waiting": waiting}
+
+
+def _collect_pool_stats():
+    for upstream in list(_clients):
+        stats = pool_stats(upstream)
+        if stats is None:
+            continue
+        for state, value in stats.items():
+            POOL_CONNECTIONS.set(value, upstream=upstream, state=state)
+
+
+registry.register_collector(_collect_pool_stats)
@@ -0,0 +1,179 @@
+import asyncio
+import io
+import time
+from functools import partial
+from importlib.util import find_spec
+from typing import Callable, Optional, Tuple
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+# Pillow y pypdfium2 son opcionales: sin ellos la etapa se omite. Se importan en el
+# executor al primer archivo, no al iniciar (el camino de texto no los usa)
+PILLOW_AVAILABLE = find_spec("PIL") is not None
+PDFIUM_AVAILABLE = find_spec("pypdfium2") is not None
+
+
+PREPROCESS_SECONDS = registry.histogram(
+    "waha_gateway_preprocess_seconds",
+    "Duración del preprocesamiento de imágenes antes de la inferencia",
+    ("kind",),
+)
+PREPROCESS_BYTES = registry.counter(
+    "waha_gateway_preprocess_bytes_total",
+    "Bytes antes (input) y después (output) del preprocesamiento",
+    ("kind", "stage"),
+)
+PREPROCESS_SKIPPED = registry.counter(
+    "waha_gateway_preprocess_skipped_total",
+    "Preprocesamientos omitidos por error o por no reducir el tamaño",
+    ("kind", "reason"),
+)
+
+# Formatos que se recomprimen; GIF se deja intacto (puede ser animado)
+RECOMPRESSIBLE_TYPES = ("image/jpeg", "image/png", "image/webp")
+
+# Recibe (bytes, mime) y retorna (bytes, mime); bytes None significa "sin cambios"
+Preprocessor = Callable[[bytes, str], Tuple[Optional[bytes], str]]
+
+_executor = None
+
+
+def _encode_jpeg(image, max_edge: int, quality: int) -> bytes:
+    from PIL import Image
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def downscale_image(data: bytes, mime_type: str, max_edge: int, quality: int) -> Tuple[Optional[bytes], str]:
+    """
+    Aplica la orientación EXIF, reduce el lado mayor a `max_edge` y recomprime
+    a JPEG. Si el resultado no es más chico se conserva el original (None).
+    Corre en un proceso del pool (no usa el event loop).
+    """
+    if mime_type not in RECOMPRESSIBLE_TYPES:
+        return None, mime_type
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        needs_resize = max(image.size) > max_edge
+        if image.format == "JPEG":
+            # Decodifica directamente a menor escala (DCT), mucho más rápido que decodificar todo
+            image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        output = _encode_jpeg(image, max_edge, quality)
+    if not needs_resize and len(output) >= len(data):
+        return None, mime_type
+    return output, "image/jpeg"
+
+
+def render_pdf_first_page(data: bytes, mime_type: str, max_edge: int, quality: int) -> Tuple[Optional[bytes], str]:
+    """Renderiza solo la primera página del PDF como JPEG con lado mayor `max_edge`."""
+    import pypdfium2
+    document = pypdfium2.PdfDocument(data)
+    try:
+        page = document[0]
+        width, height = page.get_size()
+        bitmap = page.render(scale=max_edge / max(width, height))
+        image = bitmap.to_pil()
+        return _encode_jpeg(image, max_edge, quality), "image/jpeg"
+    finally:
+        document.close()
+
+
+def get_image_preprocessor() -> Optional[Preprocessor]:
+    """Preprocesador de fotos según la configuración, o None si está desactivado."""
+    if not env.IMAGE_PREPROCESS_ENABLED:
+        return None
+    if not PILLOW_AVAILABLE:
+        logger.warning("Pillow no está instalado, se omite el preprocesamiento de imágenes")
+        return None
+    return partial(downscale_image, max_edge=env.IMAGE_MAX_EDGE, quality=env.IMAGE_JPEG_QUALITY)
+
+
+def get_pdf_preprocessor() -> Optional[Preprocessor]:
+    """Render de la primera página de PDFs según la configuración, o None."""
+    if not env.PDF_RENDER_FIRST_PAGE:
+        return None
+    if not (PILLOW_AVAILABLE and PDFIUM_AVAILABLE):
+        logger.warning("Pillow o pypdfium2 no están instalados, los PDF se envían sin renderizar")
+        return None
+    return partial(render_pdf_first_page, max_edge=env.IMAGE_MAX_EDGE, quality=env.IMAGE_JPEG_QUALITY)
+
+
+def _get_executor():
+    """
+    Un hilo dedicado por defecto (IMAGE_PREPROCESS_WORKERS=0): Pillow libera el
+    GIL al decodificar y redimensionar, y no suma procesos al contenedor de
+    512Mi. Con workers > 0, un pool de procesos iniciado con "spawn": el
+    proceso tiene hilos (event loop, SQLite, httpx) y un fork podría heredar
+    un lock tomado.
+    """
+    global _executor
+    if _executor is None:
+        if env.IMAGE_PREPROCESS_WORKERS > 0:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _executor = ProcessPoolExecutor(
+                max_workers=env.IMAGE_PREPROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preprocess")
+    return _executor
+
+
+def _noop() -> None:
+    return None
+
+
+async def start_preprocess_pool():
+    """Inicia los procesos del pool antes del primer archivo (warm-up); no hace nada si está desactivado."""
+    if not (env.IMAGE_PREPROCESS_ENABLED or env.PDF_RENDER_FIRST_PAGE) or not PILLOW_AVAILABLE:
+        return
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, _noop) for _ in range(max(env.IMAGE_PREPROCESS_WORKERS, 1))))
+
+
+def shutdown_preprocess_pool():
+    """Detiene el executor de preprocesamiento (se llama al apagar la aplicación)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_preprocessor(
+    preprocessor: Preprocessor, data: bytes, mime_type: str, kind: str
+) -> Tuple[bytes, str]:
+    """
+    Ejecuta el preprocesador en su executor (hilo dedicado o pool de procesos).
+    Ante cualquier error se continúa con el archivo original.
+    """
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        output, output_mime_type = await loop.run_in_executor(
+            _get_executor(), preprocessor, data, mime_type
+        )
+    except Exception as e:
+        PREPROCESS_SKIPPED.inc(kind=kind, reason="error")
+        logger.warning(f"Preprocesamiento de {kind} fallido, se usa el original: {str(e)} - Tipo: {type(e).__name__}")
+        return data, mime_type
+    elapsed = time.perf_counter() - start
+    PREPROCESS_SECONDS.observe(elapsed, kind=kind)
+    if output is None:
+        PREPROCESS_SKIPPED.inc(kind=kind, reason="not_smaller")
+        output = data
+    PREPROCESS_BYTES.inc(len(data), kind=kind, stage="input")
+    PREPROCESS_BYTES.inc(len(output), kind=kind, stage="output")
+    logger.info(
+        f"Preprocesamiento de {kind}: {len(data)} -> {len(output)} bytes "
+        f"({mime_type} -> {output_mime_type}) en {elapsed * 1000:.1f} ms"
+    )
+    return output, output_mime_type
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Sequence
+import httpx
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+from src.utils.resilience import bounded_timeout, hedged, upstream_from_settings
+
+
+INFERENCE_QUEUE_WAIT = registry.histogram(
+    "waha_gateway_inference_queue_wait_seconds",
+    "Tiempo de espera por un cupo de inferencia",
+    ("media_type",),
+)
+INFERENCE_LATENCY = registry.histogram(
+    "waha_gateway_inference_seconds",
+    "Duración de las llamadas a Vertex AI",
+    ("model", "media_type"),
+)
+INFERENCE_IN_FLIGHT = registry.gauge(
+    "waha_gateway_inference_in_flight",
+    "Llamadas a Vertex AI en curso",
+)
+INFERENCE_WAITING = registry.gauge(
+    "waha_gateway_inference_waiting",
+    "Solicitudes esperando un cupo de inferencia",
+)
+INFERENCE_REJECTED = registry.counter(
+    "waha_gateway_inference_rejected_total",
+    "Solicitudes de inferencia rechazadas por sobrecarga",
+    ("reason",),
+)
+
+
+# Códigos de error de Vertex AI que indican un problema transitorio del servicio
+_TRANSIENT_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class InferenceOverloadedError(Exception):
+    """La cola de inferencia está llena o se agotó el tiempo de espera por un cupo."""
+
+
+def is_transient_vertex_error(e: BaseException) -> bool:
+    """Errores de red o de servidor de Vertex AI (el SDK expone el código HTTP en `code`)."""
+    if isinstance(e, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    return getattr(e, "code", None) in _TRANSIENT_CODES
+
+
+class InferenceEngine:
+    """
+    Ejecuta las llamadas a Vertex AI con la API asíncrona del SDK, limitando
+    cuántas corren a la vez y cuántas pueden esperar un cupo. Los errores
+    transitorios pasan por el circuit breaker y se reintentan fuera del cupo;
+    con clientes de respaldo, una llamada lenta se duplica (hedging).
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self.upstream = upstream_from_settings("vertex", is_transient_vertex_error)
+
+    async def _acquire(self, media_type: str):
+        if not self._semaphore.locked():
+            # Hay cupo libre: acquire() retorna sin suspender la corrutina
+            await self._semaphore.acquire()
+            INFERENCE_QUEUE_WAIT.observe(0.0, media_type=media_type)
+            return
+        if self._waiting >= self.max_queue:
+            INFERENCE_REJECTED.inc(reason="queue_full")
+            raise InferenceOverloadedError(
+                f"Cola de inferencia llena ({self._waiting} en espera)"
+            )
+        start = time.perf_counter()
+        # No se espera un cupo más allá del plazo del webhook
+        timeout = bounded_timeout(self.queue_timeout)
+        self._waiting += 1
+        INFERENCE_WAITING.set(self._waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            INFERENCE_REJECTED.inc(reason="queue_timeout")
+            raise InferenceOverloadedError(
+                f"Sin cupo de inferencia tras {timeout:.1f}s de espera"
+            )
+        finally:
+            self._waiting -= 1
+            INFERENCE_WAITING.set(self._waiting)
+        INFERENCE_QUEUE_WAIT.observe(time.perf_counter() - start, media_type=media_type)
+
+    def hedge_delay(self, model: str, media_type: str) -> float:
+        """Espera antes de duplicar: VERTEX_HEDGE_DELAY o el p95 observado para el modelo y tipo de media."""
+        if env.VERTEX_HEDGE_DELAY > 0:
+            return env.VERTEX_HEDGE_DELAY
+        p95 = INFERENCE_LATENCY.quantile(0.95, model=model, media_type=media_type)
+        return max(p95 or 0.0, env.VERTEX_HEDGE_MIN_DELAY)
+
+    async def _generate_once(self, client, model: str, contents, config, media_type: str):
+        await self._acquire(media_type)
+        INFERENCE_IN_FLIGHT.inc()
+        try:
+            with INFERENCE_LATENCY.time(model=model, media_type=media_type):
+                return await client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config,
+                )
+        finally:
+            INFERENCE_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    async def generate_content(
+        self, client, *, model: str, contents, config, media_type: str = "unknown", hedge_clients: Sequence = ()
+    ):
+        """
+        Invoca `generate_content` de forma asíncrona respetando el límite de concurrencia.
+
+        Args:
+            hedge_clients: Clientes para duplicar la llamada si tarda más de lo
+                habitual (solo si hay cupo libre); se usa la primera respuesta
+
+        Raises:
+            InferenceOverloadedError: si no hay cupo y la cola de espera está llena
+            CircuitOpenError: si Vertex AI viene fallando y el circuito está abierto
+            DeadlineExceededError: si se agota el plazo del webhook
+        """
+        def attempt(target):
+            return lambda: self._generate_once(target, model, contents, config, media_type)
+
+        if not hedge_clients:
+            return await self.upstream.call(attempt(client))
+        attempts = [attempt(target) for target in (client, *hedge_clients)]
+        return await self.upstream.call(
+            lambda: hedged(
+                "vertex",
+                attempts,
+                self.hedge_delay(model, media_type),
+                can_hedge=lambda: not self._semaphore.locked(),
+            )
+        )
+
+inference_engine = InferenceEngine(
+    max_concurrency=env.INFERENCE_MAX_CONCURRENCY,
+    max_queue=env.INFERENCE_MAX_QUEUE,
+    queue_timeout=env.INFERENCE_QUEUE_TIMEOUT,
+)
+logger.debug(
+    f"Motor de inferencia - Concurrencia: {env.INFERENCE_MAX_CONCURRENCY}, "
+    f"Cola: {env.INFERENCE_MAX_QUEUE}, Espera máx.: {env.INFERENCE_QUEUE_TIMEOUT}s"
+)
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+INGEST_APPENDS = registry.counter(
+    "waha_gateway_ingest_appends_total",
+    "Webhooks escritos en el log de ingesta",
+)
+INGEST_ACKS = registry.counter(
+    "waha_gateway_ingest_acks_total",
+    "Webhooks marcados como terminados (checkpoints) en el log de ingesta",
+)
+INGEST_REPLAYED = registry.counter(
+    "waha_gateway_ingest_replayed_total",
+    "Webhooks sin terminar reprocesados al iniciar",
+)
+INGEST_BATCH_SIZE = registry.histogram(
+    "waha_gateway_ingest_batch_size",
+    "Escrituras agrupadas en cada commit (una sincronización a disco por commit)",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+INGEST_COMMIT = registry.histogram(
+    "waha_gateway_ingest_commit_seconds",
+    "Duración de cada commit del log de ingesta",
+)
+INGEST_PENDING = registry.gauge(
+    "waha_gateway_ingest_unfinished",
+    "Webhooks escritos en el log y aún sin checkpoint",
+)
+
+_SYNCHRONOUS = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+# Sistemas de archivos en memoria: el log no sobrevive al reciclaje de la instancia
+_MEMORY_FILESYSTEMS = {"tmpfs", "ramfs"}
+
+
+def _filesystem_type(path: str) -> Optional[str]:
+    """Tipo del sistema de archivos que contiene `path` (el punto de montaje más largo en /proc/mounts)."""
+    directory = os.path.dirname(os.path.realpath(path)) or "/"
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            entries = [line.split()[1:3] for line in mounts if len(line.split()) >= 3]
+    except OSError:
+        return None
+    best, fs_type = "", None
+    for mount_point, mount_type in entries:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = directory == mount_point or directory.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) >= len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type
+
+
+class IngestLog:
+    """
+    Log de ingesta durable en SQLite (modo WAL). El webhook se escribe antes de
+    responder a WAHA y se marca como terminado (checkpoint) al procesarse; lo
+    que quede sin checkpoint se reprocesa al iniciar.
+
+    Las escrituras se agrupan: mientras un commit está en curso las nuevas
+    se acumulan y van juntas en el siguiente (hasta `max_batch`), así una
+    sola sincronización a disco cubre muchos webhooks. Los checkpoints viajan
+    en el mismo commit y no se esperan: si se pierden, el webhook se reprocesa
+    y la deduplicación evita responder dos veces. La compactación borra cada
+    `compact_interval` segundos los webhooks terminados.
+
+    Un archivo pertenece a un solo proceso (la reproducción toma todo lo que
+    esté sin terminar).
+
+    Args:
+        path: Archivo SQLite
+        synchronous: "full" sincroniza a disco en cada commit (sobrevive a un
+            corte de energía); "normal" sobrevive a la caída del proceso
+        max_batch: Máximo de webhooks por commit
+        compact_interval: Segundos entre compactaciones
+    """
+
+    def __init__(self, path: str, synchronous: str = "normal", max_batch: int = 500, compact_interval: float = 60.0):
+        self.path = path
+        self.synchronous = _SYNCHRONOUS.get(synchronous.lower(), "NORMAL")
+        self.max_batch = max_batch
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._appends: List[Tuple[str, str, asyncio.Future]] = []
+        self._acks: List[int] = []
+        self._unfinished = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._last_compaction = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        """Abre el archivo y lanza la tarea que agrupa y escribe los commits (dentro del event loop)."""
+        if self.running:
+            return
+        # En Cloud Run /tmp vive en memoria aunque no figure como tmpfs en /proc/mounts
+        fs_type = _filesystem_type(self.path)
+        if fs_type in _MEMORY_FILESYSTEMS or os.path.realpath(self.path).startswith("/tmp/"):
+            logger.warning(
+                f"El log de ingesta {self.path} está en tmpfs o en /tmp: puede perderse al reciclar la "
+                f"instancia. Use INGEST_LOG_PATH en un volumen montado para que sea durable"
+            )
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_log ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS ingest_checkpoint (seq INTEGER PRIMARY KEY)")
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._writer(), name="ingest-log-writer")
+        logger.info(f"Log de ingesta iniciado: {self.path}")
+
+    async def close(self):
+        """Escribe lo pendiente, compacta y cierra el archivo."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._compact)
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+    async def append(self, key: str, payload: str) -> int:
+        """Escribe un webhook y espera a que el commit termine. Retorna su número de secuencia."""
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append((key, payload, future))
+        self._wakeup.set()
+        return await future
+
+    def ack(self, seq: int):
+        """Registra el checkpoint de un webhook terminado (se escribe con el próximo commit)."""
+        self._acks.append(seq)
+        self._wakeup.set()
+
+    def unfinished(self) -> List[Tuple[int, str, str]]:
+        """(seq, key, payload) de los webhooks sin checkpoint, en orden de llegada."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, key, payload FROM ingest_log "
+                "WHERE seq NOT IN (SELECT seq FROM ingest_checkpoint) ORDER BY seq"
+            ).fetchall()
+        self._unfinished = len(rows)
+        INGEST_PENDING.set(self._unfinished)
+        return rows
+
+    def _write(self, rows: List[Tuple[str, str, float]], acks: List[int]) -> List[int]:
+        with self._lock:
+            with INGEST_COMMIT.time():
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._conn.executemany(
+                        "INSERT INTO ingest_log (key, payload, created_at) VALUES (?, ?, ?)", rows
+                    )
+                    # Con el lock de escritura tomado los seq de un mismo commit son consecutivos
+                    last = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0] if rows else 0
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO ingest_checkpoint (seq) VALUES (?)", [(seq,) for seq in acks]
+                    )
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        return list(range(last - len(rows) + 1, last + 1))
+
+    def _compact(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM ingest_log WHERE seq IN (SELECT seq FROM ingest_checkpoint)")
+                self._conn.execute("DELETE FROM ingest_checkpoint")
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # Devuelve al archivo principal lo acumulado en el WAL y lo trunca
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def _flush(self):
+        while self._appends or self._acks:
+            batch = self._appends[:self.max_batch]
+            del self._appends[:self.max_batch]
+            acks, self._acks = self._acks, []
+            now = time.time()
+            try:
+                seqs = await asyncio.to_thread(
+                    self._write, [(key, payload, now) for key, payload, _ in batch], acks
+                )
+            except Exception as e:
+                logger.error(f"Error al escribir el log de ingesta: {str(e)} - Tipo: {type(e).__name__}", exc_info=True)
+                # Falla toda la cola, no solo este lote: nada queda esperando un commit que
+                # no se va a intentar (y WAHA reenvía los webhooks rechazados con 503)
+                pending, self._appends = batch + self._appends, []
+                for _, _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                # Los checkpoints se reintentan en el próximo commit
+                self._acks[:0] = acks
+                return
+            for (_, _, future), seq in zip(batch, seqs):
+                if not future.done():
+                    future.set_result(seq)
+            if batch:
+                INGEST_BATCH_SIZE.observe(len(batch))
+                INGEST_APPENDS.inc(len(batch))
+            INGEST_ACKS.inc(len(acks))
+            self._unfinished += len(batch) - len(acks)
+            INGEST_PENDING.set(max(self._unfinished, 0))
+
+    async def _writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.compact_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+            if self._closing:
+                return
+            if time.monotonic() - self._last_compaction >= self.compact_interval:
+                self._last_compaction = time.monotonic()
+                try:
+                    await asyncio.to_thread(self._compact)
+                except Exception as e:
+                    logger.error(f"Error al compactar el log de ingesta: {str(e)} - Tipo: {type(e).__name__}")
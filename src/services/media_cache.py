@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+CACHE_HITS = registry.counter(
+    "waha_gateway_media_cache_hits_total",
+    "Aciertos de la caché de resultados de media por nivel",
+    ("tier",),
+)
+CACHE_MISSES = registry.counter(
+    "waha_gateway_media_cache_misses_total",
+    "Fallos de la caché de resultados de media",
+)
+CACHE_EVICTIONS = registry.counter(
+    "waha_gateway_media_cache_evictions_total",
+    "Entradas desalojadas por tamaño o expiración",
+    ("tier",),
+)
+CACHE_BYTES = registry.gauge(
+    "waha_gateway_media_cache_bytes",
+    "Bytes almacenados en la caché por nivel",
+    ("tier",),
+)
+CACHE_COALESCED = registry.counter(
+    "waha_gateway_media_cache_coalesced_total",
+    "Solicitudes idénticas que esperaron un cálculo en curso",
+)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(content_sha256: str, model: str, processor: str) -> str:
+    """
+    Clave direccionada por contenido: hash de los bytes + modelo + huella del
+    procesador (prompt, configuración de generación y preprocesamiento).
+    """
+    digest = hashlib.sha256()
+    digest.update(content_sha256.encode())
+    digest.update(b"\0")
+    digest.update(model.encode())
+    digest.update(b"\0")
+    digest.update(processor.encode())
+    return digest.hexdigest()
+
+
+class MediaCache:
+    """
+    Caché de textos extraídos de media (transcripciones, análisis de imagen/PDF).
+
+    Nivel en memoria acotado por bytes y TTL, y nivel opcional en disco
+    (un archivo JSON por clave). Las solicitudes idénticas concurrentes
+    comparten un único cálculo.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        # clave -> (valor, tamaño en bytes, expira_en)
+        self._memory: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._disk_writes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            logger.info(f"Caché de media en disco: {self.disk_dir}")
+
+    # Nivel en memoria
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at < time.time():
+            self._memory_evict(key)
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_evict(self, key: str):
+        _, size, _ = self._memory.pop(key)
+        self._memory_bytes -= size
+        CACHE_EVICTIONS.inc(tier="memory")
+
+    def _memory_put(self, key: str, value: str, expires_at: float):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (value, size, expires_at)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            self._memory_evict(next(iter(self._memory)))
+        CACHE_BYTES.set(self._memory_bytes, tier="memory")
+
+    # Nivel en disco
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] < time.time():
+            try:
+                os.remove(path)
+                CACHE_EVICTIONS.inc(tier="disk")
+            except OSError:
+                pass
+            return None
+        return entry["value"], entry["expires_at"]
+
+    def _disk_put(self, key: str, value: str, expires_at: float):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"value": value, "expires_at": expires_at}, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._disk_writes += 1
+        if self._disk_writes % 100 == 1:
+            self._disk_prune()
+
+    def _disk_prune(self):
+        """Elimina entradas expiradas y, si se supera el tope, las más antiguas."""
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if total <= self.disk_max_bytes and mtime + self.ttl >= now:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                CACHE_EVICTIONS.inc(tier="disk")
+            except OSError:
+                pass
+        CACHE_BYTES.set(total, tier="disk")
+
+    # API
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._memory_get(key)
+        if value is not None:
+            CACHE_HITS.inc(tier="memory")
+            return value
+        if self.disk_dir:
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None:
+                CACHE_HITS.inc(tier="disk")
+                self._memory_put(key, entry[0], entry[1])
+                return entry[0]
+        CACHE_MISSES.inc()
+        return None
+
+    async def put(self, key: str, value: str):
+        expires_at = time.time() + self.ttl
+        self._memory_put(key, value, expires_at)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._disk_put, key, value, expires_at)
+            except OSError as e:
+                logger.warning(f"No se pudo escribir la caché de media en disco: {str(e)}")
+
+    async def get_or_compute(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Optional[str]]],
+        bypass: bool = False,
+    ) -> Optional[str]:
+        """
+        Retorna el valor cacheado o lo calcula con `factory` una sola vez.
+        Con `bypass` se ignora el valor cacheado y se recalcula (el resultado
+        nuevo reemplaza al anterior). Los resultados None no se cachean.
+        """
+        if not bypass:
+            value = await self.get(key)
+            if value is not None:
+                return value
+            future = self._in_flight.get(key)
+            if future is not None:
+                CACHE_COALESCED.inc()
+                return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await factory()
+            if value is not None:
+                await self.put(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+
+media_cache = MediaCache(
+    max_bytes=env.MEDIA_CACHE_MAX_BYTES,
+    ttl=env.MEDIA_CACHE_TTL,
+    disk_dir=env.MEDIA_CACHE_DIR,
+    disk_max_bytes=env.MEDIA_CACHE_DISK_MAX_BYTES,
+)
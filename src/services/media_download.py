@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from typing import Callable, Optional
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+from src.utils.instrumentation import trace_headers
+from src.services.http_clients import get_http_client, UPSTREAM_LATENCY
+
+
+DOWNLOAD_BYTES = registry.counter(
+    "waha_gateway_media_download_bytes_total",
+    "Bytes de media descargados desde WAHA",
+)
+DOWNLOAD_SPILLED = registry.counter(
+    "waha_gateway_media_download_spilled_total",
+    "Descargas que superaron el umbral en memoria y se escribieron a disco",
+)
+DOWNLOAD_REJECTED = registry.counter(
+    "waha_gateway_media_download_rejected_total",
+    "Descargas rechazadas por superar el tamaño máximo",
+    ("reason",),
+)
+
+# Cantidad de bytes iniciales que se conservan para inspeccionar el formato
+HEAD_SIZE = 64
+
+
+class MediaTooLargeError(Exception):
+    """El archivo supera MEDIA_MAX_BYTES."""
+
+
+class DownloadedMedia:
+    """
+    Archivo descargado en streaming: queda en un único buffer en memoria o,
+    si supera el umbral, en un archivo temporal. El hash SHA-256 y los primeros
+    bytes se calculan mientras se descarga.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        sha256: str,
+        head: bytes,
+        content_type: Optional[str],
+        buffer: Optional[io.BytesIO] = None,
+        path: Optional[str] = None,
+    ):
+        self.size = size
+        self.sha256 = sha256
+        self.head = head
+        self.content_type = content_type
+        self._buffer = buffer
+        self._data: Optional[bytes] = None
+        self._path = path
+
+    @property
+    def spilled(self) -> bool:
+        return self._path is not None
+
+    def read(self) -> bytes:
+        """
+        Materializa el contenido como bytes justo antes de la inferencia; las
+        llamadas siguientes reciben los mismos bytes (una sola copia en memoria).
+        En memoria, BytesIO.getvalue() entrega su propio buffer sin copiarlo.
+        Para un archivo en disco conviene `aread`, que no bloquea el event loop.
+        """
+        if self._data is not None:
+            return self._data
+        if self._path is not None:
+            with open(self._path, "rb") as file:
+                self._data = file.read()
+            return self._data
+        self._data = self._buffer.getvalue()
+        self._buffer.close()
+        self._buffer = None
+        return self._data
+
+    async def aread(self) -> bytes:
+        """Como `read`, pero la lectura del archivo temporal corre en un hilo."""
+        if self._data is None and self._path is not None:
+            await asyncio.to_thread(self.read)
+        return self.read()
+
+    def close(self):
+        self._data = None
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+        if self._path is not None:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def download_media(
+    url: str,
+    max_bytes: int = None,
+    inspect: Optional[Callable[[bytes, Optional[str]], None]] = None,
+) -> DownloadedMedia:
+    """
+    Descarga un archivo de WAHA en streaming con límite de tamaño.
+
+    Args:
+        url: URL del archivo (ya resuelta contra WAHA_API_URL)
+        max_bytes: Tamaño máximo permitido (por defecto MEDIA_MAX_BYTES)
+        inspect: Función que recibe los primeros bytes y el Content-Type apenas
+            están disponibles; si lanza una excepción la descarga se corta ahí
+
+    Returns:
+        DownloadedMedia: contenido descargado; cerrarlo libera el archivo temporal
+
+    Raises:
+        MediaTooLargeError: si Content-Length o los bytes recibidos superan el máximo
+        httpx.HTTPError: si falla la descarga
+    """
+    if max_bytes is None:
+        max_bytes = env.MEDIA_MAX_BYTES
+    client = get_http_client("waha")
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    spool = None
+    size = 0
+    head = b""
+
+    with UPSTREAM_LATENCY.time(upstream="waha", operation="download"):
+        async with client.stream("GET", url, headers={"X-Api-Key": env.WAHA_API_KEY, **trace_headers()}) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                DOWNLOAD_REJECTED.inc(reason="content_length")
+                raise MediaTooLargeError(
+                    f"El archivo declara {content_length} bytes (máximo {max_bytes})"
+                )
+            content_type = response.headers.get("Content-Type")
+            try:
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        DOWNLOAD_REJECTED.inc(reason="body")
+                        raise MediaTooLargeError(f"El archivo supera el máximo de {max_bytes} bytes")
+                    digest.update(chunk)
+                    if len(head) < HEAD_SIZE:
+                        head += chunk[:HEAD_SIZE - len(head)]
+                        if inspect is not None and len(head) == HEAD_SIZE:
+                            inspect(head, content_type)
+                    # La escritura a disco corre en un hilo para no bloquear el event loop
+                    if spool is not None:
+                        await asyncio.to_thread(spool.write, chunk)
+                    elif size > env.MEDIA_SPOOL_BYTES:
+                        # Pasar a disco lo acumulado y seguir escribiendo ahí
+                        spool = await asyncio.to_thread(
+                            tempfile.NamedTemporaryFile, prefix="waha-media-", dir=env.MEDIA_SPOOL_DIR or None, delete=False
+                        )
+                        buffer.write(chunk)
+                        await asyncio.to_thread(spool.write, buffer.getbuffer())
+                        buffer.close()
+                        buffer = None
+                        DOWNLOAD_SPILLED.inc()
+                    else:
+                        buffer.write(chunk)
+                if inspect is not None and len(head) < HEAD_SIZE:
+                    # Archivo más chico que HEAD_SIZE
+                    inspect(head, content_type)
+            except BaseException:
+                if spool is not None:
+                    spool.close()
+                    os.remove(spool.name)
+                raise
+
+    DOWNLOAD_BYTES.inc(size)
+    if spool is not None:
+        await asyncio.to_thread(spool.close)
+        logger.debug(f"Archivo de {size} bytes descargado a disco: {spool.name}")
+        return DownloadedMedia(size, digest.hexdigest(), head, content_type, path=spool.name)
+    return DownloadedMedia(size, digest.hexdigest(), head, content_type, buffer=buffer)
@@ -0,0 +1,578 @@
+import asyncio
+import hashlib
+import json
+import time
+import httpx
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+from src.utils.environment import WAHA_API_URL, MEDIA_CACHE_ENABLED
+from src.utils.logger import logger, Payload
+from src.services.vertex_client import get_vertex_client, get_hedge_clients, get_safety_settings, genai_types
+from src.services.media_download import download_media, DownloadedMedia, MediaTooLargeError
+from src.services.inference import inference_engine, InferenceOverloadedError
+from src.services.http_clients import get_upstream
+from src.services.admission import admission_controller
+from src.services.media_cache import media_cache, cache_key
+from src.services.image_preprocess import Preprocessor, run_preprocessor
+from src.services.audio_chunking import SplitResult, Splitter, ogg_opus_duration
+from src.services.model_routing import model_routes, ModelTier, RoutingTable, MODEL_TIER_CALLS, MODEL_TIER_LATENCY, MODEL_TIER_FALLBACKS
+from src.services.mime_detection import detect_mime_type, MediaTypeMismatchError, MIME_DETECTIONS
+from src.utils.metrics import registry
+from src.utils.resilience import CircuitOpenError, DeadlineExceededError, deadline_scope, remaining_time
+from src.utils.instrumentation import stage, record_bytes, record_token_usage
+
+
+INVALID_RESPONSES = registry.counter(
+    "waha_gateway_media_invalid_responses_total",
+    "Respuestas del modelo que no pasaron la validación local (retried, rejected)",
+    ("media_type", "outcome"),
+)
+
+
+# Parámetros de generación comunes a todos los procesadores
+TEMPERATURE = 0.1  # Baja temperatura para resultados más precisos
+TOP_P = 0.95
+
+
+class InvalidResponseError(Exception):
+    """El modelo no devolvió una respuesta válida después de todos los intentos."""
+
+
+def _describe_callable(function: Optional[Callable]) -> Optional[str]:
+    """Nombre calificado de una función y, si es un partial, sus argumentos (la configuración)."""
+    if function is None:
+        return None
+    if isinstance(function, partial):
+        return f"{_describe_callable(function.func)}{function.args}{sorted(function.keywords.items())}"
+    return f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', repr(function))}"
+
+
+class MediaProcessor:
+    """
+    Convierte un tipo de media a texto con Vertex AI. El prompt y la
+    configuración de generación se construyen una sola vez, en el primer uso
+    (así importar el pipeline no importa google.genai).
+
+    Args:
+        name: Nombre corto del procesador (también es la etiqueta de las métricas)
+        mime_types: Tipos MIME exactos o prefijos terminados en "/" (p. ej. "audio/")
+        prompt: Instrucción enviada junto al archivo
+        error_message: Mensaje de error cuando no se obtiene texto
+        max_output_tokens: Tope de tokens de la respuesta
+        preprocess: Transformación opcional del archivo antes de la inferencia
+            (corre en un pool de procesos)
+        split: División opcional de archivos largos en fragmentos que se
+            procesan en paralelo y cuyos textos se unen en orden (corre en un
+            hilo y también informa la duración para el ruteo de modelos)
+        response_schema: Esquema de la respuesta JSON (salida estructurada); sin
+            esquema la respuesta es texto libre
+        parse_response: Valida la respuesta y la convierte al texto final; lanza
+            ValueError si la respuesta no es válida
+        max_attempts: Invocaciones máximas cuando parse_response rechaza la respuesta
+    """
+
+    def __init__(
+        self,
+        name: str,
+        mime_types: List[str],
+        prompt: str,
+        error_message: str = "No se pudo procesar el archivo",
+        max_output_tokens: int = 8192,
+        preprocess: Optional[Preprocessor] = None,
+        split: Optional[Splitter] = None,
+        response_schema=None,
+        parse_response: Optional[Callable[[str], str]] = None,
+        max_attempts: int = 1,
+    ):
+        self.name = name
+        self.mime_types = mime_types
+        self.prompt = prompt
+        self.error_message = error_message
+        self.preprocess = preprocess
+        self.split = split
+        self.parse_response = parse_response
+        self.max_attempts = max(max_attempts, 1)
+        self.max_output_tokens = max_output_tokens
+        self.response_schema = response_schema
+        self._prompt_part = None
+        self._configs = {}
+        self._fingerprint = None
+
+    @property
+    def prompt_part(self):
+        if self._prompt_part is None:
+            self._prompt_part = genai_types().Part.from_text(text=self.prompt)
+        return self._prompt_part
+
+    @property
+    def config(self):
+        return self.generation_config()
+
+    def generation_config(self, max_output_tokens: Optional[int] = None):
+        """Configuración de generación; `max_output_tokens` reemplaza el tope del procesador (ruteo de modelos)."""
+        max_output_tokens = max_output_tokens or self.max_output_tokens
+        config = self._configs.get(max_output_tokens)
+        if config is None:
+            config = self._configs[max_output_tokens] = genai_types().GenerateContentConfig(
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+                max_output_tokens=max_output_tokens,
+                response_mime_type="application/json" if self.response_schema is not None else "text/plain",
+                response_schema=self.response_schema,
+                safety_settings=get_safety_settings(),
+            )
+        return config
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Identifica en la clave de la caché de media todo lo que cambia el texto
+        resultante: prompt, parámetros de generación, tope de salida, esquema,
+        validación, preprocesamiento y división (con su configuración).
+        """
+        if self._fingerprint is None:
+            schema = self.response_schema
+            if hasattr(schema, "model_json_schema"):
+                schema = schema.model_json_schema()
+            settings = {
+                "prompt": self.prompt,
+                "temperature": TEMPERATURE,
+                "top_p": TOP_P,
+                "max_output_tokens": self.max_output_tokens,
+                "response_schema": schema,
+                "parse_response": _describe_callable(self.parse_response),
+                "preprocess": _describe_callable(self.preprocess),
+                "split": _describe_callable(self.split),
+            }
+            encoded = json.dumps(settings, sort_keys=True, default=str).encode()
+            self._fingerprint = hashlib.sha256(encoded).hexdigest()[:16]
+        return self._fingerprint
+
+    def matches(self, mimetype: str) -> bool:
+        mimetype = mimetype.split(";")[0].strip().lower()
+        return any(
+            mimetype.startswith(pattern) if pattern.endswith("/") else mimetype == pattern
+            for pattern in self.mime_types
+        )
+
+    def resolve_mime_type(self, head: bytes, declared: Optional[str], content_type: Optional[str]) -> str:
+        """
+        Determina el MIME real del archivo y verifica que este procesador lo soporte.
+
+        Raises:
+            MediaTypeMismatchError: si el tipo es desconocido o no corresponde al procesador
+        """
+        mime_type, source = detect_mime_type(head, declared, content_type)
+        if mime_type is None or not self.matches(mime_type):
+            MIME_DETECTIONS.inc(source="rejected")
+            raise MediaTypeMismatchError(
+                f"Contenido {mime_type or 'desconocido'} ({source}) no válido para {self.name} "
+                f"(declarado: {declared}, Content-Type: {content_type})"
+            )
+        MIME_DETECTIONS.inc(source=source)
+        return mime_type
+
+    def build_contents(self, files: List[Tuple[bytes, str]]) -> list:
+        """Un solo mensaje con todos los archivos (en orden) seguidos del prompt."""
+        types = genai_types()
+        return [
+            types.Content(
+                role="user",
+                parts=[
+                    *(types.Part.from_bytes(data=data, mime_type=mime_type) for data, mime_type in files),
+                    self.prompt_part,
+                ],
+            )
+        ]
+
+
+# Procesadores registrados, consultados en orden de registro
+_processors: List[MediaProcessor] = []
+
+
+def register_processor(processor: MediaProcessor) -> MediaProcessor:
+    """Registra un procesador; los nuevos tipos de media se agregan sin tocar el router."""
+    _processors.append(processor)
+    logger.debug(f"Procesador de media registrado: {processor.name} ({', '.join(processor.mime_types)})")
+    return processor
+
+
+def prepare_processors():
+    """Construye el prompt y la configuración de todos los procesadores (importa google.genai)."""
+    for processor in _processors:
+        processor.prompt_part
+        processor.config
+
+
+def get_processor(mimetype: Optional[str]) -> Optional[MediaProcessor]:
+    """Obtiene el procesador para un tipo MIME, o None si no está soportado."""
+    if not mimetype:
+        return None
+    for processor in _processors:
+        if processor.matches(mimetype):
+            return processor
+    return None
+
+
+def resolve_media_url(url_media: str) -> str:
+    """Reemplaza el scheme y host de la URL de WAHA (p. ej. localhost:3000) por WAHA_API_URL."""
+    parsed_url = urlparse(url_media)
+    waha_parsed = urlparse(WAHA_API_URL)
+    return urlunparse((
+        waha_parsed.scheme,  # http o https
+        waha_parsed.netloc,  # hostname:port
+        parsed_url.path,     # ruta del archivo
+        parsed_url.params,
+        parsed_url.query,
+        parsed_url.fragment
+    ))
+
+
+async def _download(
+    url_media: str, processor: MediaProcessor, declared_mime_type: Optional[str]
+) -> Tuple[DownloadedMedia, str]:
+    """Descarga un archivo de WAHA y retorna (archivo, MIME verificado)."""
+    corrected_url = resolve_media_url(url_media)
+    logger.info("Procesando %s. URL corregida: %s", processor.name, corrected_url)
+
+    # Descargar en streaming; el tipo real se verifica con los primeros bytes
+    # y la descarga se corta si no corresponde al procesador
+    detected = {}
+
+    def _inspect(head: bytes, content_type: Optional[str]):
+        with stage("mime"):
+            detected["mime_type"] = processor.resolve_mime_type(head, declared_mime_type, content_type)
+
+    # La descarga es idempotente: se reintenta ante errores de red y 5xx
+    with stage("download"):
+        media = await get_upstream("waha").call(lambda: download_media(corrected_url, inspect=_inspect))
+    admission_controller.track_media_bytes(media.size)
+    record_bytes("download", "in", media.size)
+    mime_type = detected["mime_type"]
+    logger.info("Archivo descargado. Tamaño: %d bytes - MIME: %s", media.size, mime_type)
+    return media, mime_type
+
+
+async def _prepare(processor: MediaProcessor, data: bytes, mime_type: str) -> Tuple[bytes, str]:
+    """Bytes y MIME a enviar al modelo (después del preprocesamiento del procesador, si tiene)."""
+    if processor.preprocess is None:
+        return data, mime_type
+    return await run_preprocessor(processor.preprocess, data, mime_type, processor.name)
+
+
+class LowQualityResponseError(Exception):
+    """El modelo respondió vacío o truncado (se reintenta en el nivel de respaldo, si hay)."""
+
+    def __init__(self, reason: str, text: Optional[str]):
+        super().__init__(f"Respuesta {reason} del modelo")
+        self.reason = reason
+        self.text = text
+
+
+def _weak_response_reason(result) -> Optional[str]:
+    if not (result.text or "").strip():
+        return "empty"
+    candidates = getattr(result, "candidates", None) or []
+    finish_reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    if finish_reason is not None and getattr(finish_reason, "name", str(finish_reason)) == "MAX_TOKENS":
+        return "truncated"
+    return None
+
+
+def _select_tiers(
+    processor: MediaProcessor, model_name: Optional[str], size: int, seconds: Optional[float] = None
+) -> List[ModelTier]:
+    """Niveles de modelo para la media según MODEL_ROUTES; con un modelo explícito, solo ese."""
+    if model_name is not None:
+        return RoutingTable.single(model_name).chain("default")
+    return model_routes.select(processor.name, size, seconds)
+
+
+async def _split(processor: MediaProcessor, data: bytes, mime_type: str, routed: bool) -> SplitResult:
+    """
+    Fragmentos y duración del archivo. El recorrido de las páginas Ogg corre
+    en un hilo y se hace una sola vez: la duración sale del divisor y solo se
+    calcula aparte si no hay divisor y alguna regla de ruteo la usa.
+    """
+    if processor.split is not None:
+        return await asyncio.to_thread(processor.split, data, mime_type)
+    if routed and model_routes.uses_duration:
+        return SplitResult(None, await asyncio.to_thread(ogg_opus_duration, data))
+    return SplitResult(None, None)
+
+
+async def _infer_tier(processor: MediaProcessor, tier: ModelTier, files: List[Tuple[bytes, str]]) -> str:
+    """Una invocación de Vertex AI con todos los archivos; se repite si parse_response la rechaza."""
+    for attempt in range(1, processor.max_attempts + 1):
+        # El plazo del nivel acota también la espera por un cupo; el del webhook sigue vigente
+        with deadline_scope(tier.timeout) if tier.timeout else nullcontext():
+            with stage("inference"):
+                result = await inference_engine.generate_content(
+                    get_vertex_client(),
+                    model=tier.model,
+                    contents=processor.build_contents(files),
+                    config=processor.generation_config(tier.max_output_tokens),
+                    media_type=processor.name,
+                    hedge_clients=get_hedge_clients(),
+                )
+        record_bytes("inference", "out", sum(len(data) for data, _ in files))
+        record_token_usage(tier.model, processor.name, result.usage_metadata)
+        tier.record_usage(result.usage_metadata)
+        if processor.parse_response is None:
+            reason = _weak_response_reason(result)
+            if reason is not None:
+                raise LowQualityResponseError(reason, result.text)
+            return result.text
+        try:
+            return processor.parse_response(result.text)
+        except ValueError as e:
+            outcome = "retried" if attempt < processor.max_attempts else "rejected"
+            INVALID_RESPONSES.inc(media_type=processor.name, outcome=outcome)
+            logger.warning(
+                f"Respuesta inválida de {processor.name} (intento {attempt}/{processor.max_attempts}): {str(e)}"
+            )
+    raise InvalidResponseError(f"Sin respuesta válida después de {processor.max_attempts} intentos")
+
+
+async def _infer_part(
+    processor: MediaProcessor, tiers: List[ModelTier], files: List[Tuple[bytes, str]]
+) -> Tuple[str, Optional[LowQualityResponseError]]:
+    """Inferencia de un fragmento: uno truncado no descarta a los demás; uno vacío sí."""
+    try:
+        return await _infer(processor, tiers, files), None
+    except LowQualityResponseError as e:
+        if not (e.text or "").strip():
+            raise
+        return e.text, e
+
+
+async def _infer(processor: MediaProcessor, tiers: List[ModelTier], files: List[Tuple[bytes, str]]) -> str:
+    """
+    Inferencia con el primer nivel; si vence su plazo o la respuesta es vacía,
+    truncada o inválida, se repite con el siguiente nivel de la cadena.
+    """
+    for index, tier in enumerate(tiers):
+        start = time.perf_counter()
+        try:
+            text = await _infer_tier(processor, tier, files)
+        except (DeadlineExceededError, LowQualityResponseError, InvalidResponseError) as e:
+            MODEL_TIER_LATENCY.observe(time.perf_counter() - start, tier=tier.name, media_type=processor.name)
+            if isinstance(e, DeadlineExceededError):
+                reason = "timeout"
+            else:
+                reason = "invalid" if isinstance(e, InvalidResponseError) else "low_quality"
+            MODEL_TIER_CALLS.inc(tier=tier.name, media_type=processor.name, outcome=reason)
+            remaining = remaining_time()
+            last = index == len(tiers) - 1
+            if last or (reason == "timeout" and remaining is not None and remaining <= 0):
+                # Sin respaldo (o venció el plazo del webhook): la respuesta débil sale como
+                # excepción para que no se cachee (ver _weak_text)
+                raise
+            MODEL_TIER_FALLBACKS.inc(from_tier=tier.name, to_tier=tiers[index + 1].name, reason=reason)
+            logger.warning(
+                f"Nivel {tier.name} ({tier.model}) sin respuesta útil para {processor.name} ({reason}): "
+                f"se usa {tiers[index + 1].name} ({tiers[index + 1].model})"
+            )
+            continue
+        except Exception:
+            MODEL_TIER_CALLS.inc(tier=tier.name, media_type=processor.name, outcome="error")
+            raise
+        MODEL_TIER_LATENCY.observe(time.perf_counter() - start, tier=tier.name, media_type=processor.name)
+        MODEL_TIER_CALLS.inc(tier=tier.name, media_type=processor.name, outcome="success")
+        return text
+
+
+def _weak_text(name: str, e: LowQualityResponseError) -> Optional[str]:
+    """
+    Texto de una respuesta débil del último nivel: la truncada se usa sin
+    cachear; la vacía es un error (None -> error_message).
+    """
+    text = (e.text or "").strip()
+    if not text:
+        _log_conversion_error(name, e)
+        return None
+    logger.warning(f"Respuesta {e.reason} de {name} sin nivel de respaldo: se usa sin cachear")
+    return text
+
+
+def _log_conversion_error(name: str, e: Exception):
+    if isinstance(e, (MediaTooLargeError, MediaTypeMismatchError)):
+        logger.warning(f"Archivo rechazado ({name}): {str(e)}")
+    elif isinstance(e, InferenceOverloadedError):
+        logger.warning(f"Inferencia rechazada ({name}): {str(e)}")
+    elif isinstance(e, (InvalidResponseError, LowQualityResponseError)):
+        logger.warning(f"Extracción rechazada ({name}): {str(e)}")
+    elif isinstance(e, (CircuitOpenError, DeadlineExceededError)):
+        logger.warning(f"Procesamiento de {name} cancelado: {str(e)}")
+    elif isinstance(e, httpx.TimeoutException):
+        logger.error(f"Timeout al descargar el archivo ({name}): {str(e)}", exc_info=e)
+    elif isinstance(e, httpx.HTTPError):
+        logger.error(f"Error HTTP al descargar el archivo ({name}): {str(e)} - Tipo: {type(e).__name__}", exc_info=e)
+    else:
+        logger.error(f"Error al convertir {name} a texto: {str(e)} - Tipo: {type(e).__name__}", exc_info=e)
+
+
+def _release(media: Optional[DownloadedMedia]):
+    if media is not None:
+        admission_controller.track_media_bytes(-media.size)
+        media.close()
+
+
+async def convert_media_to_text(
+    url_media: str,
+    processor: MediaProcessor,
+    model_name: str = None,
+    use_cache: bool = True,
+    declared_mime_type: Optional[str] = None,
+    dispatch: bool = False,
+) -> Optional[str]:
+    """
+    Descarga un archivo de WAHA y lo convierte a texto con el procesador indicado.
+
+    Args:
+        url_media: URL del archivo (puede tener localhost:3000)
+        processor: Procesador del tipo de media
+        model_name: Modelo de Vertex AI (opcional; por defecto el que elija MODEL_ROUTES)
+        use_cache: Si es False, ignora el resultado cacheado y vuelve a invocar Vertex AI
+        declared_mime_type: Mimetype informado por WAHA en el webhook
+        dispatch: Si es True, `processor` solo acota los tipos aceptados y el archivo
+            se procesa con el procesador registrado para su tipo real (detectado por
+            los primeros bytes)
+
+    Returns:
+        str: Texto obtenido, o None si hay un error
+    """
+    media = None
+    try:
+        media, mime_type = await _download(url_media, processor, declared_mime_type)
+        if dispatch:
+            processor = get_processor(mime_type) or processor
+
+        async def _generate() -> str:
+            # Los bytes se leen una vez (en un hilo si el archivo quedó en disco) y se pasan hacia abajo
+            data, model_mime_type = await _prepare(processor, await media.aread(), mime_type)
+            chunks, seconds = await _split(processor, data, model_mime_type, routed=model_name is None)
+            tiers = _select_tiers(processor, model_name, media.size, seconds)
+            if chunks:
+                logger.info(
+                    "Invocando Vertex AI (%s, %s, %d fragmentos en paralelo) con modelo: %s (%s)",
+                    processor.name, model_mime_type, len(chunks), tiers[0].model, tiers[0].name,
+                )
+                # Los fragmentos compiten por el mismo límite de concurrencia que el resto
+                # de las inferencias; el resultado se une en el orden original
+                tasks = [
+                    asyncio.create_task(_infer_part(processor, tiers, [(chunk, model_mime_type)]))
+                    for chunk in chunks
+                ]
+                try:
+                    parts = await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    raise
+                text = " ".join(part.strip() for part, _ in parts if part and part.strip())
+                weak = next((error for _, error in parts if error is not None), None)
+                if weak is not None:
+                    # Un fragmento truncado vuelve débil (y no cacheable) a todo el texto
+                    raise LowQualityResponseError(weak.reason, text)
+            else:
+                logger.info(
+                    "Invocando Vertex AI (%s, %s) con modelo: %s (%s)",
+                    processor.name, model_mime_type, tiers[0].model, tiers[0].name,
+                )
+                text = await _infer(processor, tiers, [(data, model_mime_type)])
+            logger.info("Procesamiento de %s exitoso: %s", processor.name, Payload(text), extra={"sampled": True})
+            return text
+
+        # Consultar la caché direccionada por contenido antes de invocar Vertex AI
+        if MEDIA_CACHE_ENABLED:
+            key = cache_key(media.sha256, model_name or model_routes.fingerprint(), processor.fingerprint)
+            return await media_cache.get_or_compute(key, _generate, bypass=not use_cache)
+        return await _generate()
+    except LowQualityResponseError as e:
+        return _weak_text(processor.name, e)
+    except Exception as e:
+        _log_conversion_error(processor.name, e)
+        return None
+    finally:
+        _release(media)
+
+
+async def convert_group_to_text(
+    files: List[Tuple[str, MediaProcessor, Optional[str]]],
+    processor: MediaProcessor,
+    model_name: str = None,
+    use_cache: bool = True,
+) -> Optional[str]:
+    """
+    Descarga varios archivos en paralelo (p. ej. anverso y reverso del DNI) y
+    los analiza juntos en una sola invocación de Vertex AI, con el prompt de
+    `processor`. Cada archivo se verifica y preprocesa con su propio
+    procesador. Los archivos que no se pueden descargar se omiten; si queda
+    uno solo se procesa con su procesador como un mensaje suelto.
+
+    Args:
+        files: (URL, procesador del archivo, mimetype declarado) en el orden de llegada
+        processor: Procesador del grupo (prompt, configuración y validación)
+        model_name: Modelo de Vertex AI (opcional; por defecto el que elija MODEL_ROUTES)
+        use_cache: Si es False, ignora el resultado cacheado y vuelve a invocar Vertex AI
+
+    Returns:
+        str: Texto obtenido, o None si hay un error
+    """
+    results = await asyncio.gather(
+        *(_download(url, file_processor, declared) for url, file_processor, declared in files),
+        return_exceptions=True,
+    )
+    downloads = []
+    for (_, file_processor, _), result in zip(files, results):
+        if isinstance(result, BaseException):
+            _log_conversion_error(file_processor.name, result)
+        else:
+            downloads.append((file_processor, *result))
+    try:
+        if not downloads:
+            return None
+        group = downloads[0][0] if len(downloads) == 1 else processor
+
+        async def _generate() -> str:
+            tiers = _select_tiers(group, model_name, sum(media.size for _, media, _ in downloads))
+            prepared = await asyncio.gather(
+                *(
+                    _prepare(file_processor, await media.aread(), mime_type)
+                    for file_processor, media, mime_type in downloads
+                )
+            )
+            logger.info(
+                "Invocando Vertex AI (%s, %d archivos: %s) con modelo: %s (%s)",
+                group.name, len(prepared), ", ".join(mime for _, mime in prepared), tiers[0].model, tiers[0].name,
+            )
+            text = await _infer(group, tiers, list(prepared))
+            logger.info("Procesamiento de %s exitoso: %s", group.name, Payload(text), extra={"sampled": True})
+            return text
+
+        if MEDIA_CACHE_ENABLED:
+            # El orden de los archivos es parte de la clave (anverso, reverso), y cada
+            # archivo se preprocesa con su propio procesador
+            digest = ",".join(media.sha256 for _, media, _ in downloads)
+            fingerprint = "+".join(
+                [group.fingerprint, *(file_processor.fingerprint for file_processor, _, _ in downloads)]
+            )
+            key = cache_key(digest, model_name or model_routes.fingerprint(), fingerprint)
+            return await media_cache.get_or_compute(key, _generate, bypass=not use_cache)
+        return await _generate()
+    except LowQualityResponseError as e:
+        return _weak_text(processor.name, e)
+    except Exception as e:
+        _log_conversion_error(processor.name, e)
+        return None
+    finally:
+        for _, media, _ in downloads:
+            _release(media)
+
+
+# Procesadores incluidos (se registran al importarse)
+import src.services.speech2text  # noqa: E402,F401
+import src.services.image2text  # noqa: E402,F401
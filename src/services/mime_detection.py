@@ -0,0 +1,105 @@
+from typing import Optional, Tuple
+from src.utils.metrics import registry
+
+
+MIME_DETECTIONS = registry.counter(
+    "waha_gateway_mime_detections_total",
+    "Resultado de la detección de tipo MIME por origen (sniffed, declared, content_type, rejected)",
+    ("source",),
+)
+
+# Alias frecuentes -> tipo canónico
+_ALIASES = {
+    "audio/oga": "audio/ogg",
+    "audio/opus": "audio/ogg",
+    "audio/mp3": "audio/mpeg",
+    "audio/x-wav": "audio/wav",
+    "audio/wave": "audio/wav",
+    "audio/x-m4a": "audio/mp4",
+    "audio/m4a": "audio/mp4",
+    "image/jpg": "image/jpeg",
+    "image/pjpeg": "image/jpeg",
+}
+
+# Tipos genéricos que no aportan información
+_GENERIC = {"application/octet-stream", "binary/octet-stream", "text/plain"}
+
+# Cantidad mínima de bytes para intentar reconocer el formato
+SNIFF_BYTES = 16
+
+# Marcas MP4 (ftyp) de solo audio: notas de voz de iOS, .m4a y audiolibros
+_AUDIO_MP4_BRANDS = {b"M4A ", b"M4B ", b"M4P "}
+# Marcas genéricas que usan tanto audio como video: el tipo declarado decide
+_GENERIC_MP4_BRANDS = {b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"dash"}
+
+
+class MediaTypeMismatchError(Exception):
+    """El contenido real del archivo no corresponde a un tipo soportado por el procesador."""
+
+
+def normalize_mime_type(mimetype: Optional[str]) -> Optional[str]:
+    """Quita parámetros (p. ej. "; codecs=opus"), pasa a minúsculas y resuelve alias."""
+    if not mimetype:
+        return None
+    base = mimetype.split(";")[0].strip().lower()
+    if not base or base in _GENERIC:
+        return None
+    return _ALIASES.get(base, base)
+
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """Reconoce el formato por los primeros bytes (firma o "magic bytes")."""
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[4:8] == b"ftyp":
+        # Contenedor MP4: las notas de voz de iOS y los .m4a usan la marca M4A
+        return "audio/mp4" if head[8:12] in _AUDIO_MP4_BRANDS else "video/mp4"
+    if head.startswith(b"ID3"):
+        return "audio/mpeg"
+    # Sincronización de frame MPEG de audio (11 bits en 1) con capa válida
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0 and head[1] & 0x06:
+        return "audio/mpeg"
+    return None
+
+
+def detect_mime_type(
+    head: bytes,
+    declared: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> Tuple[Optional[str], str]:
+    """
+    Combina la firma del contenido, el mimetype declarado por WAHA y el
+    Content-Type de la descarga. La firma tiene prioridad porque es lo que
+    realmente recibirá el modelo, salvo en un MP4 de marca genérica (isom,
+    mp42, dash...): la firma no distingue audio de video (la pista está en
+    `moov`, a veces al final del archivo) y se respeta un tipo audio/* declarado.
+
+    Returns:
+        (tipo MIME canónico o None, origen: "sniffed", "declared", "content_type" o "unknown")
+    """
+    sniffed = sniff_mime_type(head)
+    declared = normalize_mime_type(declared)
+    content_type = normalize_mime_type(content_type)
+    if sniffed == "video/mp4" and head[8:12] in _GENERIC_MP4_BRANDS:
+        for hint, source in ((declared, "declared"), (content_type, "content_type")):
+            if hint and hint.startswith("audio/"):
+                return hint, source
+    if sniffed:
+        return sniffed, "sniffed"
+    if declared:
+        return declared, "declared"
+    if content_type:
+        return content_type, "content_type"
+    return None, "unknown"
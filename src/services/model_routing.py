@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+MODEL_TIER_CALLS = registry.counter(
+    "waha_gateway_model_tier_calls_total",
+    "Inferencias por nivel de modelo, tipo de media y resultado (success, timeout, low_quality, invalid, error)",
+    ("tier", "media_type", "outcome"),
+)
+MODEL_TIER_LATENCY = registry.histogram(
+    "waha_gateway_model_tier_seconds",
+    "Duración de las inferencias por nivel de modelo (incluye la espera por un cupo y los reintentos)",
+    ("tier", "media_type"),
+)
+MODEL_TIER_TOKENS = registry.counter(
+    "waha_gateway_model_tier_tokens_total",
+    "Tokens de Vertex AI por nivel de modelo y clase (prompt, response)",
+    ("tier", "kind"),
+)
+MODEL_TIER_COST = registry.counter(
+    "waha_gateway_model_tier_cost_usd_total",
+    "Costo estimado en USD por nivel de modelo (tokens por el precio configurado del nivel)",
+    ("tier",),
+)
+MODEL_TIER_FALLBACKS = registry.counter(
+    "waha_gateway_model_tier_fallbacks_total",
+    "Inferencias repetidas en el nivel de respaldo por motivo (timeout, low_quality, invalid)",
+    ("from_tier", "to_tier", "reason"),
+)
+
+
+class ModelTier:
+    """
+    Un nivel de modelo de la tabla de ruteo.
+
+    Args:
+        name: Nombre del nivel (etiqueta de las métricas)
+        model: Modelo de Vertex AI
+        timeout: Segundos máximos por inferencia en este nivel (incluida la espera por un
+            cupo); al vencer se pasa al nivel de respaldo. None = solo el plazo del webhook
+        max_output_tokens: Tope de tokens de la respuesta; None = el del procesador
+        input_cost: USD por millón de tokens de entrada
+        output_cost: USD por millón de tokens de salida
+        fallback: Nivel a usar si este vence o responde vacío, truncado o inválido
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        timeout: Optional[float] = None,
+        max_output_tokens: Optional[int] = None,
+        input_cost: float = 0.0,
+        output_cost: float = 0.0,
+        fallback: Optional[str] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.timeout = timeout
+        self.max_output_tokens = max_output_tokens
+        self.input_cost = input_cost
+        self.output_cost = output_cost
+        self.fallback = fallback
+
+    def record_usage(self, usage) -> None:
+        """Acumula los tokens y el costo estimado de una respuesta de este nivel."""
+        if usage is None:
+            return
+        prompt = getattr(usage, "prompt_token_count", None) or 0
+        response = getattr(usage, "candidates_token_count", None) or 0
+        if prompt:
+            MODEL_TIER_TOKENS.inc(prompt, tier=self.name, kind="prompt")
+        if response:
+            MODEL_TIER_TOKENS.inc(response, tier=self.name, kind="response")
+        cost = (prompt * self.input_cost + response * self.output_cost) / 1_000_000
+        if cost:
+            MODEL_TIER_COST.inc(cost, tier=self.name)
+
+
+class Route:
+    """
+    Regla de la tabla: elige `tier` si la media cumple todas las condiciones
+    indicadas (las que faltan no filtran).
+
+    Args:
+        tier: Nivel elegido
+        media_types: Procesadores a los que aplica (audio, image, pdf, album)
+        min_bytes / max_bytes: Tamaño del archivo descargado (suma, en grupos)
+        min_seconds / max_seconds: Duración del audio
+    """
+
+    def __init__(
+        self,
+        tier: str,
+        media_types: Optional[List[str]] = None,
+        min_bytes: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        min_seconds: Optional[float] = None,
+        max_seconds: Optional[float] = None,
+    ):
+        self.tier = tier
+        self.media_types = media_types
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+
+    @property
+    def uses_duration(self) -> bool:
+        return self.min_seconds is not None or self.max_seconds is not None
+
+    def matches(self, media_type: str, size: int, seconds: Optional[float]) -> bool:
+        if self.media_types is not None and media_type not in self.media_types:
+            return False
+        if self.min_bytes is not None and size < self.min_bytes:
+            return False
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        if self.uses_duration:
+            # Sin duración conocida (no es audio o no se pudo leer) la regla no aplica
+            if seconds is None:
+                return False
+            if self.min_seconds is not None and seconds < self.min_seconds:
+                return False
+            if self.max_seconds is not None and seconds > self.max_seconds:
+                return False
+        return True
+
+
+class RoutingTable:
+    """
+    Elige el nivel de modelo de cada inferencia de media según el tipo, el
+    tamaño y la duración: la primera regla que coincide, o `default`. La
+    cadena de respaldo sigue los `fallback` de cada nivel.
+
+    Formato JSON (MODEL_ROUTES, en línea o ruta a un archivo):
+
+        {
+          "tiers": {
+            "fast": {"model": "gemini-2.0-flash-lite", "timeout": 8, "fallback": "standard",
+                     "input_cost": 0.075, "output_cost": 0.3},
+            "standard": {"model": "gemini-2.0-flash", "timeout": 20, "fallback": "strong"},
+            "strong": {"model": "gemini-2.5-pro", "max_output_tokens": 2048}
+          },
+          "routes": [
+            {"media_types": ["audio"], "max_seconds": 30, "tier": "fast"},
+            {"media_types": ["pdf"], "tier": "strong"}
+          ],
+          "default": "standard"
+        }
+    """
+
+    def __init__(self, tiers: Dict[str, ModelTier], routes: List[Route], default: str):
+        for name in [route.tier for route in routes] + [default]:
+            if name not in tiers:
+                raise ValueError(f"Nivel de modelo desconocido en MODEL_ROUTES: {name}")
+        for tier in tiers.values():
+            if tier.fallback is not None and tier.fallback not in tiers:
+                raise ValueError(f"Nivel de respaldo desconocido en MODEL_ROUTES: {tier.fallback} ({tier.name})")
+        self.tiers = tiers
+        self.routes = routes
+        self.default = default
+        self.uses_duration = any(route.uses_duration for route in routes)
+
+    @classmethod
+    def single(cls, model: str) -> "RoutingTable":
+        """Un solo nivel con el modelo indicado, sin respaldo (el comportamiento sin MODEL_ROUTES)."""
+        return cls({"default": ModelTier("default", model)}, [], "default")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RoutingTable":
+        tiers = {name: ModelTier(name, **options) for name, options in data["tiers"].items()}
+        routes = [Route(**rule) for rule in data.get("routes", [])]
+        default = data.get("default") or next(iter(tiers))
+        return cls(tiers, routes, default)
+
+    def chain(self, name: str) -> List[ModelTier]:
+        """El nivel y sus respaldos, en orden y sin repetir."""
+        chain = []
+        while name is not None and all(tier.name != name for tier in chain):
+            tier = self.tiers[name]
+            chain.append(tier)
+            name = tier.fallback
+        return chain
+
+    def select(self, media_type: str, size: int, seconds: Optional[float] = None) -> List[ModelTier]:
+        """Cadena de niveles para una media (el primero es el elegido)."""
+        for route in self.routes:
+            if route.matches(media_type, size, seconds):
+                return self.chain(route.tier)
+        return self.chain(self.default)
+
+    def fingerprint(self) -> str:
+        """Identifica la tabla en la clave de la caché de media (cambia si cambian los modelos o sus topes)."""
+        if len(self.tiers) == 1:
+            tier = next(iter(self.tiers.values()))
+            if tier.max_output_tokens is None:
+                return tier.model
+        models = ",".join(
+            f"{name}={tier.model}:{tier.max_output_tokens}" for name, tier in sorted(self.tiers.items())
+        )
+        return "routes:" + hashlib.sha256(models.encode()).hexdigest()[:16]
+
+
+def load_routing_table(value: str, default_model: str) -> RoutingTable:
+    """Tabla desde JSON en línea o desde la ruta de un archivo JSON; vacío = un solo modelo."""
+    value = value.strip()
+    if not value:
+        return RoutingTable.single(default_model)
+    if not value.startswith("{"):
+        with open(os.path.expanduser(value), encoding="utf-8") as file:
+            value = file.read()
+    try:
+        table = RoutingTable.from_dict(json.loads(value))
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"MODEL_ROUTES inválido: {type(e).__name__} - {str(e)}") from e
+    logger.info(
+        "Ruteo de modelos: %s (por defecto %s, %d reglas)",
+        ", ".join(f"{tier.name}={tier.model}" for tier in table.tiers.values()), table.default, len(table.routes),
+    )
+    return table
+
+
+model_routes = load_routing_table(env.MODEL_ROUTES, env.VERTEX_AI_MODEL)
@@ -0,0 +1,351 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+OUTBOUND_QUEUE_DEPTH = registry.gauge(
+    "waha_gateway_outbound_queue_depth",
+    "Mensajes esperando para enviarse por sesión de WAHA y carril (answer, notice)",
+    ("session", "lane"),
+)
+OUTBOUND_SEND_LATENCY = registry.histogram(
+    "waha_gateway_outbound_send_seconds",
+    "Tiempo desde que un mensaje se encola hasta que WAHA confirma el envío",
+    ("lane",),
+)
+OUTBOUND_THROTTLED = registry.counter(
+    "waha_gateway_outbound_throttled_total",
+    "Veces que un envío esperó por el límite de mensajes por segundo de la sesión",
+    ("session",),
+)
+OUTBOUND_MESSAGES = registry.counter(
+    "waha_gateway_outbound_messages_total",
+    "Mensajes de salida por carril y resultado (sent, merged, waited, queue_full, evicted, expired, failed, discarded)",
+    ("lane", "outcome"),
+)
+
+# Carriles en orden de prioridad: respuestas del chatbot antes que avisos de error
+LANES = ("answer", "notice")
+
+# Separador entre los mensajes unidos en un solo envío
+MERGE_SEPARATOR = "\n\n"
+
+Deliver = Callable[[str, str, str, Dict[str, str]], Awaitable[Any]]
+
+
+class _Outgoing:
+    __slots__ = ("chat_id", "text", "headers", "future", "merge", "enqueued_at")
+
+    def __init__(self, chat_id: str, text: str, headers: Dict[str, str], future: asyncio.Future, merge: bool = True):
+        self.chat_id = chat_id
+        self.text = text
+        self.headers = headers
+        self.future = future
+        self.merge = merge
+        self.enqueued_at = time.monotonic()
+
+
+class _Session:
+    """Cola y token bucket de una sesión de WAHA (un número de WhatsApp)."""
+
+    def __init__(self, burst: float):
+        self.lanes: Dict[str, Deque[_Outgoing]] = {lane: deque() for lane in LANES}
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        # Envíos en curso y chats que tienen uno (un chat no recibe dos envíos a la vez)
+        self.in_flight: Set[asyncio.Task] = set()
+        self.busy_chats: Set[str] = set()
+        # Respuestas que esperan lugar con la cola llena (contrapresión), en orden de llegada
+        self.waiting: Deque[_Outgoing] = deque()
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.lanes.values())
+
+
+class OutboundScheduler:
+    """
+    Cola de salida de sendText por sesión de WAHA. Cada sesión envía como
+    mucho `rate` mensajes por segundo (token bucket con ráfagas de `burst`);
+    el límite solo regula el inicio de cada envío, que corre en su propia
+    tarea, con hasta `max_in_flight` envíos en curso por sesión. Los mensajes
+    a un mismo chat salen en orden, de a uno: un chat con un envío en curso
+    espera a que termine. Las respuestas salen antes que los avisos de error.
+    Los mensajes seguidos a un mismo chat que se encolan dentro de
+    `merge_window` segundos se unen en un solo mensaje, salvo los encolados
+    con `merge=False` (p. ej. los segmentos de una respuesta en streaming).
+
+    La cola de cada sesión tiene como mucho `max_queue` mensajes. Las
+    respuestas del chatbot nunca se descartan: con la cola llena desplazan al
+    aviso más reciente y, si no hay avisos, esperan lugar (quien llama a
+    `send` espera). Los avisos se descartan con la cola llena o si esperaron
+    más de `max_delay` segundos; entonces `send` retorna None, igual que un
+    envío fallido, y el descarte queda en el log.
+
+    Args:
+        deliver: Envía un texto: (sesión, chatId, texto, cabeceras) -> respuesta de WAHA
+        rate: Mensajes por segundo por sesión
+        burst: Mensajes que se pueden enviar seguidos antes de aplicar el límite
+        merge_window: Espera antes de enviar un mensaje para unir los que lleguen detrás
+        max_queue: Mensajes encolados por sesión
+        max_delay: Espera máxima de un aviso en la cola, en segundos
+        max_merge_chars: Largo máximo de un mensaje unido
+        max_in_flight: Envíos en curso a la vez por sesión
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        rate: float,
+        burst: int,
+        merge_window: float,
+        max_queue: int,
+        max_delay: float,
+        max_merge_chars: int = 4096,
+        max_in_flight: int = 4,
+    ):
+        self._deliver = deliver
+        self.rate = rate
+        self.burst = float(max(burst, 1))
+        self.merge_window = merge_window
+        self.max_queue = max(max_queue, 1)
+        self.max_delay = max_delay
+        self.max_merge_chars = max_merge_chars
+        self.max_in_flight = max(max_in_flight, 1)
+        self._sessions: Dict[str, _Session] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return sum(len(session) + len(session.waiting) for session in self._sessions.values())
+
+    async def send(
+        self,
+        session: str,
+        chat_id: str,
+        text: str,
+        lane: str = "answer",
+        headers: Dict[str, str] = None,
+        merge: bool = True,
+    ):
+        """Encola un mensaje y espera a que se envíe; retorna la respuesta de WAHA o None."""
+        return await self.submit(session, chat_id, text, lane, headers, merge)
+
+    def submit(
+        self,
+        session: str,
+        chat_id: str,
+        text: str,
+        lane: str = "answer",
+        headers: Dict[str, str] = None,
+        merge: bool = True,
+    ) -> asyncio.Future:
+        """
+        Encola un mensaje sin esperar; el orden de llamada es el orden de envío
+        dentro del carril. Con `merge=False` el mensaje sale solo: no se une a
+        otros ni otros se le unen, y no espera la ventana de unión.
+        """
+        future = asyncio.get_running_loop().create_future()
+        state = self._sessions.get(session)
+        if state is None:
+            state = self._sessions[session] = _Session(self.burst)
+        item = _Outgoing(chat_id, text, headers or {}, future, merge)
+        if lane == "answer" and (state.waiting or len(state) >= self.max_queue and not self._evict_notice(session, state)):
+            # La respuesta no se descarta: espera lugar detrás de las que ya esperaban
+            OUTBOUND_MESSAGES.inc(lane=lane, outcome="waited")
+            logger.warning(f"Cola de salida de la sesión {session} llena, la respuesta a {chat_id} espera lugar")
+            state.waiting.append(item)
+            return future
+        if len(state) >= self.max_queue:
+            OUTBOUND_MESSAGES.inc(lane=lane, outcome="queue_full")
+            logger.warning(f"Cola de salida de la sesión {session} llena, se descarta un aviso a {chat_id}")
+            future.set_result(None)
+            return future
+        self._enqueue(session, state, lane, item)
+        return future
+
+    def _enqueue(self, session: str, state: _Session, lane: str, item: _Outgoing):
+        state.lanes[lane].append(item)
+        OUTBOUND_QUEUE_DEPTH.set(len(state.lanes[lane]), session=session, lane=lane)
+        state.wakeup.set()
+        if state.task is None:
+            # Contexto vacío: el despachador vive más que el webhook que lo creó (plazo, id de traza)
+            state.task = contextvars.Context().run(asyncio.create_task, self._dispatch(session, state))
+            self._tasks.add(state.task)
+            state.task.add_done_callback(self._tasks.discard)
+
+    def _admit_waiting(self, session: str, state: _Session):
+        """Pasa a la cola las respuestas que esperaban lugar, en orden de llegada."""
+        while state.waiting and len(state) < self.max_queue:
+            item = state.waiting.popleft()
+            # La ventana de unión se cuenta desde que entra a la cola
+            item.enqueued_at = time.monotonic()
+            self._enqueue(session, state, "answer", item)
+
+    def _evict_notice(self, session: str, state: _Session) -> bool:
+        notices = state.lanes["notice"]
+        if not notices:
+            return False
+        item = notices.pop()
+        OUTBOUND_MESSAGES.inc(lane="notice", outcome="evicted")
+        logger.warning(f"Cola de salida de la sesión {session} llena, se descarta un aviso a {item.chat_id}")
+        OUTBOUND_QUEUE_DEPTH.set(len(notices), session=session, lane="notice")
+        if not item.future.done():
+            item.future.set_result(None)
+        return True
+
+    def _refill(self, state: _Session, now: float):
+        state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+        state.refilled_at = now
+
+    def _next_ready(self, state: _Session, now: float):
+        """
+        El carril y el primer mensaje listo para enviar de un chat sin envío en
+        curso, o el tiempo hasta que lo haya (None: esperar a que termine un envío).
+        """
+        wait = None
+        for lane in LANES:
+            for item in state.lanes[lane]:
+                if item.chat_id in state.busy_chats:
+                    continue
+                ready_in = item.enqueued_at + self.merge_window - now if item.merge else 0.0
+                if ready_in <= 0:
+                    return lane, item, 0.0
+                # La cola está en orden de llegada: los siguientes tampoco están listos
+                wait = ready_in if wait is None else min(wait, ready_in)
+                break
+        return None, None, wait
+
+    def _take_merged(self, session: str, state: _Session, lane: str, head: _Outgoing) -> List[_Outgoing]:
+        """Saca el mensaje del carril y los siguientes al mismo chat dentro de la ventana."""
+        queue = state.lanes[lane]
+        batch, length = [head], len(head.text)
+        limit = head.enqueued_at + self.merge_window
+        following = False
+        for item in list(queue):
+            if item is head:
+                following = True
+                queue.remove(head)
+                continue
+            if not following:
+                continue
+            # Sin ventana (0) no se une nada, aunque dos mensajes compartan el instante
+            if not head.merge or self.merge_window <= 0 or item.enqueued_at > limit:
+                break
+            if item.chat_id != head.chat_id:
+                continue
+            if not item.merge:
+                # Los siguientes del chat van después de este, que sale solo
+                break
+            if length + len(MERGE_SEPARATOR) + len(item.text) > self.max_merge_chars:
+                break
+            queue.remove(item)
+            batch.append(item)
+            length += len(MERGE_SEPARATOR) + len(item.text)
+        OUTBOUND_QUEUE_DEPTH.set(len(queue), session=session, lane=lane)
+        return batch
+
+    async def _dispatch(self, session: str, state: _Session):
+        throttled = False
+        while len(state) or state.in_flight:
+            state.wakeup.clear()
+            now = time.monotonic()
+            lane, head, wait = (None, None, None)
+            if len(state.in_flight) < self.max_in_flight:
+                lane, head, wait = self._next_ready(state, now)
+            if lane is None:
+                # Sin cupo, ventana de unión abierta o chats con envío en curso: se espera a que
+                # venza la ventana, llegue un mensaje nuevo o termine un envío
+                try:
+                    await asyncio.wait_for(state.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._refill(state, now)
+            if state.tokens < 1:
+                if not throttled:
+                    OUTBOUND_THROTTLED.inc(session=session)
+                    throttled = True
+                await asyncio.sleep((1 - state.tokens) / self.rate)
+                continue
+            throttled = False
+            state.tokens -= 1
+            self._start_send(session, state, lane, self._take_merged(session, state, lane, head))
+            self._admit_waiting(session, state)
+        self._sessions.pop(session, None)
+
+    def _start_send(self, session: str, state: _Session, lane: str, batch: List[_Outgoing]):
+        chat_id = batch[0].chat_id
+        task = asyncio.create_task(self._send_batch(session, lane, batch))
+        state.busy_chats.add(chat_id)
+        state.in_flight.add(task)
+        self._tasks.add(task)
+
+        def finished(task: asyncio.Task):
+            state.in_flight.discard(task)
+            state.busy_chats.discard(chat_id)
+            self._tasks.discard(task)
+            state.wakeup.set()
+
+        task.add_done_callback(finished)
+
+    async def _send_batch(self, session: str, lane: str, batch: List[_Outgoing]):
+        now = time.monotonic()
+        fresh = []
+        for item in batch:
+            # Solo los avisos vencen: una respuesta del chatbot se envía aunque llegue tarde
+            if lane == "notice" and self.max_delay and now - item.enqueued_at > self.max_delay:
+                OUTBOUND_MESSAGES.inc(lane=lane, outcome="expired")
+                logger.warning(f"Aviso a {item.chat_id} ({session}) descartado tras {now - item.enqueued_at:.0f}s en cola")
+                item.future.set_result(None)
+            else:
+                fresh.append(item)
+        if not fresh:
+            return
+        head = fresh[0]
+        text = MERGE_SEPARATOR.join(item.text for item in fresh)
+        try:
+            response = await self._deliver(session, head.chat_id, text, head.headers)
+        except asyncio.CancelledError:
+            # Cancelado al apagar: quien espera el envío recibe None, como un envío fallido
+            for item in fresh:
+                if not item.future.done():
+                    item.future.set_result(None)
+            raise
+        except Exception as e:
+            logger.error(f"Error al enviar a {head.chat_id} ({session}): {str(e)} - Tipo: {type(e).__name__}")
+            response = None
+        finished = time.monotonic()
+        OUTBOUND_MESSAGES.inc(lane=lane, outcome="sent" if response is not None else "failed")
+        if len(fresh) > 1:
+            OUTBOUND_MESSAGES.inc(len(fresh) - 1, lane=lane, outcome="merged")
+        for item in fresh:
+            OUTBOUND_SEND_LATENCY.observe(finished - item.enqueued_at, lane=lane)
+            if not item.future.done():
+                item.future.set_result(response)
+
+    async def drain(self, timeout: float) -> None:
+        """Espera a que se envíe lo encolado y lo que está en curso (al apagar); lo que quede se descarta."""
+        if self._tasks:
+            # Los despachadores terminan después de sus envíos en curso; se esperan ambos
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            if pending:
+                logger.warning(f"Cola de salida: {len(self)} mensajes sin enviar al apagar")
+                # También los envíos en curso; al cancelarse resuelven sus mensajes con None
+                pending = set(self._tasks)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        for name, session in self._sessions.items():
+            for lane, queue in [*session.lanes.items(), ("answer", session.waiting)]:
+                for item in queue:
+                    if not item.future.done():
+                        OUTBOUND_MESSAGES.inc(lane=lane, outcome="discarded")
+                        logger.warning(f"Mensaje ({lane}) a {item.chat_id} ({name}) sin enviar al apagar")
+                        item.future.set_result(None)
+                queue.clear()
+        self._sessions.clear()
@@ -0,0 +1,96 @@
+import os
+from src.utils.environment import (
+    GOOGLE_APPLICATION_CREDENTIALS,
+    GCP_PROJECT_ID,
+    GCP_LOCATION,
+    VERTEX_HEDGE_ENABLED,
+    VERTEX_HEDGE_LOCATIONS,
+)
+from src.utils.logger import logger
+
+
+# google.genai tarda ~0.5 s en importarse: se importa al primer uso (o en el warm-up)
+# para que el arranque y los mensajes de texto no paguen ese costo
+_safety_settings = None
+
+# Cliente de Vertex AI compartido por todos los procesadores (se inicializa una sola vez)
+_vertex_client = None
+
+# Clientes de otras regiones para las solicitudes duplicadas (VERTEX_HEDGE_LOCATIONS)
+_regional_clients = {}
+
+
+def genai_types():
+    """Módulo `google.genai.types` (se importa la primera vez que se usa)."""
+    from google.genai import types
+    return types
+
+
+def get_safety_settings() -> list:
+    """Filtros de seguridad desactivados: el contenido son documentos y notas de voz de clientes."""
+    global _safety_settings
+    if _safety_settings is None:
+        types = genai_types()
+        _safety_settings = [
+            types.SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
+            types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
+        ]
+    return _safety_settings
+
+
+def _configure_credentials():
+    # Configurar la variable de entorno para las credenciales solo si existe el archivo y la variable está configurada
+    if GOOGLE_APPLICATION_CREDENTIALS and os.path.exists(GOOGLE_APPLICATION_CREDENTIALS):
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
+        logger.info(f"Credenciales de GCP configuradas desde archivo: {GOOGLE_APPLICATION_CREDENTIALS}")
+    else:
+        logger.info("Usando credenciales predeterminadas de la aplicación (Application Default Credentials)")
+
+
+def get_vertex_client(location: str = None):
+    """
+    Obtiene o crea una instancia del cliente de Vertex AI.
+    Configura las credenciales de Google Cloud automáticamente.
+    En Cloud Run, usa las credenciales predeterminadas de la aplicación.
+
+    Args:
+        location: Región del cliente (por defecto GCP_LOCATION)
+    """
+    global _vertex_client
+    if location and location != GCP_LOCATION:
+        client = _regional_clients.get(location)
+        if client is None:
+            from google import genai
+            get_vertex_client()
+            client = _regional_clients[location] = genai.Client(
+                vertexai=True,
+                project=GCP_PROJECT_ID,
+                location=location,
+            )
+            logger.info(f"Cliente de Vertex AI inicializado - Proyecto: {GCP_PROJECT_ID}, Región: {location}")
+        return client
+    if _vertex_client is None:
+        from google import genai
+        _configure_credentials()
+        _vertex_client = genai.Client(
+            vertexai=True,
+            project=GCP_PROJECT_ID,
+            location=GCP_LOCATION,
+        )
+        logger.info(f"Cliente de Vertex AI inicializado - Proyecto: {GCP_PROJECT_ID}, Región: {GCP_LOCATION}")
+    return _vertex_client
+
+
+def get_hedge_clients():
+    """
+    Clientes para las solicitudes duplicadas, en orden (VERTEX_HEDGE_LOCATIONS).
+    Sin regiones configuradas el duplicado va a la misma región.
+    """
+    if not VERTEX_HEDGE_ENABLED:
+        return []
+    locations = [location.strip() for location in VERTEX_HEDGE_LOCATIONS.split(",") if location.strip()]
+    if not locations:
+        return [get_vertex_client()]
+    return [get_vertex_client(location) for location in locations]
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from typing import Optional
+import src.utils.environment as env
+from src.services.http_clients import get_http_client
+from src.services.image_preprocess import start_preprocess_pool
+from src.services.media_pipeline import prepare_processors
+from src.services.model_routing import model_routes
+from src.services.vertex_client import get_vertex_client, get_hedge_clients
+from src.utils.logger import logger
+from src.utils.metrics import registry
+from src.utils.startup import STARTUP_SECONDS
+
+
+WARMUP_STEPS = registry.counter(
+    "waha_gateway_warmup_steps_total",
+    "Pasos del warm-up por resultado (ok, error)",
+    ("step", "outcome"),
+)
+
+# URL base de cada upstream HTTP cuyas conexiones se abren por adelantado
+_UPSTREAM_URLS = {
+    "waha": lambda: env.WAHA_API_URL,
+    "chatbot": lambda: env.CHATBOT_API_URL,
+}
+
+
+def _build_vertex_clients():
+    # Importa google.genai y resuelve la configuración de credenciales (lo lento, en un hilo)
+    get_vertex_client()
+    get_hedge_clients()
+
+
+def _routed_models():
+    # Cada modelo distinto de la tabla de ruteo (sin MODEL_ROUTES, solo VERTEX_AI_MODEL)
+    return list(dict.fromkeys(tier.model for tier in model_routes.tiers.values()))
+
+
+async def _ping_vertex(model: str):
+    # Metadatos del modelo: no genera tokens, pero obtiene el token de acceso y abre la conexión TLS
+    await get_vertex_client().aio.models.get(model=model)
+
+
+async def _open_connections(upstream: str):
+    # Cualquier respuesta sirve (incluso 404): la conexión queda en el pool para el primer webhook
+    client = get_http_client(upstream)
+    url = _UPSTREAM_URLS[upstream]()
+    await asyncio.gather(*(client.head(url) for _ in range(max(env.WARMUP_CONNECTIONS, 1))))
+
+
+async def _step(name: str, coroutine):
+    start = time.perf_counter()
+    try:
+        await coroutine
+    except Exception as e:
+        WARMUP_STEPS.inc(step=name, outcome="error")
+        logger.warning(f"Warm-up: {name} falló: {str(e)} - Tipo: {type(e).__name__}")
+        return
+    WARMUP_STEPS.inc(step=name, outcome="ok")
+    logger.info("Warm-up: %s listo en %.0f ms", name, (time.perf_counter() - start) * 1000)
+
+
+class WarmUp:
+    """
+    Prepara en segundo plano lo que pagaría el primer webhook después de un
+    arranque en frío: el cliente de Vertex AI (import de google.genai y
+    credenciales), la primera conexión TLS a cada upstream y los procesos del
+    pool de preprocesamiento. Los pasos son independientes y corren en
+    paralelo; un paso que falla se registra y no bloquea al resto.
+
+    `ready` indica si la instancia puede recibir tráfico: siempre con el
+    warm-up desactivado, y con el warm-up activo cuando terminó (con o sin
+    errores) o venció WARMUP_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._done = not env.WARMUP_ENABLED
+
+    @property
+    def ready(self) -> bool:
+        return self._done
+
+    def start(self):
+        """Lanza el warm-up (se llama desde el lifespan, sin esperarlo)."""
+        if not env.WARMUP_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._steps(), timeout=env.WARMUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warm-up incompleto tras {env.WARMUP_TIMEOUT} s, la instancia queda lista igual")
+        finally:
+            elapsed = time.perf_counter() - start
+            STARTUP_SECONDS.set(elapsed, phase="warmup")
+            self._done = True
+        logger.info("Warm-up terminado en %.0f ms", elapsed * 1000)
+
+    async def _steps(self):
+        async def vertex():
+            await asyncio.to_thread(_build_vertex_clients)
+            # Los procesadores guardan su prompt y configuración en cachés que también usan
+            # los webhooks: se arman en el event loop (google.genai ya quedó importado)
+            prepare_processors()
+            if env.WARMUP_VERTEX_PING:
+                # Un paso por modelo: uno que falla (p. ej. sin acceso) no oculta a los demás
+                await asyncio.gather(*(_step(f"vertex_ping:{model}", _ping_vertex(model)) for model in _routed_models()))
+
+        await asyncio.gather(
+            _step("vertex", vertex()),
+            *(_step(f"{upstream}_connections", _open_connections(upstream)) for upstream in _UPSTREAM_URLS),
+            _step("preprocess_pool", start_preprocess_pool()),
+        )
+
+    async def stop(self):
+        """Cancela el warm-up si sigue en curso al apagar."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+warm_up = WarmUp()
@@ -0,0 +1,155 @@
+import json
+from typing import Any, FrozenSet, Optional
+import src.utils.environment as env
+from src.utils.metrics import registry
+from src.utils.instrumentation import stage
+
+# orjson es opcional: decodifica varias veces más rápido que json
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:  # pragma: no cover - depende de la instalación
+    loads = json.loads
+
+
+WEBHOOK_EVENTS = registry.counter(
+    "waha_gateway_webhook_events_total",
+    "Webhooks recibidos por resultado: processed, o el motivo del descarte "
+    "(event_type, from_me, group, broadcast, session, invalid)",
+    ("outcome",),
+)
+
+
+def _csv(value: str) -> FrozenSet[str]:
+    return frozenset(item.strip() for item in value.split(",") if item.strip())
+
+
+class WebhookFilter:
+    """
+    Descarta los webhooks que no se responden mirando solo el JSON decodificado,
+    antes de validarlo con Pydantic: tipos de evento no suscritos (acks,
+    estados de sesión), ecos de nuestros propios mensajes (fromMe), grupos,
+    difusiones de estados y sesiones no atendidas.
+
+    Args:
+        events: Tipos de evento que se procesan (vacío = todos)
+        ignore_from_me: Descartar los mensajes enviados por la propia cuenta
+        ignore_groups: Descartar los mensajes de grupos (chatId "@g.us")
+        ignore_broadcasts: Descartar estados y listas de difusión ("@broadcast")
+        sessions: Sesiones de WAHA que se atienden (vacío = todas)
+    """
+
+    def __init__(
+        self,
+        events: FrozenSet[str],
+        ignore_from_me: bool = True,
+        ignore_groups: bool = False,
+        ignore_broadcasts: bool = True,
+        sessions: FrozenSet[str] = frozenset(),
+    ):
+        self.events = events
+        self.ignore_from_me = ignore_from_me
+        self.ignore_groups = ignore_groups
+        self.ignore_broadcasts = ignore_broadcasts
+        self.sessions = sessions
+
+    def drop_reason(self, event: Any) -> Optional[str]:
+        """Motivo por el que se descarta el webhook, o None si hay que procesarlo."""
+        if not isinstance(event, dict):
+            return None
+        if self.events and event.get("event") not in self.events:
+            return "event_type"
+        if self.sessions and event.get("session") not in self.sessions:
+            return "session"
+        payload = event.get("payload")
+        if not isinstance(payload, dict):
+            return None
+        if self.ignore_from_me and payload.get("fromMe") is True:
+            return "from_me"
+        sender = payload.get("from")
+        if isinstance(sender, str):
+            if self.ignore_groups and sender.endswith("@g.us"):
+                return "group"
+            if self.ignore_broadcasts and sender.endswith("@broadcast"):
+                return "broadcast"
+        return None
+
+
+class WebhookFilterMiddleware:
+    """
+    Middleware ASGI delante del endpoint del webhook: decodifica el cuerpo,
+    responde 200 de inmediato a los eventos descartados (sin pasar por el
+    ruteo, las dependencias ni Pydantic) y deja el JSON decodificado en
+    `request.state.webhook_event` para que el endpoint no lo decodifique de
+    nuevo. Un cuerpo que no es JSON sigue hasta el endpoint, que responde 422.
+    """
+
+    def __init__(self, app, path: str, webhook_filter: "WebhookFilter"):
+        self.app = app
+        self.path = path
+        self.filter = webhook_filter
+        self._responses = {}
+
+    def _response(self, reason: str) -> bytes:
+        body = self._responses.get(reason)
+        if body is None:
+            body = self._responses[reason] = json.dumps(
+                {"status": "ignored", "message": f"Event filtered: {reason}"}
+            ).encode()
+        return body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # El cliente se desconectó antes de terminar de enviar el cuerpo
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        with stage("filter"):
+            try:
+                event = loads(body)
+            except ValueError:
+                event = None
+            reason = self.filter.drop_reason(event) if event is not None else None
+
+        if reason is not None:
+            WEBHOOK_EVENTS.inc(outcome=reason)
+            response = self._response(reason)
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(response)).encode())],
+            })
+            await send({"type": "http.response.body", "body": response})
+            return
+
+        if event is not None:
+            scope.setdefault("state", {})["webhook_event"] = event
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay, send)
+
+
+webhook_filter = WebhookFilter(
+    events=_csv(env.WEBHOOK_EVENTS),
+    ignore_from_me=env.WEBHOOK_IGNORE_FROM_ME,
+    ignore_groups=env.WEBHOOK_IGNORE_GROUPS,
+    ignore_broadcasts=env.WEBHOOK_IGNORE_BROADCASTS,
+    sessions=_csv(env.WEBHOOK_SESSIONS),
+)
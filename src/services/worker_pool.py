@@ -0,0 +1,277 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+POOL_QUEUE_DEPTH = registry.gauge(
+    "waha_gateway_worker_queue_depth",
+    "Elementos pendientes en la cola del pool de workers",
+    ("pool",),
+)
+POOL_BUSY_WORKERS = registry.gauge(
+    "waha_gateway_worker_busy",
+    "Workers procesando un elemento",
+    ("pool",),
+)
+POOL_QUEUE_WAIT = registry.histogram(
+    "waha_gateway_worker_queue_wait_seconds",
+    "Tiempo entre el encolado y el inicio del procesamiento",
+    ("pool",),
+)
+POOL_HEAD_OF_LINE_WAIT = registry.histogram(
+    "waha_gateway_worker_head_of_line_wait_seconds",
+    "Tiempo que un elemento esperó detrás de elementos anteriores de la misma clave",
+    ("pool",),
+)
+POOL_PROCESSING = registry.histogram(
+    "waha_gateway_worker_processing_seconds",
+    "Duración del procesamiento de un elemento",
+    ("pool",),
+)
+POOL_KEY_DEPTH = registry.histogram(
+    "waha_gateway_worker_key_queue_length",
+    "Largo de la cola de la clave al encolar un elemento",
+    ("pool",),
+    buckets=(1, 2, 3, 5, 10, 20, 50),
+)
+POOL_ACTIVE_KEYS = registry.gauge(
+    "waha_gateway_worker_active_keys",
+    "Claves con elementos pendientes o en proceso",
+    ("pool",),
+)
+POOL_MAX_KEY_DEPTH = registry.gauge(
+    "waha_gateway_worker_max_key_queue_length",
+    "Largo de la cola más larga entre todas las claves",
+    ("pool",),
+)
+POOL_EVENTS = registry.counter(
+    "waha_gateway_worker_events_total",
+    "Elementos encolados, procesados, fallidos, rechazados o procesados en línea",
+    ("pool", "event"),
+)
+
+BACKPRESSURE_REJECT = "reject"
+BACKPRESSURE_WAIT = "wait"
+BACKPRESSURE_INLINE = "inline"
+
+
+class QueueFullError(Exception):
+    """La cola del pool está llena y la política de contrapresión rechaza el elemento."""
+
+
+class _Entry:
+    __slots__ = ("item", "enqueued_at", "head_at")
+
+    def __init__(self, item: Any, enqueued_at: float):
+        self.item = item
+        self.enqueued_at = enqueued_at
+        # Momento en que el elemento quedó primero en la cola de su clave
+        self.head_at = enqueued_at
+
+
+class WorkerPool:
+    """
+    Pool de workers asíncronos que consume una cola acotada con orden por clave.
+
+    Los elementos con la misma clave se procesan de a uno y en orden de llegada;
+    los de claves distintas se procesan en paralelo (hasta `workers` a la vez).
+    Las claves sin elementos pendientes se eliminan, así la memoria depende solo
+    de los elementos en cola y no de cuántas claves se hayan visto.
+
+    La política de contrapresión define qué pasa con la cola llena:
+    - "reject": se lanza QueueFullError de inmediato
+    - "wait": se espera hasta `enqueue_timeout` segundos por espacio y luego se rechaza
+    - "inline": el elemento se procesa en la misma corrutina que lo envía
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[Any]],
+        workers: int,
+        queue_size: int,
+        backpressure: str = BACKPRESSURE_REJECT,
+        enqueue_timeout: float = 1.0,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.enqueue_timeout = enqueue_timeout
+        self._pending: Dict[Hashable, Deque[_Entry]] = {}
+        self._active: Set[Hashable] = set()
+        self._size = 0
+        self._ready: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        registry.register_collector(self._collect)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    async def start(self):
+        """Crea las estructuras de la cola y lanza los workers (dentro del event loop)."""
+        if self.running:
+            return
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.queue_size)
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(
+            f"Pool '{self.name}' iniciado - Workers: {self.workers}, "
+            f"Cola: {self.queue_size}, Contrapresión: {self.backpressure}"
+        )
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Espera a que se vacíe la cola (hasta `drain_timeout`) y detiene los workers."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Pool '{self.name}' detenido con {self._size} elementos pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info(f"Pool '{self.name}' detenido")
+
+    async def submit(self, item: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        Encola un elemento para procesarlo en segundo plano.
+
+        Args:
+            item: Elemento que recibirá el handler
+            key: Clave de orden; None procesa el elemento sin orden respecto a otros
+
+        Returns:
+            bool: True si quedó encolado, False si se procesó en línea por contrapresión
+
+        Raises:
+            QueueFullError: si la cola está llena y la política es "reject" o "wait"
+        """
+        if self._slots.locked():
+            if self.backpressure == BACKPRESSURE_INLINE:
+                POOL_EVENTS.inc(pool=self.name, event="inline")
+                await self._process(item)
+                return False
+            if self.backpressure != BACKPRESSURE_WAIT:
+                POOL_EVENTS.inc(pool=self.name, event="rejected")
+                raise QueueFullError(f"Cola '{self.name}' llena ({self.queue_size})")
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                POOL_EVENTS.inc(pool=self.name, event="rejected")
+                raise QueueFullError(
+                    f"Cola '{self.name}' llena tras esperar {self.enqueue_timeout}s"
+                )
+        else:
+            await self._slots.acquire()
+
+        if key is None:
+            key = object()
+        entries = self._pending.get(key)
+        if entries is None:
+            entries = self._pending[key] = deque()
+        entries.append(_Entry(item, time.perf_counter()))
+        self._size += 1
+        self._drained.clear()
+        # Una clave se agenda solo cuando pasa a tener trabajo y nadie la procesa
+        if len(entries) == 1 and key not in self._active:
+            self._ready.put_nowait(key)
+
+        POOL_EVENTS.inc(pool=self.name, event="enqueued")
+        POOL_KEY_DEPTH.observe(len(entries), pool=self.name)
+        return True
+
+    async def _process(self, item: Any):
+        POOL_BUSY_WORKERS.inc(pool=self.name)
+        try:
+            with POOL_PROCESSING.time(pool=self.name):
+                await self.handler(item)
+            POOL_EVENTS.inc(pool=self.name, event="processed")
+        except Exception as e:
+            POOL_EVENTS.inc(pool=self.name, event="failed")
+            logger.error(
+                f"Error en el pool '{self.name}': {str(e)} - Tipo: {type(e).__name__}",
+                exc_info=True,
+            )
+        finally:
+            POOL_BUSY_WORKERS.dec(pool=self.name)
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            entries = self._pending[key]
+            entry = entries.popleft()
+            self._active.add(key)
+            started_at = time.perf_counter()
+            POOL_QUEUE_WAIT.observe(started_at - entry.enqueued_at, pool=self.name)
+            POOL_HEAD_OF_LINE_WAIT.observe(entry.head_at - entry.enqueued_at, pool=self.name)
+            try:
+                await self._process(entry.item)
+            finally:
+                self._active.discard(key)
+                self._size -= 1
+                self._slots.release()
+                if entries:
+                    # La clave vuelve al final de la fila: reparto equitativo entre chats
+                    entries[0].head_at = time.perf_counter()
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                if self._size == 0:
+                    self._drained.set()
+
+    def _collect(self):
+        POOL_QUEUE_DEPTH.set(self._size - len(self._active), pool=self.name)
+        POOL_ACTIVE_KEYS.set(len(self._pending), pool=self.name)
+        POOL_MAX_KEY_DEPTH.set(
+            max((len(entries) for entries in list(self._pending.values())), default=0),
+            pool=self.name,
+        )
+
+
+class KeyedLocks:
+    """
+    Locks por clave para serializar el procesamiento en línea de un mismo chat.
+    asyncio.Lock atiende a los que esperan en orden de llegada; el lock de una
+    clave se elimina cuando nadie lo usa.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if self._users[key] == 0:
+                del self._users[key]
+                del self._locks[key]
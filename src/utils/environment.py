@@ -2,9 +2,19 @@ from decouple import config
 
 # Configuracion de la aplicacion
 LOG_LEVEL = config("LOG_LEVEL", default="INFO")
-# ASSISTANT = config("ASSISTANT", default="84ae4421-0102-4ccc-9f17-5b9b12600324")
-# ASSISTANT_NAME = config("ASSISTANT_NAME", default="Bot Test")
-CHATBOT_API_URL = config("CHATBOT_API_URL", default="http://localhost:8090/v1/llm/question")
+# Escritura de logs en un hilo aparte, en lotes y con buffer acotado
+LOG_ASYNC = config("LOG_ASYNC", default=True, cast=bool)
+LOG_QUEUE_SIZE = config("LOG_QUEUE_SIZE", default=10000, cast=int)
+LOG_BATCH_SIZE = config("LOG_BATCH_SIZE", default=256, cast=int)
+# Largo maximo de un mensaje y de los payloads grandes (requests, transcripciones); 0 = sin limite
+LOG_MAX_MESSAGE_CHARS = config("LOG_MAX_MESSAGE_CHARS", default=8000, cast=int)
+LOG_PAYLOAD_MAX_CHARS = config("LOG_PAYLOAD_MAX_CHARS", default=500, cast=int)
+# Fraccion de los logs de alto volumen (un registro por mensaje) que se emite
+LOG_SAMPLE_RATE = config("LOG_SAMPLE_RATE", default=1.0, cast=float)
+ASSISTANT = config("ASSISTANT", default="84ae4421-0102-4ccc-9f17-5b9b12600324")
+ASSISTANT_NAME = config("ASSISTANT_NAME", default="Bot Test")
+CHATBOT_API_URL = config("CHATBOT_API_URL", default="http://localhost:8080")
+CHATBOT_QUESTION_PATH = config("CHATBOT_QUESTION_PATH", default="/v1/llm/question")
 WAHA_API_URL = config("WAHA_API_URL", default="https://waha-197831323053.us-central1.run.app")
 WAHA_API_KEY = config("WAHA_API_KEY", default="d74e39d8e82248e6bac96e853d095fc8")
 
@@ -12,4 +22,186 @@ WAHA_API_KEY = config("WAHA_API_KEY", default="d74e39d8e82248e6bac96e853d095fc8"
 GOOGLE_APPLICATION_CREDENTIALS = config("GOOGLE_APPLICATION_CREDENTIALS", default="gcp-credentials.json")
 GCP_PROJECT_ID = config("GCP_PROJECT_ID", default="is-geniaton-ifs-2025-g3")
 GCP_LOCATION = config("GCP_LOCATION", default="us-central1")
-VERTEX_AI_MODEL = config("VERTEX_AI_MODEL", default="gemini-2.0-flash-exp")
\ No newline at end of file
+VERTEX_AI_MODEL = config("VERTEX_AI_MODEL", default="gemini-2.0-flash-exp")
+# Ruteo de la media a distintos modelos segun tipo, tamano y duracion (JSON en linea o ruta a un archivo);
+# vacio = todo con VERTEX_AI_MODEL
+MODEL_ROUTES = config("MODEL_ROUTES", default="")
+
+# Configuracion de los pools HTTP compartidos (uno por upstream)
+HTTP_MAX_CONNECTIONS = config("HTTP_MAX_CONNECTIONS", default=100, cast=int)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = config("HTTP_MAX_KEEPALIVE_CONNECTIONS", default=20, cast=int)
+HTTP_KEEPALIVE_EXPIRY = config("HTTP_KEEPALIVE_EXPIRY", default=30.0, cast=float)
+HTTP2_ENABLED = config("HTTP2_ENABLED", default=True, cast=bool)
+HTTP_CONNECT_TIMEOUT = config("HTTP_CONNECT_TIMEOUT", default=5.0, cast=float)
+WAHA_TIMEOUT = config("WAHA_TIMEOUT", default=60.0, cast=float)
+CHATBOT_TIMEOUT = config("CHATBOT_TIMEOUT", default=30.0, cast=float)
+
+# Motor de inferencia (limite de llamadas concurrentes a Vertex AI)
+INFERENCE_MAX_CONCURRENCY = config("INFERENCE_MAX_CONCURRENCY", default=8, cast=int)
+INFERENCE_MAX_QUEUE = config("INFERENCE_MAX_QUEUE", default=32, cast=int)
+INFERENCE_QUEUE_TIMEOUT = config("INFERENCE_QUEUE_TIMEOUT", default=30.0, cast=float)
+
+# Procesamiento de webhooks: "inline" (responde al terminar) o "queue" (responde al encolar)
+WEBHOOK_MODE = config("WEBHOOK_MODE", default="inline")
+WEBHOOK_WORKERS = config("WEBHOOK_WORKERS", default=8, cast=int)
+WEBHOOK_QUEUE_SIZE = config("WEBHOOK_QUEUE_SIZE", default=500, cast=int)
+# Con la cola llena: "reject" (503), "wait" (espera WEBHOOK_ENQUEUE_TIMEOUT) o "inline"
+WEBHOOK_BACKPRESSURE = config("WEBHOOK_BACKPRESSURE", default="reject")
+WEBHOOK_ENQUEUE_TIMEOUT = config("WEBHOOK_ENQUEUE_TIMEOUT", default=1.0, cast=float)
+WEBHOOK_DRAIN_TIMEOUT = config("WEBHOOK_DRAIN_TIMEOUT", default=10.0, cast=float)
+# Filtro previo a la validacion: los webhooks descartados se responden 200 sin procesarse
+WEBHOOK_FILTER_ENABLED = config("WEBHOOK_FILTER_ENABLED", default=True, cast=bool)
+# Tipos de evento que se procesan, separados por coma (vacio = todos)
+WEBHOOK_EVENTS = config("WEBHOOK_EVENTS", default="message")
+WEBHOOK_IGNORE_FROM_ME = config("WEBHOOK_IGNORE_FROM_ME", default=True, cast=bool)
+WEBHOOK_IGNORE_GROUPS = config("WEBHOOK_IGNORE_GROUPS", default=False, cast=bool)
+WEBHOOK_IGNORE_BROADCASTS = config("WEBHOOK_IGNORE_BROADCASTS", default=True, cast=bool)
+# Sesiones de WAHA atendidas, separadas por coma (vacio = todas)
+WEBHOOK_SESSIONS = config("WEBHOOK_SESSIONS", default="")
+
+# Deduplicacion de webhooks por id de mensaje + sesion
+DEDUP_ENABLED = config("DEDUP_ENABLED", default=True, cast=bool)
+# "memory" (LRU local) o "sqlite" (compartido entre procesos de la misma maquina)
+DEDUP_BACKEND = config("DEDUP_BACKEND", default="memory")
+DEDUP_TTL = config("DEDUP_TTL", default=3600.0, cast=float)
+DEDUP_MAX_ENTRIES = config("DEDUP_MAX_ENTRIES", default=10000, cast=int)
+DEDUP_PENDING_TIMEOUT = config("DEDUP_PENDING_TIMEOUT", default=300.0, cast=float)
+DEDUP_SQLITE_PATH = config("DEDUP_SQLITE_PATH", default="/tmp/waha-gateway-dedup.sqlite3")
+
+# Cache de resultados de media (transcripciones y analisis de imagen/PDF)
+MEDIA_CACHE_ENABLED = config("MEDIA_CACHE_ENABLED", default=True, cast=bool)
+MEDIA_CACHE_MAX_BYTES = config("MEDIA_CACHE_MAX_BYTES", default=16 * 1024 * 1024, cast=int)
+MEDIA_CACHE_TTL = config("MEDIA_CACHE_TTL", default=86400.0, cast=float)
+# Directorio del nivel en disco (vacio = solo memoria)
+MEDIA_CACHE_DIR = config("MEDIA_CACHE_DIR", default="")
+MEDIA_CACHE_DISK_MAX_BYTES = config("MEDIA_CACHE_DISK_MAX_BYTES", default=256 * 1024 * 1024, cast=int)
+
+# Descarga de media en streaming
+MEDIA_MAX_BYTES = config("MEDIA_MAX_BYTES", default=20 * 1024 * 1024, cast=int)
+# Por encima de este tamano la descarga se escribe a un archivo temporal
+MEDIA_SPOOL_BYTES = config("MEDIA_SPOOL_BYTES", default=4 * 1024 * 1024, cast=int)
+# Directorio para los archivos desbordados (vacio = directorio temporal del sistema)
+MEDIA_SPOOL_DIR = config("MEDIA_SPOOL_DIR", default="")
+
+# Preprocesamiento de imagenes antes de la inferencia (requiere Pillow)
+IMAGE_PREPROCESS_ENABLED = config("IMAGE_PREPROCESS_ENABLED", default=True, cast=bool)
+IMAGE_MAX_EDGE = config("IMAGE_MAX_EDGE", default=1536, cast=int)
+IMAGE_JPEG_QUALITY = config("IMAGE_JPEG_QUALITY", default=85, cast=int)
+# 0 = un hilo dedicado; N > 0 = pool de N procesos (spawn, ~60 MB cada uno)
+IMAGE_PREPROCESS_WORKERS = config("IMAGE_PREPROCESS_WORKERS", default=0, cast=int)
+# Enviar solo la primera pagina de los PDF como imagen (requiere pypdfium2)
+PDF_RENDER_FIRST_PAGE = config("PDF_RENDER_FIRST_PAGE", default=False, cast=bool)
+
+# Notas de voz largas: se dividen en fragmentos que se transcriben en paralelo
+AUDIO_CHUNKING_ENABLED = config("AUDIO_CHUNKING_ENABLED", default=True, cast=bool)
+# Se divide si el audio supera cualquiera de los dos umbrales
+AUDIO_LONG_MIN_SECONDS = config("AUDIO_LONG_MIN_SECONDS", default=90, cast=float)
+AUDIO_LONG_MIN_BYTES = config("AUDIO_LONG_MIN_BYTES", default=1024 * 1024, cast=int)
+AUDIO_CHUNK_SECONDS = config("AUDIO_CHUNK_SECONDS", default=45, cast=float)
+# Margen alrededor de cada corte para buscar un silencio
+AUDIO_SPLIT_SEARCH_SECONDS = config("AUDIO_SPLIT_SEARCH_SECONDS", default=3, cast=float)
+
+# Extracción del DNI: "text" (texto libre) o "structured" (JSON con esquema validado localmente)
+DNI_EXTRACTION_MODE = config("DNI_EXTRACTION_MODE", default="text")
+DNI_MAX_OUTPUT_TOKENS = config("DNI_MAX_OUTPUT_TOKENS", default=256, cast=int)
+# Invocaciones máximas cuando la respuesta no pasa la validación
+DNI_EXTRACTION_ATTEMPTS = config("DNI_EXTRACTION_ATTEMPTS", default=2, cast=int)
+
+# Agrupación de mensajes seguidos de un mismo chat en una sola consulta al chatbot
+COALESCE_ENABLED = config("COALESCE_ENABLED", default=False, cast=bool)
+# Se despacha tras este silencio (segundos) sin mensajes nuevos del chat...
+COALESCE_QUIET_PERIOD = config("COALESCE_QUIET_PERIOD", default=2.0, cast=float)
+# ...o cuando el primer mensaje lleva este tiempo esperando, o al llegar al máximo de mensajes
+COALESCE_MAX_WAIT = config("COALESCE_MAX_WAIT", default=8.0, cast=float)
+COALESCE_MAX_MESSAGES = config("COALESCE_MAX_MESSAGES", default=10, cast=int)
+
+# Agrupacion de imagenes/PDF seguidos de un chat (anverso y reverso del DNI) en una sola inferencia
+ALBUM_ENABLED = config("ALBUM_ENABLED", default=False, cast=bool)
+# Se analiza tras este silencio (segundos) sin archivos nuevos del chat, al pasar ALBUM_MAX_WAIT o al llegar a ALBUM_MAX_FILES
+ALBUM_WINDOW = config("ALBUM_WINDOW", default=1.5, cast=float)
+ALBUM_MAX_WAIT = config("ALBUM_MAX_WAIT", default=5.0, cast=float)
+ALBUM_MAX_FILES = config("ALBUM_MAX_FILES", default=4, cast=int)
+
+# Log durable de ingesta: el webhook se escribe en disco antes de responder y se reprocesa al iniciar si quedó sin terminar
+INGEST_LOG_ENABLED = config("INGEST_LOG_ENABLED", default=False, cast=bool)
+# Sin ruta el log queda desactivado: debe apuntar a un volumen montado (no a /tmp)
+INGEST_LOG_PATH = config("INGEST_LOG_PATH", default="")
+# normal: sobrevive a la caida del proceso; full: sincroniza a disco en cada commit
+INGEST_LOG_SYNC = config("INGEST_LOG_SYNC", default="normal")
+INGEST_LOG_MAX_BATCH = config("INGEST_LOG_MAX_BATCH", default=500, cast=int)
+INGEST_LOG_COMPACT_INTERVAL = config("INGEST_LOG_COMPACT_INTERVAL", default=60.0, cast=float)
+
+# Respuestas del chatbot en streaming (SSE o chunked), enviadas a WhatsApp por oracion o parrafo
+CHATBOT_STREAMING = config("CHATBOT_STREAMING", default=False, cast=bool)
+# Largo minimo de cada mensaje antes de cortar en un fin de oracion (los parrafos se cortan siempre)
+CHATBOT_STREAM_MIN_CHARS = config("CHATBOT_STREAM_MIN_CHARS", default=120, cast=int)
+
+# Resiliencia de las llamadas salientes (WAHA, Vertex AI, chatbot)
+# Plazo total para procesar un webhook; acota cada intento y cada espera
+WEBHOOK_DEADLINE = config("WEBHOOK_DEADLINE", default=120.0, cast=float)
+BREAKER_FAILURE_THRESHOLD = config("BREAKER_FAILURE_THRESHOLD", default=5, cast=int)
+BREAKER_RESET_TIMEOUT = config("BREAKER_RESET_TIMEOUT", default=30.0, cast=float)
+RETRY_MAX_ATTEMPTS = config("RETRY_MAX_ATTEMPTS", default=3, cast=int)
+RETRY_BASE_DELAY = config("RETRY_BASE_DELAY", default=0.2, cast=float)
+RETRY_MAX_DELAY = config("RETRY_MAX_DELAY", default=2.0, cast=float)
+# Reintentos permitidos por llamada (fraccion) y minimo por segundo
+RETRY_BUDGET_RATIO = config("RETRY_BUDGET_RATIO", default=0.2, cast=float)
+RETRY_BUDGET_MIN_PER_SECOND = config("RETRY_BUDGET_MIN_PER_SECOND", default=1.0, cast=float)
+# Solicitudes duplicadas a Vertex AI cuando la primera tarda
+VERTEX_HEDGE_ENABLED = config("VERTEX_HEDGE_ENABLED", default=False, cast=bool)
+# Regiones para el duplicado (separadas por coma); vacio = misma region (GCP_LOCATION)
+VERTEX_HEDGE_LOCATIONS = config("VERTEX_HEDGE_LOCATIONS", default="")
+# Espera antes de duplicar; 0 = p95 observado de la latencia de inferencia
+VERTEX_HEDGE_DELAY = config("VERTEX_HEDGE_DELAY", default=0.0, cast=float)
+VERTEX_HEDGE_MIN_DELAY = config("VERTEX_HEDGE_MIN_DELAY", default=1.0, cast=float)
+
+# Trazabilidad
+# Cabecera con el id de traza del webhook (se lee de WAHA si viene y se reenvía a WAHA y al chatbot); vacio = desactivado
+TRACE_HEADER = config("TRACE_HEADER", default="")
+
+# Arranque en frio
+# Registra el tiempo de import de cada modulo al iniciar (los STARTUP_PROFILE_TOP mas lentos)
+STARTUP_PROFILE = config("STARTUP_PROFILE", default=False, cast=bool)
+STARTUP_PROFILE_TOP = config("STARTUP_PROFILE_TOP", default=20, cast=int)
+# Prepara el cliente de Vertex AI y abre conexiones en segundo plano; /health responde 503 hasta terminar
+WARMUP_ENABLED = config("WARMUP_ENABLED", default=False, cast=bool)
+WARMUP_TIMEOUT = config("WARMUP_TIMEOUT", default=20.0, cast=float)
+# Conexiones a abrir por upstream (WAHA y chatbot)
+WARMUP_CONNECTIONS = config("WARMUP_CONNECTIONS", default=2, cast=int)
+# Consulta liviana a Vertex AI (metadatos del modelo) para resolver credenciales y abrir la conexion TLS
+WARMUP_VERTEX_PING = config("WARMUP_VERTEX_PING", default=True, cast=bool)
+
+# Control de admision de webhooks (limite adaptativo AIMD, prioridad del texto sobre la media)
+# Desactivado por defecto: con el control activo el gateway puede responder 503 a WAHA
+ADMISSION_ENABLED = config("ADMISSION_ENABLED", default=False, cast=bool)
+ADMISSION_INITIAL_LIMIT = config("ADMISSION_INITIAL_LIMIT", default=20, cast=int)
+ADMISSION_MIN_LIMIT = config("ADMISSION_MIN_LIMIT", default=4, cast=int)
+ADMISSION_MAX_LIMIT = config("ADMISSION_MAX_LIMIT", default=80, cast=int)
+# Un webhook que tarda mas que este multiplo de la latencia habitual reduce el limite
+ADMISSION_LATENCY_TOLERANCE = config("ADMISSION_LATENCY_TOLERANCE", default=2.0, cast=float)
+ADMISSION_DECREASE_FACTOR = config("ADMISSION_DECREASE_FACTOR", default=0.8, cast=float)
+# Fraccion del limite que pueden ocupar los mensajes con media
+ADMISSION_MEDIA_SHARE = config("ADMISSION_MEDIA_SHARE", default=0.5, cast=float)
+ADMISSION_MAX_QUEUE = config("ADMISSION_MAX_QUEUE", default=100, cast=int)
+ADMISSION_QUEUE_TIMEOUT = config("ADMISSION_QUEUE_TIMEOUT", default=10.0, cast=float)
+# Senales para descartar media: retraso del event loop (s) y bytes de media en proceso
+ADMISSION_MAX_LOOP_LAG = config("ADMISSION_MAX_LOOP_LAG", default=0.25, cast=float)
+ADMISSION_MAX_MEDIA_BYTES = config("ADMISSION_MAX_MEDIA_BYTES", default=128 * 1024 * 1024, cast=int)
+# Segundos sugeridos a WAHA en Retry-After al rechazar un webhook
+ADMISSION_RETRY_AFTER = config("ADMISSION_RETRY_AFTER", default=5, cast=int)
+
+# Cola de salida de mensajes a WAHA (sendText) por sesion: limite por segundo, prioridad y union de mensajes
+# Desactivada por defecto: la ventana de union demora cada respuesta OUTBOUND_MERGE_WINDOW segundos
+OUTBOUND_ENABLED = config("OUTBOUND_ENABLED", default=False, cast=bool)
+# Mensajes por segundo por sesion y rafaga permitida
+OUTBOUND_RATE = config("OUTBOUND_RATE", default=10.0, cast=float)
+OUTBOUND_BURST = config("OUTBOUND_BURST", default=20, cast=int)
+# Envios en curso a la vez por sesion (a chats distintos; cada chat recibe de a uno y en orden)
+OUTBOUND_MAX_IN_FLIGHT = config("OUTBOUND_MAX_IN_FLIGHT", default=4, cast=int)
+# Espera (s) antes de enviar para unir los mensajes seguidos al mismo chat; 0 = no se une
+OUTBOUND_MERGE_WINDOW = config("OUTBOUND_MERGE_WINDOW", default=0.25, cast=float)
+OUTBOUND_MAX_MESSAGE_CHARS = config("OUTBOUND_MAX_MESSAGE_CHARS", default=4096, cast=int)
+# Mensajes encolados por sesion (con la cola llena las respuestas esperan lugar) y espera
+# maxima (s) de un aviso antes de descartarlo; las respuestas no vencen
+OUTBOUND_MAX_QUEUE = config("OUTBOUND_MAX_QUEUE", default=200, cast=int)
+OUTBOUND_MAX_DELAY = config("OUTBOUND_MAX_DELAY", default=60.0, cast=float)
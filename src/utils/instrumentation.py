@@ -0,0 +1,99 @@
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+import src.utils.environment as env
+from src.utils.metrics import registry
+
+
+# Etapas del procesamiento de un webhook: filter, parse, download, mime, inference, chatbot, send
+STAGE_LATENCY = registry.histogram(
+    "waha_gateway_stage_seconds",
+    "Duración de cada etapa del procesamiento de un webhook (incluye reintentos)",
+    ("stage",),
+)
+STAGE_IN_FLIGHT = registry.gauge(
+    "waha_gateway_stage_in_flight",
+    "Etapas en curso",
+    ("stage",),
+)
+STAGE_ERRORS = registry.counter(
+    "waha_gateway_stage_errors_total",
+    "Etapas terminadas con una excepción, por tipo de excepción",
+    ("stage", "error"),
+)
+STAGE_BYTES = registry.counter(
+    "waha_gateway_stage_bytes_total",
+    "Bytes recibidos (in) y enviados (out) por etapa",
+    ("stage", "direction"),
+)
+VERTEX_TOKENS = registry.counter(
+    "waha_gateway_vertex_tokens_total",
+    "Tokens de Vertex AI por modelo, tipo de media y clase (prompt, response, total)",
+    ("model", "media_type", "kind"),
+)
+
+# Identificador de traza del webhook en curso (se propaga a WAHA y al chatbot)
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+
+class stage:
+    """
+    Mide una etapa: duración, etapas en curso y excepciones por tipo. Es una
+    clase y no un @contextmanager para que el registro cueste unos pocos
+    microsegundos.
+
+        with stage("download"):
+            ...
+    """
+
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(stage=self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_LATENCY.observe(time.perf_counter() - self._start, stage=self.name)
+        STAGE_IN_FLIGHT.dec(stage=self.name)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS.inc(stage=self.name, error=exc_type.__name__)
+        return False
+
+
+def record_bytes(stage_name: str, direction: str, size: int):
+    STAGE_BYTES.inc(size, stage=stage_name, direction=direction)
+
+
+def record_token_usage(model: str, media_type: str, usage) -> None:
+    """Acumula el `usage_metadata` de una respuesta de Vertex AI (los campos pueden venir vacíos)."""
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("response", "candidates_token_count"), ("total", "total_token_count")):
+        count = getattr(usage, field, None)
+        if count:
+            VERTEX_TOKENS.inc(count, model=model, media_type=media_type, kind=kind)
+
+
+def new_trace_id(incoming: Optional[str] = None) -> Optional[str]:
+    """El id recibido en TRACE_HEADER, o uno nuevo; None si la propagación está desactivada."""
+    if not env.TRACE_HEADER:
+        return None
+    return incoming or uuid.uuid4().hex
+
+
+def set_trace_id(trace_id: Optional[str]):
+    """Fija el id de traza para la tarea actual y las que cree."""
+    _trace_id.set(trace_id)
+
+
+def trace_headers() -> Dict[str, str]:
+    """Cabecera a agregar en las llamadas a WAHA y al chatbot (vacío si no hay traza)."""
+    trace_id = _trace_id.get()
+    if trace_id is None or not env.TRACE_HEADER:
+        return {}
+    return {env.TRACE_HEADER: trace_id}
@@ -1,24 +1,182 @@
+import atexit
 import logging
-from pythonjsonlogger import jsonlogger
-import src.utils.environment as env
+import random
+import sys
+import threading
+from collections import deque
 from datetime import datetime
+from pythonjsonlogger import jsonlogger
 from pytz import timezone
+import src.utils.environment as env
+from src.utils.metrics import registry
+
+
+LOG_DROPPED = registry.counter(
+    "waha_gateway_log_records_dropped_total",
+    "Registros de log descartados por buffer lleno (overflow) o por muestreo (sampled)",
+    ("reason",),
+)
+
+LIMA = timezone('America/Lima')
 
 # Configuración básica de tu logger
 format_str = '%(message)%(levelname)%(asctime)%(filename)%(lineno)%(funcName)'
-formatter = jsonlogger.JsonFormatter(
-    format_str, 
+
+
+class LimaJsonFormatter(jsonlogger.JsonFormatter):
+    """
+    JSON con la hora de Lima. La parte de fecha y hora se calcula una vez por
+    segundo y se reutiliza; solo los milisegundos cambian por registro.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cached_second = None
+        self._cached_time = ""
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._cached_second:
+            self._cached_time = datetime.fromtimestamp(second, tz=LIMA).strftime("%Y-%m-%d %H:%M:%S")
+            self._cached_second = second
+        return f"{self._cached_time},{int(record.msecs):03d}"
+
+
+def truncate(text: str, max_chars: int = None) -> str:
+    """Acorta un texto largo para el log indicando cuántos caracteres se omitieron."""
+    if max_chars is None:
+        max_chars = env.LOG_PAYLOAD_MAX_CHARS
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... (+{len(text) - max_chars} caracteres)"
+
+
+class Payload:
+    """
+    Envuelve un objeto grande para loguearlo con formato diferido:
+    `logger.debug("Webhook: %s", Payload(request))` no calcula el texto si el
+    nivel está desactivado, y lo acorta a LOG_PAYLOAD_MAX_CHARS si se emite.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self) -> str:
+        return truncate(str(self.value))
+
+
+class AsyncBatchHandler(logging.Handler):
+    """
+    Handler que no bloquea al event loop: `emit` solo arma el mensaje y lo
+    encola; un hilo toma los registros en lotes, los formatea y los escribe
+    con una sola escritura por lote. Con el buffer lleno el registro se
+    descarta y se cuenta en LOG_DROPPED en lugar de esperar.
+    """
+
+    def __init__(self, stream=None, max_queue: int = 10000, batch_size: int = 256, max_message_chars: int = 0):
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.max_message_chars = max_message_chars
+        # deque.append y popleft son atómicos: el camino de emit no toma locks
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord):
+        if len(self._buffer) >= self.max_queue:
+            LOG_DROPPED.inc(reason="overflow")
+            return
+        try:
+            # El mensaje se arma aquí: los argumentos pueden cambiar después (p. ej. el request)
+            message = record.getMessage()
+            if self.max_message_chars:
+                message = truncate(message, self.max_message_chars)
+            record.msg, record.args = message, None
+            self._buffer.append(record)
+            if not self._wakeup.is_set():
+                self._wakeup.set()
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Se limpia antes de vaciar: lo que llegue mientras tanto vuelve a despertar al hilo
+            self._wakeup.clear()
+            while self._buffer:
+                batch = []
+                while self._buffer and len(batch) < self.batch_size:
+                    batch.append(self._buffer.popleft())
+                self._write(batch)
+            if self._closing:
+                return
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except Exception:
+            self.handleError(batch[-1])
+
+    def close(self):
+        """Escribe lo que quede en el buffer y detiene el hilo (al terminar el proceso)."""
+        if self._thread.is_alive():
+            self._closing = True
+            self._wakeup.set()
+            self._thread.join(timeout=5)
+        super().close()
+
+
+class SampleFilter(logging.Filter):
+    """
+    Deja pasar con probabilidad LOG_SAMPLE_RATE los registros marcados con
+    `extra={"sampled": True}` (logs de alto volumen, uno por mensaje).
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.__dict__.pop("sampled", False) and random.random() >= env.LOG_SAMPLE_RATE:
+            LOG_DROPPED.inc(reason="sampled")
+            return False
+        return True
+
+
+formatter = LimaJsonFormatter(
+    format_str,
     rename_fields={
-        "levelname": "level", 
-        "asctime": "time", 
-        "message": "msg", 
+        "levelname": "level",
+        "asctime": "time",
+        "message": "msg",
         "funcName": "function_name",
         "filename": "caller",
     }
 )
-logging.Formatter.converter = lambda *args: datetime.now(tz=timezone('America/Lima')).timetuple()
-handler = logging.StreamHandler()
+if env.LOG_ASYNC:
+    handler = AsyncBatchHandler(
+        max_queue=env.LOG_QUEUE_SIZE,
+        batch_size=env.LOG_BATCH_SIZE,
+        max_message_chars=env.LOG_MAX_MESSAGE_CHARS,
+    )
+    atexit.register(handler.close)
+else:
+    handler = logging.StreamHandler()
 handler.setFormatter(formatter)
 logger = logging.getLogger(__name__)
 logger.setLevel(env.LOG_LEVEL)
-logger.addHandler(handler)
\ No newline at end of file
+logger.addHandler(handler)
+logger.addFilter(SampleFilter())
+# Sin propagar al logger raíz: su handler escribe de forma síncrona y duplicaba cada registro
+logger.propagate = False
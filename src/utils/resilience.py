@@ -0,0 +1,345 @@
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, List, Optional, TypeVar
+import src.utils.environment as env
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+
+BREAKER_STATE = registry.gauge(
+    "waha_gateway_circuit_breaker_state",
+    "Estado del circuit breaker por upstream (0 cerrado, 1 semiabierto, 2 abierto)",
+    ("upstream",),
+)
+BREAKER_TRANSITIONS = registry.counter(
+    "waha_gateway_circuit_breaker_transitions_total",
+    "Cambios de estado del circuit breaker",
+    ("upstream", "state"),
+)
+UPSTREAM_CALLS = registry.counter(
+    "waha_gateway_upstream_calls_total",
+    "Resultado de los intentos protegidos (success, failure, client_error, rejected, deadline)",
+    ("upstream", "outcome"),
+)
+UPSTREAM_RETRIES = registry.counter(
+    "waha_gateway_upstream_retries_total",
+    "Reintentos por upstream (retried, budget_exhausted, deadline)",
+    ("upstream", "outcome"),
+)
+HEDGED_CALLS = registry.counter(
+    "waha_gateway_hedged_calls_total",
+    "Solicitudes duplicadas (launched), ganadas por el duplicado (won) u omitidas (skipped)",
+    ("upstream", "outcome"),
+)
+
+T = TypeVar("T")
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+# Instante (time.monotonic) en que vence el procesamiento del webhook en curso
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    """El circuit breaker del upstream está abierto y la llamada se rechaza sin intentarla."""
+
+
+class DeadlineExceededError(Exception):
+    """Se agotó el tiempo disponible para procesar el webhook."""
+
+
+@contextmanager
+def deadline_scope(seconds: float, inherit: bool = True):
+    """
+    Fija el plazo para todo lo que se ejecute dentro del bloque, incluidas las
+    tareas creadas desde él. Con `inherit` se respeta un plazo anterior más
+    corto; sin él se reemplaza (p. ej. en despachos diferidos).
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if inherit and current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Segundos que quedan del plazo actual, o None si no hay plazo."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def bounded_timeout(timeout: Optional[float]) -> Optional[float]:
+    """El menor entre `timeout` y lo que queda del plazo. Lanza DeadlineExceededError si ya venció."""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceededError("El plazo del webhook ya venció")
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class CircuitBreaker:
+    """
+    Abre el circuito tras `failure_threshold` fallas seguidas y rechaza las
+    llamadas durante `reset_timeout` segundos; luego deja pasar una llamada
+    de prueba (semiabierto) que lo cierra si tiene éxito o lo vuelve a abrir.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        BREAKER_STATE.set(0, upstream=name)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        BREAKER_STATE.set(_STATE_VALUES[state], upstream=self.name)
+        BREAKER_TRANSITIONS.inc(upstream=self.name, state=state)
+        log = logger.warning if state == STATE_OPEN else logger.info
+        log(f"Circuit breaker de {self.name}: {state}")
+
+    def allow(self):
+        """Lanza CircuitOpenError si la llamada no puede intentarse."""
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuito de {self.name} abierto")
+            self._transition(STATE_HALF_OPEN)
+        if self.state == STATE_HALF_OPEN:
+            if self._trial_in_flight:
+                raise CircuitOpenError(f"Circuito de {self.name} semiabierto, prueba en curso")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self._failures = 0
+        self._trial_in_flight = False
+        self._transition(STATE_CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition(STATE_OPEN)
+
+    def record_ignored(self):
+        """La llamada terminó sin indicar la salud del upstream (p. ej. un 4xx)."""
+        self._trial_in_flight = False
+
+
+class RetryBudget:
+    """
+    Limita los reintentos a una fracción de las llamadas: cada llamada deposita
+    `ratio` fichas y cada reintento consume una. `min_per_second` asegura
+    algunos reintentos con poco tráfico. Evita que los reintentos multipliquen
+    la carga justo cuando el upstream está degradado.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = 0.0
+        self._min_tokens = min_per_second
+        self._updated_at = time.monotonic()
+
+    def deposit(self):
+        self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def try_withdraw(self) -> bool:
+        now = time.monotonic()
+        self._min_tokens = min(self._min_tokens + (now - self._updated_at) * self.min_per_second, self.min_per_second)
+        self._updated_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        if self._min_tokens >= 1:
+            self._min_tokens -= 1
+            return True
+        return False
+
+
+class Upstream:
+    """
+    Política de resiliencia de un upstream: circuit breaker, reintentos con
+    backoff exponencial y jitter completo limitados por un presupuesto, y el
+    plazo del webhook como tope de cada intento y de la espera entre intentos.
+
+    Args:
+        name: Nombre del upstream (etiqueta de las métricas)
+        is_failure: Indica si una excepción refleja un problema del upstream
+            (cuenta para el breaker y se reintenta salvo que la llamada diga otra cosa)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker,
+        budget: RetryBudget,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        is_failure: Callable[[BaseException], bool],
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_failure = is_failure
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        retry_on: Optional[Callable[[BaseException], bool]] = None,
+        timeout: Optional[float] = None,
+    ) -> T:
+        """
+        Ejecuta `operation` (una fábrica de corrutinas, se invoca en cada intento).
+
+        Args:
+            retry_on: Qué excepciones se reintentan; por defecto las que son falla
+                del upstream. Para operaciones no idempotentes se restringe a las
+                que garantizan que la solicitud no llegó a procesarse.
+            timeout: Tope de cada intento (además del plazo del webhook)
+
+        Raises:
+            CircuitOpenError: si el circuito está abierto
+            DeadlineExceededError: si se agota el plazo del webhook
+        """
+        retry_on = retry_on or self.is_failure
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                attempt_timeout = bounded_timeout(timeout)
+            except DeadlineExceededError:
+                UPSTREAM_CALLS.inc(upstream=self.name, outcome="deadline")
+                raise
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                UPSTREAM_CALLS.inc(upstream=self.name, outcome="rejected")
+                raise
+            try:
+                if attempt_timeout is None:
+                    result = await operation()
+                else:
+                    result = await asyncio.wait_for(operation(), timeout=attempt_timeout)
+            except asyncio.CancelledError:
+                self.breaker.record_ignored()
+                raise
+            except Exception as e:
+                error = e
+                remaining = remaining_time()
+                if isinstance(e, asyncio.TimeoutError) and remaining is not None and remaining <= 0:
+                    # Se agotó el plazo del webhook, no el del intento: no habla de la salud del upstream
+                    error = DeadlineExceededError(f"Plazo del webhook vencido esperando a {self.name}")
+                    self.breaker.record_ignored()
+                    UPSTREAM_CALLS.inc(upstream=self.name, outcome="deadline")
+                elif isinstance(e, asyncio.TimeoutError) or self.is_failure(e):
+                    self.breaker.record_failure()
+                    UPSTREAM_CALLS.inc(upstream=self.name, outcome="failure")
+                else:
+                    self.breaker.record_ignored()
+                    UPSTREAM_CALLS.inc(upstream=self.name, outcome="client_error")
+                if isinstance(error, DeadlineExceededError) or attempt >= self.max_attempts or not retry_on(e):
+                    if error is e:
+                        raise
+                    raise error from e
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                remaining = remaining_time()
+                if remaining is not None and remaining <= delay:
+                    UPSTREAM_RETRIES.inc(upstream=self.name, outcome="deadline")
+                    raise
+                if not self.budget.try_withdraw():
+                    UPSTREAM_RETRIES.inc(upstream=self.name, outcome="budget_exhausted")
+                    raise
+                UPSTREAM_RETRIES.inc(upstream=self.name, outcome="retried")
+                logger.warning(
+                    f"Reintento {attempt}/{self.max_attempts - 1} de {self.name} en {delay:.2f}s: "
+                    f"{str(e) or type(e).__name__} - Tipo: {type(e).__name__}"
+                )
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            UPSTREAM_CALLS.inc(upstream=self.name, outcome="success")
+            return result
+
+
+async def hedged(
+    upstream_name: str,
+    attempts: List[Callable[[], Awaitable[T]]],
+    delay: float,
+    can_hedge: Callable[[], bool] = lambda: True,
+) -> T:
+    """
+    Lanza el primer intento y, si no terminó tras `delay` segundos (o falló),
+    lanza el siguiente; retorna el primer resultado exitoso y cancela el resto.
+    `can_hedge` permite omitir el duplicado (p. ej. si no hay capacidad libre).
+    Si todos fallan se lanza la excepción del último.
+    """
+    pending = set()
+    launched = 0
+    hedge_allowed = True
+    last_error: Optional[BaseException] = None
+    tasks = {}
+    try:
+        while True:
+            more = launched < len(attempts)
+            # El primero siempre; si no queda nada en curso se pasa al siguiente (failover)
+            if more and (launched == 0 or not pending or (hedge_allowed and can_hedge())):
+                task = asyncio.create_task(attempts[launched]())
+                tasks[task] = launched
+                pending.add(task)
+                if launched > 0:
+                    HEDGED_CALLS.inc(upstream=upstream_name, outcome="launched")
+                launched += 1
+            elif more and hedge_allowed:
+                HEDGED_CALLS.inc(upstream=upstream_name, outcome="skipped")
+                hedge_allowed = False
+            if not pending:
+                raise last_error
+            wait_for = delay if launched < len(attempts) and hedge_allowed else None
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if tasks[task] > 0:
+                        HEDGED_CALLS.inc(upstream=upstream_name, outcome="won")
+                    return task.result()
+                last_error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def upstream_from_settings(name: str, is_failure: Callable[[BaseException], bool]) -> Upstream:
+    """Crea la política de un upstream con los valores de la configuración."""
+    return Upstream(
+        name,
+        CircuitBreaker(name, env.BREAKER_FAILURE_THRESHOLD, env.BREAKER_RESET_TIMEOUT),
+        RetryBudget(env.RETRY_BUDGET_RATIO, env.RETRY_BUDGET_MIN_PER_SECOND),
+        max_attempts=env.RETRY_MAX_ATTEMPTS,
+        base_delay=env.RETRY_BASE_DELAY,
+        max_delay=env.RETRY_MAX_DELAY,
+        is_failure=is_failure,
+    )
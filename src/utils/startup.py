@@ -0,0 +1,93 @@
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+import src.utils.environment as env
+from src.utils.metrics import registry
+
+
+STARTUP_SECONDS = registry.gauge(
+    "waha_gateway_startup_seconds",
+    "Duración de cada fase del arranque (imports, lifespan, warmup)",
+    ("phase",),
+)
+
+
+class _TimedLoader:
+    """Envuelve el loader de un módulo para medir su ejecución (incluye los imports que hace)."""
+
+    def __init__(self, loader, profiler: "ImportProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit(module.__name__)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportProfiler:
+    """
+    Mide el tiempo de import de cada módulo, como `python -X importtime` pero
+    dentro del proceso, para registrarlo en el log al iniciar en Cloud Run.
+    Se instala al principio de sys.meta_path, delega la búsqueda en los
+    finders reales y envuelve el loader de cada módulo encontrado.
+
+        profiler = ImportProfiler().install()
+        import ...
+        profiler.uninstall()
+        profiler.slowest(20)
+    """
+
+    def __init__(self):
+        # módulo -> (acumulado, propio) en segundos
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        # Por cada import en curso: [inicio, tiempo de los imports anidados]
+        self._stack: List[List[float]] = []
+
+    def install(self) -> "ImportProfiler":
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self)
+            return spec
+        return None
+
+    def _enter(self):
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def _exit(self, name: str):
+        start, nested = self._stack.pop()
+        cumulative = time.perf_counter() - start
+        self.timings[name] = (cumulative, cumulative - nested)
+        if self._stack:
+            self._stack[-1][1] += cumulative
+
+    def slowest(self, top: int) -> List[Tuple[str, float, float]]:
+        """Los `top` módulos con mayor tiempo acumulado: (módulo, acumulado, propio)."""
+        ranked = sorted(self.timings.items(), key=lambda item: item[1][0], reverse=True)
+        return [(name, cumulative, own) for name, (cumulative, own) in ranked[:top]]
+
+
+def import_profiler_from_env() -> Optional[ImportProfiler]:
+    """ImportProfiler instalado si STARTUP_PROFILE está activo (se llama antes de los imports a medir)."""
+    return ImportProfiler().install() if env.STARTUP_PROFILE else None
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from src.services.admission import AdmissionController, AdmissionRejectedError
+
+
+def controller(**options) -> AdmissionController:
+    settings = dict(initial_limit=2, min_limit=1, max_limit=4, media_share=0.5, max_queue=10, queue_timeout=0.2)
+    settings.update(options)
+    return AdmissionController(**settings)
+
+
+async def hold(admission: AdmissionController, priority: str, release: asyncio.Event, **options):
+    async with admission.admit(priority, **options):
+        await release.wait()
+
+
+def test_admits_up_to_the_limit_and_rejects_after_queue_timeout():
+    async def run():
+        admission = controller()
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(admission, "text", release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert admission.in_flight == 2
+        with pytest.raises(AdmissionRejectedError) as error:
+            async with admission.admit("text"):
+                pass
+        assert error.value.reason == "queue_timeout"
+        release.set()
+        await asyncio.gather(*holders)
+        assert admission.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_time_already_waited_counts_against_the_queue_timeout():
+    async def run():
+        admission = controller()
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(admission, "text", release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejectedError) as error:
+            async with admission.admit("text", waited=1.0):
+                pass
+        assert error.value.reason == "queue_timeout"
+        release.set()
+        await asyncio.gather(*holders)
+
+    asyncio.run(run())
+
+
+def test_blocking_admission_waits_past_the_timeout_without_rejecting():
+    async def run():
+        admission = controller(queue_timeout=0.01)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(hold(admission, "text", release)) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(admission, "text", asyncio.Event(), blocking=True))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        release.set()
+        await asyncio.gather(*holders)
+        await asyncio.sleep(0)
+        assert admission.in_flight == 1
+        waiter.cancel()
+
+    asyncio.run(run())
+
+
+def test_text_waiters_go_before_media_waiters():
+    async def run():
+        admission = controller(initial_limit=1, media_share=1.0)
+        order = []
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(admission, "text", release))
+        await asyncio.sleep(0)
+
+        async def queued(priority: str):
+            async with admission.admit(priority):
+                order.append(priority)
+
+        media = asyncio.create_task(queued("media"))
+        await asyncio.sleep(0)
+        text = asyncio.create_task(queued("text"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, media, text)
+        return order
+
+    assert asyncio.run(run()) == ["text", "media"]
+
+
+def test_media_is_shed_when_too_many_bytes_are_in_memory():
+    async def run():
+        admission = controller(max_media_bytes=100)
+        admission.track_media_bytes(500)
+        with pytest.raises(AdmissionRejectedError) as error:
+            admission.check("media")
+        assert error.value.reason == "memory"
+        admission.check("text")
+        # Un worker con el mensaje ya aceptado no se descarta
+        async with admission.admit("media", blocking=True):
+            pass
+        admission.track_media_bytes(-500)
+
+    asyncio.run(run())
+
+
+def test_slow_webhooks_reduce_the_limit():
+    admission = controller(initial_limit=4, max_limit=4, latency_tolerance=2.0, decrease_factor=0.5)
+    for _ in range(10):
+        admission._observe("text", 0.1)
+    admission._observe("text", 1.0)
+    assert admission.limit == 2.0
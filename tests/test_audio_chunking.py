@@ -0,0 +1,94 @@
+import struct
+
+from src.services.audio_chunking import (
+    OPUS_SAMPLE_RATE,
+    OggPage,
+    OpusStream,
+    SplitResult,
+    ogg_opus_duration,
+    parse_ogg_pages,
+    split_long_audio,
+)
+
+PRE_SKIP = 312
+SERIAL = 0x5EED
+
+
+def page(flags: int, granule: int, sequence: int, segments, body: bytes) -> bytes:
+    return OggPage(flags, granule, SERIAL, sequence, bytes(segments), body).encode(flags, granule, sequence)
+
+
+def opus_stream(seconds: int, continued_after=()) -> bytes:
+    """
+    Ogg/Opus de una página por segundo. Las páginas en `continued_after` son
+    silencios (paquetes de 3 bytes, los mejores puntos de corte) cuyo último
+    paquete sigue en la página siguiente (bandera 0x01).
+    """
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, PRE_SKIP, 16000, 0, 0)
+    tags = b"OpusTags" + struct.pack("<I", 0) + struct.pack("<I", 0)
+    pages = [page(0x02, 0, 0, [len(head)], head), page(0, 0, 1, [len(tags)], tags)]
+    carry = 0
+    for second in range(seconds):
+        segments, body = [], b""
+        flags = 0
+        if carry:
+            # Resto del paquete que empezó en la página anterior
+            flags |= 0x01
+            segments.append(carry)
+            body += b"\x01" * carry
+            carry = 0
+        size = 3 if second in continued_after else 40
+        segments += [size] * 49
+        body += b"\x00" * size * 49
+        if second in continued_after:
+            segments.append(255)
+            body += b"\x02" * 255
+            carry = 45
+        if second == seconds - 1:
+            flags |= 0x04
+        pages.append(page(flags, PRE_SKIP + OPUS_SAMPLE_RATE * (second + 1), second + 2, segments, body))
+    return b"".join(pages)
+
+
+def split(data: bytes, mime_type: str = "audio/ogg", min_seconds: float = 0) -> SplitResult:
+    return split_long_audio(data, mime_type, min_seconds, 1 << 40, chunk_seconds=20, search_seconds=3)
+
+
+def test_duration_is_read_from_the_last_granule():
+    assert ogg_opus_duration(opus_stream(30)) == 30.0
+    assert ogg_opus_duration(b"not an ogg file") is None
+
+
+def test_long_audio_is_split_into_independent_chunks_with_its_duration():
+    data = opus_stream(65)
+    chunks, duration = split(data)
+    assert duration == 65.0
+    assert len(chunks) > 1
+    durations = [ogg_opus_duration(chunk) for chunk in chunks]
+    assert sum(durations) == 65.0
+    for chunk in chunks:
+        pages = parse_ogg_pages(chunk)
+        assert pages[0].body.startswith(b"OpusHead")
+        assert pages[-1].flags & 0x04
+
+
+def test_short_audio_keeps_a_single_call_but_reports_the_duration():
+    assert split(opus_stream(10), min_seconds=30) == SplitResult(None, 10.0)
+
+
+def test_unsupported_or_invalid_audio_is_not_split():
+    assert split(opus_stream(65), mime_type="audio/mpeg") == SplitResult(None, None)
+    assert split(b"OggS" + b"\x00" * 10) == SplitResult(None, None)
+
+
+def test_chunks_never_start_with_a_continued_packet():
+    # Los silencios cerca de cada objetivo de corte terminan con un paquete partido
+    data = opus_stream(65, continued_after={19, 20, 39, 40})
+    chunks, _ = split(data)
+    assert chunks is not None and len(chunks) > 1
+    audio_pages = 0
+    for chunk in chunks:
+        stream = OpusStream(parse_ogg_pages(chunk))
+        assert not stream.audio_pages[0].flags & 0x01
+        audio_pages += len(stream.audio_pages)
+    assert audio_pages == 65
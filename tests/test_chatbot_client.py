@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import src.services.chatbot_client as chatbot_client
+from src.services.chatbot_client import ReplySegmenter, reply_streaming
+from src.utils.resilience import DeadlineExceededError
+
+
+def test_segmenter_cuts_paragraphs_and_long_sentences():
+    segmenter = ReplySegmenter(min_chars=20)
+    assert segmenter.feed("Hola.\n\nTu trámite") == ["Hola."]
+    assert segmenter.feed(" está listo. Puedes retirarlo") == ["Tu trámite está listo."]
+    assert segmenter.flush() == "Puedes retirarlo"
+    assert segmenter.flush() is None
+
+
+def streaming(monkeypatch, chunks, error=None):
+    async def stream(payload):
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(0)
+        if error is not None:
+            raise error
+
+    monkeypatch.setattr(chatbot_client.env, "CHATBOT_STREAM_MIN_CHARS", 10)
+    monkeypatch.setattr(chatbot_client, "stream_chatbot", stream)
+
+
+class SlowSender:
+    def __init__(self):
+        self.started, self.finished = [], []
+
+    async def __call__(self, text):
+        self.started.append(text)
+        await asyncio.sleep(0.02)
+        self.finished.append(text)
+        return {"text": text}
+
+
+def test_streamed_segments_are_sent_as_they_complete(monkeypatch):
+    streaming(monkeypatch, ["Primera parte.\n\n", "Segunda ", "parte."])
+    sender = SlowSender()
+    result = asyncio.run(reply_streaming({}, sender))
+    assert result["segments"] == 2
+    assert sender.finished == ["Primera parte.", "Segunda parte."]
+    assert result["send_responses"] == [{"text": "Primera parte."}, {"text": "Segunda parte."}]
+
+
+@pytest.mark.parametrize("error", [DeadlineExceededError("plazo"), RuntimeError("otro")])
+def test_sends_already_started_are_awaited_when_the_stream_fails(monkeypatch, error):
+    streaming(monkeypatch, ["Primera parte.\n\n", "Segunda parte.\n\n"], error)
+    sender = SlowSender()
+
+    async def run():
+        with pytest.raises(type(error)):
+            await reply_streaming({}, sender)
+        # Al propagarse el error, los envíos ya terminaron
+        return list(sender.finished)
+
+    assert asyncio.run(run()) == ["Primera parte.", "Segunda parte."]
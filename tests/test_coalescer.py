@@ -0,0 +1,98 @@
+import asyncio
+
+from src.services.coalescer import Coalescer
+
+
+class Flushes:
+    """Registra cada despacho (clave, elementos) y puede demorar el handler."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    async def __call__(self, key, items):
+        await asyncio.sleep(self.delay)
+        self.batches.append((key, list(items)))
+
+
+def coalescer(flushes: Flushes, **options) -> Coalescer:
+    settings = dict(quiet_period=0.02, max_wait=1.0, max_items=10)
+    settings.update(options)
+    return Coalescer("test", flushes, **settings)
+
+
+def test_items_arriving_together_are_flushed_as_one_batch_per_key():
+    flushes = Flushes()
+
+    async def run():
+        batcher = coalescer(flushes)
+        for item in ("a1", "b1", "a2"):
+            batcher.add(item[0], item)
+        assert len(batcher) == 3
+        await asyncio.sleep(0.05)
+        assert len(batcher) == 0
+
+    asyncio.run(run())
+    assert sorted(flushes.batches) == [("a", ["a1", "a2"]), ("b", ["b1"])]
+
+
+def test_max_items_flushes_immediately():
+    flushes = Flushes()
+
+    async def run():
+        batcher = coalescer(flushes, max_items=2, quiet_period=10)
+        batcher.add("chat", 1)
+        batcher.add("chat", 2)
+        batcher.add("chat", 3)
+        await asyncio.sleep(0)
+        await batcher.drain(timeout=1)
+
+    asyncio.run(run())
+    assert flushes.batches == [("chat", [1, 2]), ("chat", [3])]
+
+
+def test_max_wait_bounds_the_delay_of_a_busy_chat():
+    flushes = Flushes()
+
+    async def run():
+        batcher = coalescer(flushes, quiet_period=0.03, max_wait=0.05)
+        for item in range(6):
+            batcher.add("chat", item)
+            await asyncio.sleep(0.015)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert len(flushes.batches) >= 2
+    assert [item for _, items in flushes.batches for item in items] == list(range(6))
+
+
+def test_batches_of_a_key_are_dispatched_in_order_and_flush_waits_for_them():
+    flushes = Flushes(delay=0.02)
+
+    async def run():
+        batcher = coalescer(flushes, max_items=1)
+        batcher.add("chat", 1)
+        batcher.add("chat", 2)
+        batcher.add("chat", 3)
+        await batcher.flush("chat")
+        return list(flushes.batches)
+
+    assert asyncio.run(run()) == [("chat", [1]), ("chat", [2]), ("chat", [3])]
+
+
+def test_drain_dispatches_open_batches_and_survives_handler_errors():
+    dispatched = []
+
+    async def flaky(key, items):
+        dispatched.append(key)
+        if key == "bad":
+            raise RuntimeError("falla")
+
+    async def run():
+        batcher = Coalescer("test", flaky, quiet_period=10, max_wait=10, max_items=10)
+        batcher.add("bad", 1)
+        batcher.add("good", 2)
+        await batcher.drain(timeout=1)
+
+    asyncio.run(run())
+    assert sorted(dispatched) == ["bad", "good"]
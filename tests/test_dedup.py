@@ -0,0 +1,97 @@
+import asyncio
+
+from src.services.dedup import Deduplicator, MemoryDedupBackend, SqliteDedupBackend
+
+
+class Counter:
+    """Factory de prueba: cuenta las ejecuciones y retorna `result` después de `delay`."""
+
+    def __init__(self, result=None, delay: float = 0.0):
+        self.result = {"status": "success"} if result is None else result
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+def memory(pending_timeout: float = 0.05) -> MemoryDedupBackend:
+    return MemoryDedupBackend(ttl=60, max_entries=100, pending_timeout=pending_timeout)
+
+
+def test_concurrent_duplicates_share_the_running_result():
+    factory = Counter(delay=0.02)
+
+    async def run():
+        deduplicator = Deduplicator(memory(), pending_timeout=1)
+        return await asyncio.gather(deduplicator.run("m1", factory), deduplicator.run("m1", factory))
+
+    (first, first_duplicate), (second, second_duplicate) = asyncio.run(run())
+    assert factory.calls == 1
+    assert first == second == {"status": "success"}
+    assert (first_duplicate, second_duplicate) == (False, True)
+
+
+def test_late_duplicates_get_the_stored_result():
+    factory = Counter()
+
+    async def run():
+        deduplicator = Deduplicator(memory(), pending_timeout=1)
+        await deduplicator.run("m1", factory)
+        return await deduplicator.run("m1", factory)
+
+    assert asyncio.run(run()) == ({"status": "success"}, True)
+    assert factory.calls == 1
+
+
+def test_failed_processing_is_released_for_redelivery():
+    factory = Counter(result={"status": "error"})
+
+    async def run():
+        deduplicator = Deduplicator(memory(), pending_timeout=1)
+        await deduplicator.run("m1", factory)
+        return await deduplicator.run("m1", factory)
+
+    assert asyncio.run(run()) == ({"status": "error"}, False)
+    assert factory.calls == 2
+
+
+def test_remote_pending_timeout_takes_over_the_key():
+    factory = Counter()
+
+    async def run():
+        backend = memory(pending_timeout=0.05)
+        # Otra instancia reclamó la clave y nunca terminó
+        assert await backend.claim("m1") is None
+        deduplicator = Deduplicator(backend, pending_timeout=0.05, poll_interval=0.01)
+        result = await deduplicator.run("m1", factory)
+        return result, await backend.get("m1")
+
+    (result, duplicate), record = asyncio.run(run())
+    assert (result, duplicate) == ({"status": "success"}, False)
+    assert factory.calls == 1
+    assert record == ("done", {"status": "success"})
+
+
+def test_sqlite_instances_share_results_and_take_over_stale_claims(tmp_path):
+    path = str(tmp_path / "dedup.db")
+    factory = Counter()
+
+    async def run():
+        owner = SqliteDedupBackend(path, ttl=60, pending_timeout=0.05)
+        other = Deduplicator(SqliteDedupBackend(path, ttl=60, pending_timeout=0.05), 0.05, poll_interval=0.01)
+        # Completado por la primera instancia: la segunda recibe el resultado guardado
+        await owner.claim("done")
+        await owner.complete("done", {"status": "success", "from": "owner"})
+        stored = await other.run("done", factory)
+        # Pendiente en la primera instancia, que no termina: la segunda lo procesa
+        await owner.claim("stale")
+        taken = await other.run("stale", factory)
+        return stored, taken
+
+    stored, taken = asyncio.run(run())
+    assert stored == ({"status": "success", "from": "owner"}, True)
+    assert taken == ({"status": "success"}, False)
+    assert factory.calls == 1
@@ -0,0 +1,46 @@
+import pytest
+from pydantic import ValidationError
+
+from src.entities.dni_entities import DniExtraction, dni_check_characters
+
+
+def extraction(**fields) -> DniExtraction:
+    data = dict(legible=True, apellidos="perez  garcia", prenombres="juan carlos", numero_dni="12345678")
+    data.update(fields)
+    return DniExtraction(**data)
+
+
+def test_check_characters_are_a_number_and_a_letter():
+    assert dni_check_characters("12345678") == ("1", "E")
+    assert dni_check_characters("00000000") == ("6", "K")
+
+
+@pytest.mark.parametrize("digit", ["1", "E", "e", None])
+def test_either_check_character_is_accepted(digit):
+    assert extraction(digito_verificacion=digit).numero_dni == "12345678"
+
+
+@pytest.mark.parametrize("digit", ["2", "K", "1E", "E1"])
+def test_wrong_or_combined_check_characters_are_rejected(digit):
+    with pytest.raises(ValidationError):
+        extraction(digito_verificacion=digit)
+
+
+def test_fields_are_normalized():
+    dni = extraction(numero_dni="12.345 678", sexo="masculino", fecha_nacimiento="01 02 1990")
+    assert (dni.apellidos, dni.numero_dni, dni.sexo, dni.fecha_nacimiento) == (
+        "PEREZ GARCIA", "12345678", "M", "01/02/1990"
+    )
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [{"numero_dni": "1234567"}, {"numero_dni": None}, {"sexo": "X"}, {"fecha_nacimiento": "1990-31-12"}],
+)
+def test_invalid_documents_are_rejected(fields):
+    with pytest.raises(ValidationError):
+        extraction(**fields)
+
+
+def test_illegible_document_skips_validation():
+    assert DniExtraction(legible=False).to_message() == "La imagen del DNI no es legible"
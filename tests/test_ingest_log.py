@@ -0,0 +1,62 @@
+import asyncio
+
+from src.services.ingest_log import IngestLog
+
+
+def test_appends_are_committed_together_and_replayed_until_acked(tmp_path):
+    path = str(tmp_path / "ingest.db")
+
+    async def run():
+        log = IngestLog(path, max_batch=10)
+        await log.start()
+        seqs = await asyncio.gather(*(log.append(f"chat{i}", f"payload{i}") for i in range(5)))
+        log.ack(seqs[0])
+        log.ack(seqs[2])
+        await log.close()
+        reopened = IngestLog(path)
+        await reopened.start()
+        rows = reopened.unfinished()
+        await reopened.close()
+        return seqs, rows
+
+    seqs, rows = asyncio.run(run())
+    assert seqs == sorted(seqs) and len(set(seqs)) == 5
+    assert [(key, payload) for _, key, payload in rows] == [
+        ("chat1", "payload1"), ("chat3", "payload3"), ("chat4", "payload4")
+    ]
+
+
+def test_write_error_fails_every_pending_append(tmp_path, monkeypatch):
+    async def run():
+        log = IngestLog(str(tmp_path / "ingest.db"), max_batch=2)
+        await log.start()
+        write = log._write
+
+        def failing(rows, acks):
+            raise OSError("disco lleno")
+
+        monkeypatch.setattr(log, "_write", failing)
+        # Más appends que max_batch: ninguno debe quedar esperando
+        results = await asyncio.wait_for(
+            asyncio.gather(*(log.append("chat", str(i)) for i in range(5)), return_exceptions=True), timeout=1
+        )
+        monkeypatch.setattr(log, "_write", write)
+        seq = await asyncio.wait_for(log.append("chat", "después"), timeout=1)
+        await log.close()
+        return results, seq
+
+    results, seq = asyncio.run(run())
+    assert all(isinstance(result, OSError) for result in results)
+    assert seq >= 1
+
+
+def test_appends_beyond_max_batch_use_several_commits(tmp_path):
+    async def run():
+        log = IngestLog(str(tmp_path / "ingest.db"), max_batch=3)
+        await log.start()
+        seqs = await asyncio.gather(*(log.append("chat", str(i)) for i in range(7)))
+        await log.close()
+        return seqs
+
+    assert sorted(asyncio.run(run())) == list(range(1, 8))
+
@@ -0,0 +1,66 @@
+import asyncio
+from functools import partial
+
+from src.entities.dni_entities import DniExtraction
+from src.services.image_preprocess import downscale_image
+from src.services.media_cache import MediaCache, cache_key
+from src.services.media_pipeline import MediaProcessor
+from src.services.model_routing import RoutingTable
+
+
+def processor(**options) -> MediaProcessor:
+    settings = dict(name="image", mime_types=["image/"], prompt="Extrae los datos del DNI")
+    settings.update(options)
+    return MediaProcessor(**settings)
+
+
+def test_processor_fingerprint_is_stable():
+    assert processor().fingerprint == processor().fingerprint
+
+
+def test_processor_fingerprint_changes_with_anything_that_changes_the_text():
+    base = processor(preprocess=partial(downscale_image, max_edge=1536, quality=85)).fingerprint
+    variants = [
+        processor(prompt="Otro prompt", preprocess=partial(downscale_image, max_edge=1536, quality=85)),
+        processor(preprocess=partial(downscale_image, max_edge=1024, quality=85)),
+        processor(preprocess=None),
+        processor(preprocess=partial(downscale_image, max_edge=1536, quality=85), max_output_tokens=512),
+        processor(preprocess=partial(downscale_image, max_edge=1536, quality=85), response_schema=DniExtraction),
+    ]
+    fingerprints = {variant.fingerprint for variant in variants}
+    assert base not in fingerprints
+    assert len(fingerprints) == len(variants)
+
+
+def test_cache_key_separates_content_model_and_processor():
+    key = cache_key("abc", "gemini", "fp1")
+    assert key == cache_key("abc", "gemini", "fp1")
+    others = {cache_key("abd", "gemini", "fp1"), cache_key("abc", "lite", "fp1"), cache_key("abc", "gemini", "fp2")}
+    assert len(others | {key}) == 4
+
+
+def test_routing_fingerprint_includes_output_caps():
+    table = {"tiers": {"fast": {"model": "lite"}, "standard": {"model": "flash"}}, "default": "standard"}
+    capped = {"tiers": {"fast": {"model": "lite", "max_output_tokens": 256}, "standard": {"model": "flash"}},
+              "default": "standard"}
+    assert RoutingTable.from_dict(table).fingerprint() != RoutingTable.from_dict(capped).fingerprint()
+    assert RoutingTable.single("flash").fingerprint() == "flash"
+
+
+def test_identical_requests_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "texto"
+
+    async def run():
+        cache = MediaCache(max_bytes=1 << 20, ttl=60)
+        first = await asyncio.gather(cache.get_or_compute("k", compute), cache.get_or_compute("k", compute))
+        return first, await cache.get_or_compute("k", compute)
+
+    first, cached = asyncio.run(run())
+    assert first == ["texto", "texto"]
+    assert cached == "texto"
+    assert len(calls) == 1
@@ -0,0 +1,81 @@
+import asyncio
+import hashlib
+import os
+
+import httpx
+import pytest
+
+import src.utils.environment as env
+from src.services import http_clients
+from src.services.media_download import MediaTooLargeError, download_media
+
+
+def serve(body: bytes):
+    """Instala un cliente "waha" que responde `body` en trozos de 1 KB."""
+
+    async def chunks():
+        for start in range(0, len(body), 1024):
+            yield body[start:start + 1024]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=chunks(), headers={"Content-Type": "audio/ogg"})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+def waha(monkeypatch):
+    def install(body: bytes):
+        client = serve(body)
+        monkeypatch.setitem(http_clients._clients, "waha", client)
+        return client
+
+    return install
+
+
+def test_small_download_stays_in_memory(waha, monkeypatch):
+    monkeypatch.setattr(env, "MEDIA_SPOOL_BYTES", 1 << 20)
+    body = os.urandom(4096)
+    waha(body)
+
+    async def run():
+        media = await download_media("http://waha/file")
+        try:
+            return media.size, media.sha256, media.head, await media.aread()
+        finally:
+            media.close()
+
+    size, sha256, head, data = asyncio.run(run())
+    assert size == len(body)
+    assert sha256 == hashlib.sha256(body).hexdigest()
+    assert head == body[:len(head)]
+    assert data == body
+
+
+def test_large_download_spills_to_disk_and_is_read_once(waha, monkeypatch, tmp_path):
+    monkeypatch.setattr(env, "MEDIA_SPOOL_BYTES", 2048)
+    monkeypatch.setattr(env, "MEDIA_SPOOL_DIR", str(tmp_path))
+    body = os.urandom(8192)
+    waha(body)
+
+    async def run():
+        media = await download_media("http://waha/file")
+        assert len(os.listdir(tmp_path)) == 1
+        first = await media.aread()
+        # Las lecturas siguientes devuelven los mismos bytes sin volver al disco
+        assert media.read() is first
+        media.close()
+        return first
+
+    assert asyncio.run(run()) == body
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversized_download_removes_the_spool_file(waha, monkeypatch, tmp_path):
+    monkeypatch.setattr(env, "MEDIA_SPOOL_BYTES", 1024)
+    monkeypatch.setattr(env, "MEDIA_SPOOL_DIR", str(tmp_path))
+    waha(os.urandom(8192))
+
+    with pytest.raises(MediaTooLargeError):
+        asyncio.run(download_media("http://waha/file", max_bytes=4096))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+
+import src.services.media_pipeline as media_pipeline
+from src.services import http_clients
+from src.services.image2text import convert_image_to_text
+from src.services.mime_detection import detect_mime_type, normalize_mime_type, sniff_mime_type
+
+PDF = b"%PDF-1.7\n" + b"\x00" * 64
+OGG = b"OggS" + b"\x00" * 64
+
+
+def mp4(brand: bytes) -> bytes:
+    return b"\x00\x00\x00\x20ftyp" + brand + b"\x00" * 52
+
+
+@pytest.mark.parametrize(
+    "head, expected",
+    [
+        (OGG, "audio/ogg"),
+        (b"\xff\xd8\xff\xe0" + b"\x00" * 16, "image/jpeg"),
+        (b"\x89PNG\r\n\x1a\n" + b"\x00" * 16, "image/png"),
+        (PDF, "application/pdf"),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+        (b"RIFF\x00\x00\x00\x00WAVEfmt ", "audio/wav"),
+        (mp4(b"M4A "), "audio/mp4"),
+        (mp4(b"isom"), "video/mp4"),
+        (b"ID3\x04" + b"\x00" * 16, "audio/mpeg"),
+        (b"hola, esto es texto", None),
+    ],
+)
+def test_sniffs_formats_by_their_signature(head, expected):
+    assert sniff_mime_type(head) == expected
+
+
+def test_declared_types_are_normalized():
+    assert normalize_mime_type("audio/ogg; codecs=opus") == "audio/ogg"
+    assert normalize_mime_type("IMAGE/JPG") == "image/jpeg"
+    assert normalize_mime_type("application/octet-stream") is None
+
+
+def test_signature_wins_over_declared_type():
+    assert detect_mime_type(PDF, "image/jpeg", "image/jpeg") == ("application/pdf", "sniffed")
+
+
+def test_generic_mp4_keeps_a_declared_audio_type():
+    assert detect_mime_type(mp4(b"isom"), "audio/mp4") == ("audio/mp4", "declared")
+    assert detect_mime_type(mp4(b"isom"), None, "audio/aac") == ("audio/aac", "content_type")
+    assert detect_mime_type(mp4(b"isom"), "video/mp4") == ("video/mp4", "sniffed")
+
+
+def test_unknown_content_falls_back_to_declared_then_content_type():
+    assert detect_mime_type(b"????", "audio/ogg", "audio/mpeg") == ("audio/ogg", "declared")
+    assert detect_mime_type(b"????", None, "audio/mpeg") == ("audio/mpeg", "content_type")
+    assert detect_mime_type(b"????") == (None, "unknown")
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """WAHA simulado que sirve `files` por ruta y una inferencia que responde con el procesador usado."""
+    files = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=files[request.url.path])
+
+    async def infer(processor, tiers, prepared):
+        return f"{processor.name}:{prepared[0][1]}"
+
+    monkeypatch.setitem(http_clients._clients, "waha", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(media_pipeline, "_infer", infer)
+    monkeypatch.setattr(media_pipeline, "MEDIA_CACHE_ENABLED", False)
+    return files
+
+
+def test_image_conversion_picks_the_processor_from_the_content_not_the_url(pipeline):
+    pipeline["/api/files/scan.jpg"] = PDF
+    assert asyncio.run(convert_image_to_text("http://localhost:3000/api/files/scan.jpg")) == "pdf:application/pdf"
+
+
+def test_image_conversion_rejects_content_that_is_not_an_image_or_pdf(pipeline):
+    pipeline["/api/files/photo.pdf"] = OGG
+    assert asyncio.run(convert_image_to_text("http://localhost:3000/api/files/photo.pdf")) is None
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+
+import src.services.media_pipeline as media_pipeline
+from src.services.media_pipeline import MediaProcessor
+from src.services.model_routing import RoutingTable, load_routing_table
+
+TABLE = {
+    "tiers": {
+        "fast": {"model": "lite", "fallback": "standard"},
+        "standard": {"model": "flash", "fallback": "strong"},
+        "strong": {"model": "pro", "fallback": "fast"},
+    },
+    "routes": [
+        {"media_types": ["audio"], "max_seconds": 30, "tier": "fast"},
+        {"media_types": ["pdf"], "min_bytes": 1000, "tier": "strong"},
+    ],
+    "default": "standard",
+}
+
+
+def names(tiers):
+    return [tier.name for tier in tiers]
+
+
+def test_first_matching_rule_wins_and_default_applies_otherwise():
+    table = RoutingTable.from_dict(TABLE)
+    assert names(table.select("audio", 10, 12.0))[0] == "fast"
+    assert names(table.select("audio", 10, 120.0))[0] == "standard"
+    assert names(table.select("pdf", 5000))[0] == "strong"
+    assert names(table.select("pdf", 10))[0] == "standard"
+    assert table.uses_duration
+
+
+def test_duration_rules_do_not_apply_without_a_known_duration():
+    table = RoutingTable.from_dict(TABLE)
+    assert names(table.select("audio", 10, None))[0] == "standard"
+
+
+def test_fallback_chain_stops_before_repeating_a_tier():
+    table = RoutingTable.from_dict(TABLE)
+    assert names(table.chain("fast")) == ["fast", "standard", "strong"]
+
+
+@pytest.mark.parametrize(
+    "table",
+    [
+        {"tiers": {"fast": {"model": "lite"}}, "default": "missing"},
+        {"tiers": {"fast": {"model": "lite", "fallback": "missing"}}},
+        {"tiers": {"fast": {"model": "lite"}}, "routes": [{"tier": "missing"}]},
+    ],
+)
+def test_unknown_tiers_are_rejected(table):
+    with pytest.raises(ValueError):
+        RoutingTable.from_dict(table)
+
+
+def test_table_loads_from_inline_json_a_file_or_defaults_to_one_model(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps(TABLE))
+    assert set(load_routing_table(json.dumps(TABLE), "flash").tiers) == {"fast", "standard", "strong"}
+    assert load_routing_table(str(path), "flash").default == "standard"
+    assert names(load_routing_table("", "flash").select("image", 10)) == ["default"]
+    with pytest.raises(ValueError):
+        load_routing_table("{\"tiers\": ", "flash")
+
+
+def test_weak_answers_fall_back_to_the_next_tier(monkeypatch):
+    calls = []
+
+    async def infer_tier(processor, tier, files):
+        calls.append(tier.name)
+        if tier.name == "fast":
+            raise media_pipeline.LowQualityResponseError("empty", "")
+        return f"texto de {tier.model}"
+
+    monkeypatch.setattr(media_pipeline, "_infer_tier", infer_tier)
+    processor = MediaProcessor(name="audio", mime_types=["audio/"], prompt="Transcribe")
+    tiers = RoutingTable.from_dict(TABLE).chain("fast")
+    assert asyncio.run(media_pipeline._infer(processor, tiers, [(b"", "audio/ogg")])) == "texto de flash"
+    assert calls == ["fast", "standard"]
@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+from src.services.outbound import OutboundScheduler
+
+
+class Recorder:
+    """Entrega simulada: registra (chat, texto) y detecta dos envíos a la vez al mismo chat."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []
+        self.active = set()
+        self.peak = 0
+        self.overlapped = False
+
+    async def deliver(self, session, chat_id, text, headers):
+        if chat_id in self.active:
+            self.overlapped = True
+        self.active.add(chat_id)
+        self.peak = max(self.peak, len(self.active))
+        await asyncio.sleep(self.latency)
+        self.active.discard(chat_id)
+        self.sent.append((chat_id, text))
+        return {"id": len(self.sent)}
+
+
+def scheduler(recorder: Recorder, **options) -> OutboundScheduler:
+    settings = dict(rate=1000, burst=1000, merge_window=0, max_queue=100, max_delay=60, max_in_flight=4)
+    settings.update(options)
+    return OutboundScheduler(recorder.deliver, **settings)
+
+
+def test_sends_run_concurrently_but_in_order_per_chat():
+    recorder = Recorder(latency=0.05)
+
+    async def run():
+        outbound = scheduler(recorder)
+        futures = [outbound.submit("default", f"chat{i % 3}", str(i)) for i in range(12)]
+        started = time.monotonic()
+        await asyncio.gather(*futures)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert not recorder.overlapped
+    assert recorder.peak == 3
+    # 4 mensajes por chat de 50 ms cada uno, los tres chats en paralelo
+    assert elapsed < 0.4
+    for chat in ("chat0", "chat1", "chat2"):
+        texts = [int(text) for chat_id, text in recorder.sent if chat_id == chat]
+        assert texts == sorted(texts)
+
+
+def test_max_in_flight_caps_concurrent_sends():
+    recorder = Recorder(latency=0.02)
+
+    async def run():
+        outbound = scheduler(recorder, max_in_flight=2)
+        await asyncio.gather(*(outbound.submit("default", f"chat{i}", "hola") for i in range(6)))
+
+    asyncio.run(run())
+    assert recorder.peak == 2
+    assert len(recorder.sent) == 6
+
+
+def test_messages_to_the_same_chat_are_merged_within_the_window():
+    recorder = Recorder()
+
+    async def run():
+        outbound = scheduler(recorder, merge_window=0.05)
+        return await asyncio.gather(
+            outbound.submit("default", "chat", "uno"),
+            outbound.submit("default", "otro", "aparte"),
+            outbound.submit("default", "chat", "dos"),
+        )
+
+    responses = asyncio.run(run())
+    assert ("chat", "uno\n\ndos") in recorder.sent
+    assert ("otro", "aparte") in recorder.sent
+    assert responses[0] == responses[2]
+
+
+def test_full_queue_makes_answers_wait_instead_of_dropping_them():
+    recorder = Recorder(latency=0.01)
+
+    async def run():
+        outbound = scheduler(recorder, max_queue=2, max_in_flight=1)
+        return await asyncio.gather(*(outbound.send("default", "chat", str(i)) for i in range(6)))
+
+    responses = asyncio.run(run())
+    assert all(response is not None for response in responses)
+    assert [text for _, text in recorder.sent] == [str(i) for i in range(6)]
+
+
+def test_full_queue_evicts_notices_for_answers():
+    recorder = Recorder()
+
+    async def run():
+        outbound = scheduler(recorder, max_queue=1, merge_window=0.05)
+        notice = outbound.submit("default", "chat", "aviso", lane="notice")
+        answer = outbound.submit("default", "chat", "respuesta")
+        return await notice, await answer
+
+    notice, answer = asyncio.run(run())
+    assert notice is None
+    assert answer is not None
+    assert recorder.sent == [("chat", "respuesta")]
+
+
+def test_only_notices_expire():
+    recorder = Recorder()
+
+    async def run():
+        outbound = scheduler(recorder, max_delay=0.01, merge_window=0.05)
+        answer = outbound.submit("default", "chat", "respuesta")
+        notice = outbound.submit("default", "otro", "aviso", lane="notice")
+        return await answer, await notice
+
+    answer, notice = asyncio.run(run())
+    assert answer is not None
+    assert notice is None
+    assert recorder.sent == [("chat", "respuesta")]
+
+
+def test_drain_waits_for_in_flight_sends_and_cancels_after_timeout():
+    async def run():
+        recorder = Recorder(latency=0.05)
+        outbound = scheduler(recorder)
+        future = outbound.submit("default", "chat", "hola")
+        await outbound.drain(timeout=1)
+        assert future.result() is not None
+
+        slow = Recorder(latency=5)
+        outbound = scheduler(slow)
+        futures = [outbound.submit("default", "chat", str(i)) for i in range(3)]
+        await outbound.drain(timeout=0.05)
+        assert [future.result() for future in futures] == [None, None, None]
+        assert len(outbound) == 0
+
+    asyncio.run(run())
+
+
+def test_unmergeable_messages_are_sent_alone_and_in_order():
+    recorder = Recorder()
+
+    async def run():
+        outbound = scheduler(recorder, merge_window=0.05)
+        return await asyncio.gather(
+            outbound.submit("default", "chat", "uno"),
+            outbound.submit("default", "chat", "segmento 1", merge=False),
+            outbound.submit("default", "chat", "segmento 2", merge=False),
+            outbound.submit("default", "chat", "dos"),
+            outbound.submit("default", "chat", "tres"),
+        )
+
+    responses = asyncio.run(run())
+    assert [text for _, text in recorder.sent] == ["uno", "segmento 1", "segmento 2", "dos\n\ntres"]
+    assert len(set(map(id, responses[:3]))) == 3
@@ -0,0 +1,254 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.utils.resilience import (
+    HEDGED_CALLS,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    UPSTREAM_CALLS,
+    UPSTREAM_RETRIES,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    RetryBudget,
+    Upstream,
+    deadline_scope,
+    hedged,
+)
+
+
+def is_failure(e: BaseException) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+def make_upstream(name: str, budget: RetryBudget = None, max_attempts: int = 3, threshold: int = 3) -> Upstream:
+    return Upstream(
+        name,
+        CircuitBreaker(name, failure_threshold=threshold, reset_timeout=60),
+        budget or RetryBudget(ratio=1.0, min_per_second=10),
+        max_attempts=max_attempts,
+        base_delay=0,
+        max_delay=0,
+        is_failure=is_failure,
+    )
+
+
+class Upstream5xx:
+    """Transporte que responde siempre con el estado indicado y cuenta las solicitudes."""
+
+    def __init__(self, status: int = 503):
+        self.status = status
+        self.requests = 0
+        self.transport = httpx.MockTransport(self.handler)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        return httpx.Response(self.status)
+
+
+def call(upstream: Upstream, client: httpx.AsyncClient, path: str = "/"):
+    async def operation():
+        response = await client.get(f"http://upstream{path}")
+        response.raise_for_status()
+        return response
+
+    return upstream.call(operation)
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("test-open", failure_threshold=2, reset_timeout=60)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_breaker_half_open_allows_one_trial_and_closes_on_success():
+    breaker = CircuitBreaker("test-half-open", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    time.sleep(0.06)
+    breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    breaker.allow()
+
+
+def test_breaker_half_open_reopens_on_failure():
+    breaker = CircuitBreaker("test-reopen", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_upstream_open_breaker_skips_the_request():
+    upstream = make_upstream("test-upstream-open", max_attempts=1, threshold=2)
+    server = Upstream5xx()
+
+    async def run():
+        async with httpx.AsyncClient(transport=server.transport) as client:
+            for _ in range(2):
+                with pytest.raises(httpx.HTTPStatusError):
+                    await call(upstream, client)
+            with pytest.raises(CircuitOpenError):
+                await call(upstream, client)
+
+    asyncio.run(run())
+    assert upstream.breaker.state == STATE_OPEN
+    assert server.requests == 2
+    assert UPSTREAM_CALLS.value(upstream="test-upstream-open", outcome="rejected") == 1
+
+
+def test_upstream_client_errors_do_not_open_the_breaker():
+    upstream = make_upstream("test-upstream-4xx", threshold=1)
+    server = Upstream5xx(status=404)
+
+    async def run():
+        async with httpx.AsyncClient(transport=server.transport) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await call(upstream, client)
+
+    asyncio.run(run())
+    assert upstream.breaker.state == STATE_CLOSED
+    assert server.requests == 1
+
+
+def test_retry_budget_exhausted_stops_retries():
+    upstream = make_upstream("test-budget", budget=RetryBudget(ratio=0.0, min_per_second=0), max_attempts=5)
+    server = Upstream5xx()
+
+    async def run():
+        async with httpx.AsyncClient(transport=server.transport) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await call(upstream, client)
+
+    asyncio.run(run())
+    assert server.requests == 1
+    assert UPSTREAM_RETRIES.value(upstream="test-budget", outcome="budget_exhausted") == 1
+
+
+def test_retry_budget_allows_a_fraction_of_calls():
+    budget = RetryBudget(ratio=0.5, min_per_second=0)
+    assert not budget.try_withdraw()
+    budget.deposit()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+
+
+def test_upstream_retries_within_budget():
+    upstream = make_upstream("test-retried", max_attempts=3, threshold=10)
+    server = Upstream5xx()
+
+    async def run():
+        async with httpx.AsyncClient(transport=server.transport) as client:
+            with pytest.raises(httpx.HTTPStatusError):
+                await call(upstream, client)
+
+    asyncio.run(run())
+    assert server.requests == 3
+    assert UPSTREAM_RETRIES.value(upstream="test-retried", outcome="retried") == 2
+
+
+def test_upstream_call_honours_deadline_scope():
+    upstream = make_upstream("test-deadline")
+
+    async def slow(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(slow)) as client:
+            with deadline_scope(0.1):
+                started = time.monotonic()
+                with pytest.raises(DeadlineExceededError):
+                    await call(upstream, client)
+                return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert elapsed < 0.5
+    # Vencer el plazo del webhook no habla de la salud del upstream
+    assert upstream.breaker.state == STATE_CLOSED
+    assert UPSTREAM_CALLS.value(upstream="test-deadline", outcome="deadline") == 1
+
+
+def test_upstream_call_with_expired_deadline_does_not_call():
+    upstream = make_upstream("test-expired")
+    server = Upstream5xx(status=200)
+
+    async def run():
+        async with httpx.AsyncClient(transport=server.transport) as client:
+            with deadline_scope(0):
+                with pytest.raises(DeadlineExceededError):
+                    await call(upstream, client)
+
+    asyncio.run(run())
+    assert server.requests == 0
+
+
+def test_hedged_cancels_the_loser():
+    cancelled = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/slow":
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(request.url.path)
+                raise
+        return httpx.Response(200, text=request.url.path)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            started = time.monotonic()
+            response = await hedged(
+                "test-hedged",
+                [lambda: client.get("http://upstream/slow"), lambda: client.get("http://upstream/fast")],
+                delay=0.05,
+            )
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(0)
+            return response, elapsed
+
+    response, elapsed = asyncio.run(run())
+    assert response.text == "/fast"
+    assert elapsed < 0.5
+    assert cancelled == ["/slow"]
+    assert HEDGED_CALLS.value(upstream="test-hedged", outcome="launched") == 1
+    assert HEDGED_CALLS.value(upstream="test-hedged", outcome="won") == 1
+
+
+def test_hedged_skips_the_duplicate_without_capacity():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, text=request.url.path)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await hedged(
+                "test-hedged-skipped",
+                [lambda: client.get("http://upstream/first"), lambda: client.get("http://upstream/second")],
+                delay=0.01,
+                can_hedge=lambda: False,
+            )
+
+    assert asyncio.run(run()).text == "/first"
+    assert HEDGED_CALLS.value(upstream="test-hedged-skipped", outcome="skipped") == 1
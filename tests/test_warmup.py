@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+import src.services.warmup as warmup
+import src.utils.environment as env
+
+
+def test_processors_are_prepared_on_the_event_loop(monkeypatch):
+    threads = {}
+
+    def build():
+        threads["clients"] = threading.current_thread()
+
+    def prepare():
+        threads["processors"] = threading.current_thread()
+
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(warmup, "_build_vertex_clients", build)
+    monkeypatch.setattr(warmup, "prepare_processors", prepare)
+    monkeypatch.setattr(warmup, "_open_connections", noop)
+    monkeypatch.setattr(warmup, "start_preprocess_pool", noop)
+    monkeypatch.setattr(env, "WARMUP_VERTEX_PING", False)
+
+    asyncio.run(warmup.WarmUp()._steps())
+    assert threads["clients"] is not threading.main_thread()
+    assert threads["processors"] is threading.main_thread()
+
+
+def test_every_routed_model_is_pinged(monkeypatch):
+    pinged = []
+
+    async def ping(model):
+        pinged.append(model)
+
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(warmup, "_build_vertex_clients", lambda: None)
+    monkeypatch.setattr(warmup, "prepare_processors", lambda: None)
+    monkeypatch.setattr(warmup, "_open_connections", noop)
+    monkeypatch.setattr(warmup, "start_preprocess_pool", noop)
+    monkeypatch.setattr(warmup, "_ping_vertex", ping)
+    monkeypatch.setattr(warmup, "_routed_models", lambda: ["lite", "flash"])
+    monkeypatch.setattr(env, "WARMUP_VERTEX_PING", True)
+
+    asyncio.run(warmup.WarmUp()._steps())
+    assert sorted(pinged) == ["flash", "lite"]